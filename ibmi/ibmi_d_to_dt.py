@@ -8,6 +8,24 @@ ibmi_d_to_dt.py ... func to convert IBM i dates to Python datetime
 
 import datetime
 import argparse
+import csv
+import functools
+import itertools
+import random
+import sys
+import time
+
+# numpy is only needed for the batch conversion
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Place values of the 13 digits of CYYMMDDHHMMSS
+_DIGIT_PLACES = [10**power for power in range(12, -1, -1)]
+
+# Distinct CYYMMDD date parts kept by ibm_i_date_to_datetime_cached
+DATE_CACHE_SIZE = 4096
 
 
 def ibm_i_date_to_datetime(ibmidate: str) -> datetime.datetime:
@@ -36,6 +54,354 @@ def ibm_i_date_to_datetime(ibmidate: str) -> datetime.datetime:
     return _dd
 
 
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def _ibm_i_date_prefix(prefix: str) -> tuple:
+    """
+    Parse and check the CYYMMDD date part of an IBM i date
+
+    Parameters
+    ----------
+    prefix : str
+        IBM i date part CYYMMDD
+
+    Returns
+    -------
+    (year, month, day) : tuple
+        Checked date fields
+
+    """
+    _cn = 2000 if int(prefix[0:1]) == 1 else 1900
+    _dd = datetime.date(_cn + int(prefix[1:3]), int(prefix[3:5]), int(prefix[5:7]))
+    return _dd.year, _dd.month, _dd.day
+
+
+def ibm_i_date_to_datetime_cached(ibmidate: str) -> datetime.datetime:
+    """
+    Convert IBM i date CYYMMDDHHMMSS to Python datetime, caching date parts
+
+    Same result as ibm_i_date_to_datetime. The CYYMMDD date part is looked
+    up in a bounded LRU cache, so when the same days repeat (as in journal
+    extracts) only the HHMMSS time part is parsed, as one int.
+
+    Parameters
+    ----------
+    ibmidate : str
+        IBM i date CYYMMDDHHMMSS
+
+    Returns
+    -------
+    _dd : datetime.datetime
+        Python datetime for the converted string
+
+    """
+    if len(ibmidate) != 13:
+        # Odd lengths get the scalar function's parsing and errors
+        return ibm_i_date_to_datetime(ibmidate)
+    _yr, _mo, _dt = _ibm_i_date_prefix(ibmidate[0:7])
+    _tm = int(ibmidate[7:])
+    _dd = datetime.datetime(_yr, _mo, _dt, _tm // 10000, _tm // 100 % 100, _tm % 100)
+    return _dd
+
+
+def date_cache_stats(reset: bool = False) -> dict:
+    """
+    Hit statistics of the ibm_i_date_to_datetime_cached date part cache
+
+    Parameters
+    ----------
+    reset : bool
+        Empty the cache and zero the counts after reading them
+
+    Returns
+    -------
+    _st : dict
+        hits, misses, hitrate (0-1), size and maxsize
+
+    """
+    _info = _ibm_i_date_prefix.cache_info()
+    _calls = _info.hits + _info.misses
+    _st = {
+        "hits": _info.hits,
+        "misses": _info.misses,
+        "hitrate": _info.hits / _calls if _calls > 0 else 0.0,
+        "size": _info.currsize,
+        "maxsize": _info.maxsize,
+    }
+    if reset:
+        _ibm_i_date_prefix.cache_clear()
+    return _st
+
+
+def _digits_to_int64(ibmidates: "np.ndarray") -> tuple:
+    """
+    Turn an array of CYYMMDDHHMMSS strings into int64 values
+
+    Works on the unicode code points of the whole array at once.
+    Leading and trailing blanks (CHAR column padding) are ignored.
+
+    Parameters
+    ----------
+    ibmidates : np.ndarray
+        Strings, bytes or objects
+
+    Returns
+    -------
+    (values, valid) : tuple
+        int64 values and a mask of strings that were exactly 13 digits
+
+    """
+    _st = np.char.strip(ibmidates.astype(str)).astype("U14")
+    _cp = _st.view(np.uint32).reshape(len(_st), 14).astype(np.int64)
+    _dg = _cp[:, :13] - ord("0")
+    _valid = ((_dg >= 0) & (_dg <= 9)).all(axis=1) & (_cp[:, 13] == 0)
+    _values = np.where(_valid, _dg @ np.array(_DIGIT_PLACES, dtype=np.int64), 0)
+    return _values, _valid
+
+
+def ibm_i_dates_to_datetime64(ibmidates) -> tuple:
+    """
+    Convert many IBM i dates CYYMMDDHHMMSS to numpy datetime64[s] at once
+
+    The fields are split out with integer arithmetic over the whole array,
+    so there are no per-element Python calls. Bad elements do not raise:
+    they come back as NaT and False in the valid mask. The century digit
+    counts up from 1900 (0=19xx, 1=20xx, 2=21xx ...).
+
+    Parameters
+    ----------
+    ibmidates : list, np.ndarray or pandas.Series
+        IBM i dates CYYMMDDHHMMSS as strings or as packed integers
+        (e.g. 1220113115059). Float input (integers with NaN for
+        nulls, as pandas gives) is accepted too.
+
+    Returns
+    -------
+    (_dd, _valid) : tuple
+        np.ndarray of datetime64[s] with NaT for bad elements, and
+        np.ndarray of bool that is True where the element converted
+
+    """
+    if np is None:
+        raise ImportError("numpy is needed for ibm_i_dates_to_datetime64")
+
+    _in = np.asarray(ibmidates)
+    if _in.ndim != 1:
+        _in = _in.reshape(-1)
+    if len(_in) == 0:
+        return np.array([], dtype="datetime64[s]"), np.array([], dtype=bool)
+
+    if _in.dtype.kind in "iu":
+        _values = _in.astype(np.int64)
+        _valid = np.ones(len(_in), dtype=bool)
+    elif _in.dtype.kind == "f":
+        _valid = np.isfinite(_in) & (_in == np.floor(_in))
+        _values = np.where(_valid, _in, 0).astype(np.int64)
+    else:
+        _values, _valid = _digits_to_int64(_in)
+    _valid &= (_values >= 0) & (_values < 10**13)
+
+    # Split out the fields
+    _cn = _values // 10**12
+    _yr = 1900 + _cn * 100 + _values // 10**10 % 100
+    _mo = _values // 10**8 % 100
+    _dt = _values // 10**6 % 100
+    _hr = _values // 10**4 % 100
+    _mi = _values // 100 % 100
+    _se = _values % 100
+
+    # First of the month, then check the day against the month length
+    _valid &= (_mo >= 1) & (_mo <= 12) & (_hr < 24) & (_mi < 60) & (_se < 60)
+    _mo = np.where(_valid, _mo, 1)
+    _month = ((_yr - 1970) * 12 + _mo - 1).astype("datetime64[M]")
+    _days = (_month + 1).astype("datetime64[D]") - _month.astype("datetime64[D]")
+    _valid &= (_dt >= 1) & (_dt <= _days.astype(np.int64))
+
+    _seconds = (_dt - 1) * 86400 + _hr * 3600 + _mi * 60 + _se
+    _dd = _month.astype("datetime64[s]") + _seconds.astype("timedelta64[s]")
+    _dd[~_valid] = np.datetime64("NaT")
+    return _dd, _valid
+
+
+def datetime64_to_text(ibmidates: "np.ndarray", valid: "np.ndarray") -> "np.ndarray":
+    """
+    Format converted dates the way str(datetime.datetime) does
+
+    Parameters
+    ----------
+    ibmidates : np.ndarray
+        datetime64[s] values from ibm_i_dates_to_datetime64
+    valid : np.ndarray
+        Valid mask from ibm_i_dates_to_datetime64
+
+    Returns
+    -------
+    _tx : np.ndarray
+        Strings like 2022-01-13 11:50:59, empty where not valid
+
+    """
+    _tx = np.datetime_as_string(ibmidates, unit="s").astype("U19")
+    # Swap the ISO T for a blank in place on the code points
+    _cp = _tx.view(np.uint32).reshape(len(_tx), 19)
+    _cp[:, 10] = ord(" ")
+    _tx[~valid] = ""
+    return _tx
+
+
+def convert_stream(
+    infile,
+    outfile,
+    chunksize: int = 100000,
+    column: str = None,
+    delimiter: str = ",",
+    header: bool = False,
+) -> tuple:
+    """
+    Convert a stream of IBM i dates chunk by chunk
+
+    Plain input is one CYYMMDDHHMMSS date per line, and each line is
+    written out converted. With a column, input is CSV and each row is
+    written back with that column converted. Bad dates come out empty.
+    Only one chunk is held in memory at a time.
+
+    Parameters
+    ----------
+    infile : file
+        Open text input file or sys.stdin
+    outfile : file
+        Open text output file or sys.stdout
+    chunksize : int
+        Lines converted per numpy batch
+    column : str
+        CSV column to convert, by header name or 1-based number.
+        None for plain one-date-per-line input.
+    delimiter : str
+        CSV delimiter
+    header : bool
+        CSV input has a header row, which is copied through
+
+    Returns
+    -------
+    (rows, invalid) : tuple
+        Dates read and dates that would not convert
+
+    """
+    _rows = 0
+    _invalid = 0
+
+    if column is None:
+        while True:
+            _lines = list(itertools.islice(infile, chunksize))
+            if not _lines:
+                break
+            _dd, _valid = ibm_i_dates_to_datetime64(_lines)
+            outfile.write("\n".join(datetime64_to_text(_dd, _valid).tolist()) + "\n")
+            _rows += len(_lines)
+            _invalid += len(_lines) - int(_valid.sum())
+        return _rows, _invalid
+
+    _reader = csv.reader(infile, delimiter=delimiter)
+    _writer = csv.writer(outfile, delimiter=delimiter, lineterminator="\n")
+    _index = int(column) - 1 if column.isdigit() else None
+    if header:
+        _header = next(_reader, [])
+        _writer.writerow(_header)
+        if _index is None:
+            if column not in _header:
+                raise ValueError("Column %s is not in the CSV header" % column)
+            _index = _header.index(column)
+    if _index is None:
+        raise ValueError("Use a column number unless the CSV has a header row")
+
+    while True:
+        _chunk = list(itertools.islice(_reader, chunksize))
+        if not _chunk:
+            break
+        _values = [_row[_index] if len(_row) > _index else "" for _row in _chunk]
+        _dd, _valid = ibm_i_dates_to_datetime64(_values)
+        for _row, _text in zip(_chunk, datetime64_to_text(_dd, _valid).tolist()):
+            if len(_row) > _index:
+                _row[_index] = _text
+        _writer.writerows(_chunk)
+        _rows += len(_chunk)
+        _invalid += len(_chunk) - int(_valid.sum())
+    return _rows, _invalid
+
+
+def benchmark(count: int, days: int = 0) -> None:
+    """
+    Time the scalar, cached and batch functions and print rates
+
+    Parameters
+    ----------
+    count : int
+        Number of random IBM i dates to convert
+    days : int
+        Draw the dates from only this many distinct days, like a
+        journal extract. 0=any day.
+
+    Returns
+    -------
+    None
+
+    """
+    _rng = random.Random(42)
+    _candidates = [
+        "%d%02d%02d%02d%02d%02d%02d"
+        % (
+            _rng.randint(0, 1),
+            _rng.randint(0, 99),
+            _rng.randint(1, 12),
+            _rng.randint(1, 28),
+            _rng.randint(0, 23),
+            _rng.randint(0, 59),
+            _rng.randint(0, 59),
+        )
+        for _ in range(count)
+    ]
+    if days > 0:
+        _prefixes = [_c[0:7] for _c in _candidates[0:days]]
+        _candidates = [_rng.choice(_prefixes) + _c[7:] for _c in _candidates]
+    _packed = np.array([int(_c) for _c in _candidates], dtype=np.int64)
+
+    _start = time.perf_counter()
+    _scalar = [ibm_i_date_to_datetime(_c) for _c in _candidates]
+    _scalarsecs = time.perf_counter() - _start
+    date_cache_stats(reset=True)
+    _start = time.perf_counter()
+    _cached = [ibm_i_date_to_datetime_cached(_c) for _c in _candidates]
+    _cachedsecs = time.perf_counter() - _start
+    _cachestats = date_cache_stats()
+    _start = time.perf_counter()
+    _strings, _ = ibm_i_dates_to_datetime64(_candidates)
+    _stringsecs = time.perf_counter() - _start
+    _start = time.perf_counter()
+    _ints, _ = ibm_i_dates_to_datetime64(_packed)
+    _intsecs = time.perf_counter() - _start
+
+    if not (
+        (np.array(_scalar, dtype="datetime64[s]") == _strings).all()
+        and (_strings == _ints).all()
+        and _scalar == _cached
+    ):
+        raise ValueError("Batch conversion does not match scalar conversion")
+
+    print(f"Dates: {count}")
+    for _name, _secs in (
+        ("scalar ibm_i_date_to_datetime", _scalarsecs),
+        ("cached ibm_i_date_to_datetime", _cachedsecs),
+        ("batch from strings", _stringsecs),
+        ("batch from packed integers", _intsecs),
+    ):
+        print(
+            f"{_name:32} {_secs:8.3f} sec {count / _secs:14,.0f} dates/sec"
+            f" {_scalarsecs / _secs:6.1f}x"
+        )
+    print(
+        f"Date cache hit rate: {_cachestats['hitrate']:.1%}"
+        f" ({_cachestats['hits']} hits, {_cachestats['misses']} misses)"
+    )
+
+
 if __name__ == "__main__":
 
     EXPLANATION = """Demos ibm_i_date_to_datetime function. Takes any number of
@@ -56,7 +422,79 @@ if __name__ == "__main__":
     PARSER.add_argument(
         "candidates", nargs="*", help="IBM i date(s) in form CYYMMDDHHMMSS"
     )
+    PARSER.add_argument(
+        "--benchmark",
+        type=int,
+        default=0,
+        help="Time scalar vs batch conversion of this many random dates",
+    )
+    PARSER.add_argument(
+        "--benchmarkdays",
+        type=int,
+        default=0,
+        help="Benchmark dates fall on only this many distinct days. 0=any day",
+    )
+    PARSER.add_argument(
+        "--input",
+        default=None,
+        help="Stream dates from this file, or - for stdin, one per line",
+    )
+    PARSER.add_argument(
+        "--output", default="-", help="Write converted dates here. Default stdout"
+    )
+    PARSER.add_argument(
+        "--column",
+        default=None,
+        help="Input is CSV. Convert this column, by header name or 1-based number",
+    )
+    PARSER.add_argument("--delimiter", default=",", help="CSV delimiter")
+    PARSER.add_argument(
+        "--header", action="store_true", help="CSV input has a header row"
+    )
+    PARSER.add_argument(
+        "--chunksize", type=int, default=100000, help="Dates converted per batch"
+    )
+    PARSER.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print row, invalid and rows/sec counts to stderr when done",
+    )
 
     ARGS = PARSER.parse_args()
+    if ARGS.benchmark > 0:
+        benchmark(ARGS.benchmark, ARGS.benchmarkdays)
+    if ARGS.input is not None:
+        START = time.perf_counter()
+        INFILE = (
+            sys.stdin
+            if ARGS.input == "-"
+            else open(ARGS.input, "r", newline="", buffering=1024 * 1024)
+        )
+        OUTFILE = (
+            sys.stdout
+            if ARGS.output == "-"
+            else open(ARGS.output, "w", newline="", buffering=1024 * 1024)
+        )
+        try:
+            ROWS, INVALID = convert_stream(
+                INFILE,
+                OUTFILE,
+                ARGS.chunksize,
+                ARGS.column,
+                ARGS.delimiter,
+                ARGS.header,
+            )
+        finally:
+            if INFILE is not sys.stdin:
+                INFILE.close()
+            if OUTFILE is not sys.stdout:
+                OUTFILE.close()
+        if ARGS.stats:
+            SECS = time.perf_counter() - START
+            print(
+                f"Rows: {ROWS} Invalid: {INVALID} Seconds: {SECS:.3f}"
+                f" Rows/sec: {ROWS / SECS if SECS > 0 else 0:,.0f}",
+                file=sys.stderr,
+            )
     for candidate in ARGS.candidates:
         print(ibm_i_date_to_datetime(candidate))
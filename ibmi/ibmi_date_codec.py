@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ibmi_date_codec.py ... encode and decode IBM i date/time formats with numpy
+
+Decodes whole columns of IBM i dates and times to numpy datetime64 and
+encodes them back, without a Python call per element. Built on
+ibmi_d_to_dt.py, which handles CYYMMDDHHMMSS.
+
+Formats
+-------
+*CYMD          CYY/MM/DD   century digit 0=19xx, 1=20xx ... 9=28xx
+*JUL           YY/DDD      2 digit year, 40-99=19xx, 00-39=20xx
+*MDY           MM/DD/YY    2 digit year, 40-99=19xx, 00-39=20xx
+*ISO           YYYY-MM-DD
+CYYMMDD        7 digit packed/zoned number, e.g. 1220113
+HHMMSS         6 digit packed/zoned time number, e.g. 115059
+CYYMMDDHHMMSS  13 digit timestamp, e.g. 1220113115059
+
+The separator formats accept / - . , or blank as the separator when
+decoding, except *ISO which must use -.
+
+Dates decode to datetime64[D], HHMMSS to timedelta64[s] since midnight
+and CYYMMDDHHMMSS to datetime64[s]. Every function returns a valid mask
+along with the values. Bad elements decode to NaT and encode to 0 or ""
+instead of raising.
+"""
+
+import argparse
+import numpy as np
+from ibmi_d_to_dt import ibm_i_dates_to_datetime64
+
+# Template of each format. C, Y, M and D are digits, anything else is
+# the separator. Numeric formats have no separators.
+FORMATS = {
+    "*CYMD": "CYY/MM/DD",
+    "*JUL": "YY/DDD",
+    "*MDY": "MM/DD/YY",
+    "*ISO": "YYYY-MM-DD",
+    "CYYMMDD": "CYYMMDD",
+    "HHMMSS": "HHMMSS",
+    "CYYMMDDHHMMSS": "CYYMMDDHHMMSS",
+}
+NUMERIC_FORMATS = ("CYYMMDD", "HHMMSS", "CYYMMDDHHMMSS")
+
+# Separators accepted when decoding
+_SEPARATORS = np.array([ord(_ch) for _ch in "/-., "], dtype=np.int64)
+
+# Lookup tables indexed by [year, month] or [year] for years 1-9999,
+# in days since 1970-01-01. Row 0 and column 0 are unused.
+_MONTHS = ((np.arange(1, 10000)[:, None] - 1970) * 12 + np.arange(12)).astype(
+    "datetime64[M]"
+)
+_MONTH_START = np.zeros((10000, 13), dtype=np.int64)
+_MONTH_START[1:, 1:] = _MONTHS.astype("datetime64[D]").astype(np.int64)
+_MONTH_DAYS = np.zeros((10000, 13), dtype=np.int64)
+_MONTH_DAYS[1:, 1:] = ((_MONTHS + 1).astype("datetime64[D]") - _MONTHS.astype(
+    "datetime64[D]"
+)).astype(np.int64)
+_YEAR_START = _MONTH_START[:, 1]
+_YEAR_DAYS = _MONTH_DAYS.sum(axis=1)
+# All month starts in order, for day number to year/month lookups
+_MONTH_STARTS = _MONTH_START[1:, 1:].ravel()
+_LAST_DAY = _MONTH_STARTS[-1] + _MONTH_DAYS[9999, 12] - 1
+del _MONTHS
+
+
+def _template(fmt: str) -> str:
+    """
+    Look up the template for a format name
+
+    Parameters
+    ----------
+    fmt : str
+        Format name, e.g. *CYMD. Case does not matter.
+
+    Returns
+    -------
+    _tp : str
+        Template, e.g. CYY/MM/DD
+
+    """
+    _tp = FORMATS.get(fmt.upper())
+    if _tp is None:
+        raise ValueError(
+            "Unknown IBM i date format %s. Use one of %s" % (fmt, ", ".join(FORMATS))
+        )
+    return _tp
+
+
+def _fields(template: str) -> dict:
+    """
+    Positions of each field letter in a template
+
+    Parameters
+    ----------
+    template : str
+        Template, e.g. CYY/MM/DD
+
+    Returns
+    -------
+    _fd : dict
+        Letter to list of positions, e.g. {"C": [0], "Y": [1, 2] ...}
+
+    """
+    _fd = {}
+    for _pos, _ch in enumerate(template):
+        if _ch.isalpha():
+            _fd.setdefault(_ch, []).append(_pos)
+    return _fd
+
+
+def _numeric_values(values: np.ndarray, width: int) -> tuple:
+    """
+    Turn packed/zoned numbers or digit strings into int64 values
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Integers, floats (NaN for nulls), Decimals or strings
+    width : int
+        Most digits allowed
+
+    Returns
+    -------
+    (values, valid) : tuple
+        int64 values and valid mask
+
+    """
+    if values.dtype.kind in "iu":
+        _vl = values.astype(np.int64)
+        _valid = np.ones(len(_vl), dtype=bool)
+    else:
+        try:
+            # Floats, Decimals from pyodbc and None all go through float
+            _fl = values.astype(np.float64)
+            _valid = np.isfinite(_fl) & (_fl == np.floor(_fl))
+            _vl = np.where(_valid, _fl, 0).astype(np.int64)
+        except (TypeError, ValueError):
+            _st = np.char.strip(values.astype(str))
+            _valid = np.char.isdigit(_st) & (np.char.str_len(_st) <= width)
+            _vl = np.where(_valid, _st, "0").astype(np.int64)
+    _valid &= (_vl >= 0) & (_vl < 10**width)
+    return np.where(_valid, _vl, 0), _valid
+
+
+def _digit_matrix(values: np.ndarray, template: str) -> tuple:
+    """
+    Split decode input into one column per template position
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Decode input
+    template : str
+        Template, e.g. CYY/MM/DD
+
+    Returns
+    -------
+    (digits, valid) : tuple
+        int64 array of shape (n, len(template)) and valid mask.
+        Separator columns hold the separator code point.
+
+    """
+    _width = len(template)
+    if template.isalpha():
+        _vl, _valid = _numeric_values(values, _width)
+        _places = 10 ** np.arange(_width - 1, -1, -1, dtype=np.int64)
+        return _vl[:, None] // _places % 10, _valid
+
+    # Work on the unicode code points of the whole column at once
+    _st = np.char.strip(values.astype(str)).astype("U%d" % (_width + 1))
+    _cp = _st.view(np.uint32).reshape(len(_st), _width + 1).astype(np.int64)
+    _valid = (_cp[:, _width] == 0) & (_cp[:, _width - 1] != 0)
+    _dg = _cp[:, :_width].copy()
+    for _pos, _ch in enumerate(template):
+        if _ch.isalpha():
+            _dg[:, _pos] -= ord("0")
+            _valid &= (_dg[:, _pos] >= 0) & (_dg[:, _pos] <= 9)
+        elif template[0:4] == "YYYY":
+            _valid &= _dg[:, _pos] == ord(_ch)
+        else:
+            _valid &= np.isin(_dg[:, _pos], _SEPARATORS)
+    return _dg, _valid
+
+
+def _field_values(digits: np.ndarray, template: str) -> dict:
+    """
+    Add up the digits of each field
+
+    Parameters
+    ----------
+    digits : np.ndarray
+        Digit matrix from _digit_matrix
+    template : str
+        Template, e.g. CYY/MM/DD
+
+    Returns
+    -------
+    _vl : dict
+        Letter to int64 field values, plus the letter count in
+        "<letter>width", e.g. "Ywidth": 2
+
+    """
+    _vl = {}
+    for _ch, _positions in _fields(template).items():
+        _places = 10 ** np.arange(len(_positions) - 1, -1, -1, dtype=np.int64)
+        _vl[_ch] = digits[:, _positions] @ _places
+        _vl[_ch + "width"] = len(_positions)
+    return _vl
+
+
+def _days_from_fields(fields: dict, valid: np.ndarray) -> np.ndarray:
+    """
+    Day numbers since 1970-01-01 from year, month and day fields
+
+    Parameters
+    ----------
+    fields : dict
+        Field values from _field_values
+    valid : np.ndarray
+        Valid mask, updated in place
+
+    Returns
+    -------
+    _days : np.ndarray
+        int64 day numbers. Meaningless where valid is False.
+
+    """
+    if "C" in fields:
+        _yr = 1900 + fields["C"] * 100 + fields["Y"]
+    elif fields["Ywidth"] == 4:
+        _yr = fields["Y"].copy()
+    else:
+        _yr = np.where(fields["Y"] < 40, 2000, 1900) + fields["Y"]
+    valid &= (_yr >= 1) & (_yr <= 9999)
+    _yr = np.where(valid, _yr, 1970)
+
+    _dt = fields["D"]
+    if fields["Dwidth"] == 3:
+        # Julian day of the year
+        valid &= (_dt >= 1) & (_dt <= _YEAR_DAYS[_yr])
+        return _YEAR_START[_yr] + _dt - 1
+
+    _mo = fields["M"]
+    valid &= (_mo >= 1) & (_mo <= 12)
+    _mo = np.where(valid, _mo, 1)
+    valid &= (_dt >= 1) & (_dt <= _MONTH_DAYS[_yr, _mo])
+    return _MONTH_START[_yr, _mo] + _dt - 1
+
+
+def decode(values, fmt: str) -> tuple:
+    """
+    Decode a column of IBM i dates or times
+
+    Parameters
+    ----------
+    values : list, np.ndarray or pandas.Series
+        Strings for separator formats. Integers, floats, Decimals
+        or digit strings for numeric formats.
+    fmt : str
+        Format name, e.g. *CYMD or CYYMMDD
+
+    Returns
+    -------
+    (_dd, _valid) : tuple
+        datetime64[D] for dates, timedelta64[s] for HHMMSS,
+        datetime64[s] for CYYMMDDHHMMSS, with NaT for bad elements,
+        and the valid mask
+
+    """
+    _tp = _template(fmt)
+    _in = np.asarray(values).reshape(-1)
+    if _tp == "CYYMMDDHHMMSS":
+        return ibm_i_dates_to_datetime64(_in)
+    if len(_in) == 0:
+        _unit = "timedelta64[s]" if _tp == "HHMMSS" else "datetime64[D]"
+        return np.array([], dtype=_unit), np.array([], dtype=bool)
+
+    _dg, _valid = _digit_matrix(_in, _tp)
+    if _tp == "HHMMSS":
+        _vl = _dg @ np.array([36000, 3600, 600, 60, 10, 1], dtype=np.int64)
+        _valid &= (_dg[:, 0] * 10 + _dg[:, 1] < 24) & (_dg[:, 2] < 6) & (_dg[:, 4] < 6)
+        _dd = _vl.astype("timedelta64[s]")
+    else:
+        _days = _days_from_fields(_field_values(_dg, _tp), _valid)
+        _dd = _days.astype("datetime64[D]")
+    _dd[~_valid] = np.datetime64("NaT") if _tp != "HHMMSS" else np.timedelta64("NaT")
+    return _dd, _valid
+
+
+def _date_fields(days: np.ndarray, valid: np.ndarray) -> dict:
+    """
+    Year, month, day and day of year from day numbers
+
+    Parameters
+    ----------
+    days : np.ndarray
+        int64 day numbers since 1970-01-01
+    valid : np.ndarray
+        Valid mask, updated in place
+
+    Returns
+    -------
+    _fd : dict
+        "year", "month", "day" and "yday" int64 arrays
+
+    """
+    valid &= (days >= _MONTH_STARTS[0]) & (days <= _LAST_DAY)
+    _days = np.where(valid, days, 0)
+    _ix = np.searchsorted(_MONTH_STARTS, _days, side="right") - 1
+    _yr = _ix // 12 + 1
+    return {
+        "year": _yr,
+        "month": _ix % 12 + 1,
+        "day": _days - _MONTH_STARTS[_ix] + 1,
+        "yday": _days - _YEAR_START[_yr] + 1,
+    }
+
+
+def encode(values, fmt: str, separator: str = None) -> tuple:
+    """
+    Encode a column of dates or times to an IBM i format
+
+    Parameters
+    ----------
+    values : list, np.ndarray or pandas.Series
+        datetime64 values, datetime.date/datetime objects, or for
+        HHMMSS timedelta64 since midnight (datetime64 values use
+        their time of day)
+    fmt : str
+        Format name, e.g. *CYMD or CYYMMDD
+    separator : str
+        Separator to write in place of the template default, e.g. -
+
+    Returns
+    -------
+    (_out, _valid) : tuple
+        int64 numbers for numeric formats (0 where bad) or strings
+        for separator formats ("" where bad), and the valid mask
+
+    """
+    _tp = _template(fmt)
+    _in = np.asarray(values).reshape(-1)
+    if _in.dtype.kind == "m":
+        if _tp != "HHMMSS":
+            raise ValueError("Only HHMMSS can be encoded from timedelta64 values")
+        _seconds = _in.astype("timedelta64[s]")
+        _valid = ~np.isnat(_seconds)
+        _seconds = _seconds.astype(np.int64)
+        _days = np.zeros(len(_in), dtype=np.int64)
+        _valid &= (_seconds >= 0) & (_seconds < 86400)
+    else:
+        _stamp = _in.astype("datetime64[s]")
+        _valid = ~np.isnat(_stamp)
+        _stamp = np.where(_valid, _stamp, np.datetime64(0, "s")).astype(np.int64)
+        _days = _stamp // 86400
+        _seconds = _stamp % 86400
+
+    # Fields for the template letters
+    _fd = _date_fields(_days, _valid) if _tp != "HHMMSS" else {}
+    _letters = {}
+    if _tp == "HHMMSS":
+        _letters["H"] = _seconds // 3600 * 10000 + _seconds // 60 % 60 * 100 + _seconds % 60
+    elif _tp.startswith("YYYY"):
+        _letters["Y"] = _fd["year"]
+    elif "C" in _tp:
+        _valid &= (_fd["year"] >= 1900) & (_fd["year"] <= 2899)
+        _letters["C"] = (_fd["year"] - 1900) // 100
+        _letters["Y"] = _fd["year"] % 100
+    else:
+        _valid &= (_fd["year"] >= 1940) & (_fd["year"] <= 2039)
+        _letters["Y"] = _fd["year"] % 100
+    if _tp != "HHMMSS":
+        _letters["M"] = _fd["month"]
+        _letters["D"] = _fd["yday"] if "DDD" in _tp else _fd["day"]
+
+    if _tp in NUMERIC_FORMATS:
+        if _tp == "HHMMSS":
+            _out = _letters["H"]
+        else:
+            _out = (_letters["C"] * 100 + _letters["Y"]) * 10000 + _letters["M"] * 100 + _letters["D"]
+            if _tp == "CYYMMDDHHMMSS":
+                _out = _out * 1000000 + _seconds // 3600 * 10000 + _seconds // 60 % 60 * 100 + _seconds % 60
+        return np.where(_valid, _out, 0), _valid
+
+    # Build the code points of every string at once
+    _width = len(_tp)
+    _cp = np.zeros((len(_in), _width), dtype=np.uint32)
+    for _ch, _positions in _fields(_tp).items():
+        _vl = _letters[_ch]
+        for _ix, _pos in enumerate(_positions):
+            _cp[:, _pos] = ord("0") + _vl // 10 ** (len(_positions) - 1 - _ix) % 10
+    for _pos, _ch in enumerate(_tp):
+        if not _ch.isalpha():
+            _cp[:, _pos] = ord(separator if separator is not None else _ch)
+    _cp[~_valid] = 0
+    return _cp.view("U%d" % _width).reshape(-1), _valid
+
+
+def decode_frame(frame, formats: dict):
+    """
+    Decode IBM i date columns of a pandas DataFrame
+
+    Parameters
+    ----------
+    frame : pandas.DataFrame
+        Fetched DB2 data, e.g. from pandas.read_sql
+    formats : dict
+        Column name to format name, e.g. {"ORDDAT": "CYYMMDD"}
+
+    Returns
+    -------
+    _fr : pandas.DataFrame
+        Copy of frame with the listed columns decoded
+
+    """
+    _fr = frame.copy()
+    for _col, _fmt in formats.items():
+        _fr[_col] = decode(_fr[_col].to_numpy(), _fmt)[0]
+    return _fr
+
+
+def decode_result_set(description, rows: list, formats: dict) -> dict:
+    """
+    Decode IBM i date columns of a fetched DB-API result set
+
+    Parameters
+    ----------
+    description : sequence
+        cursor.description of the query
+    rows : list
+        Rows from cursor.fetchall() or fetchmany()
+    formats : dict
+        Column name to format name, e.g. {"ORDDAT": "CYYMMDD"}.
+        Names are matched without regard to case.
+
+    Returns
+    -------
+    _cols : dict
+        Column name to numpy array for every column, with the
+        listed columns decoded
+
+    """
+    _names = [_col[0] for _col in description]
+    _formats = {_name.upper(): _fmt for _name, _fmt in formats.items()}
+    _columns = list(zip(*rows)) if rows else [()] * len(_names)
+    _cols = {}
+    for _name, _values in zip(_names, _columns):
+        _fmt = _formats.get(_name.upper())
+        if _fmt is None:
+            _cols[_name] = np.array(_values, dtype=object)
+        else:
+            _cols[_name] = decode(np.array(_values, dtype=object), _fmt)[0]
+    return _cols
+
+
+if __name__ == "__main__":
+
+    EXPLANATION = """Demos ibmi_date_codec. Decodes any number of IBM i dates or
+    times in the given format and prints the numpy value, or with --encode
+    encodes ISO dates/timestamps to the given format.
+    Formats: """ + ", ".join(FORMATS)
+    PARSER = argparse.ArgumentParser(description=EXPLANATION)
+
+    PARSER.add_argument("format", help="IBM i date format, e.g. *CYMD or CYYMMDD")
+    PARSER.add_argument("candidates", nargs="*", help="Values to convert")
+    PARSER.add_argument(
+        "--encode",
+        action="store_true",
+        help="Encode ISO dates/timestamps (e.g. 2022-01-13T11:50:59) instead",
+    )
+
+    ARGS = PARSER.parse_intermixed_args()
+    if ARGS.encode:
+        _values = np.array(ARGS.candidates, dtype="datetime64[s]")
+        if ARGS.format.upper() == "HHMMSS":
+            _values = _values - _values.astype("datetime64[D]")
+        RESULT, VALID = encode(_values, ARGS.format)
+    else:
+        RESULT, VALID = decode(ARGS.candidates, ARGS.format)
+    for candidate, result, valid in zip(ARGS.candidates, RESULT, VALID):
+        print(candidate, result if valid else "invalid")
@@ -8,6 +8,13 @@
 # of the QIWS/QCUSTCDT file. 
 # Before using make a copy of QIWS/QCUSTCDT to QIWS/QCUSTCDT2
 #
+# Records are inserted in batches with parameter markers via
+# executemany and committed once per batch. Progress is logged
+# every progressinterval records instead of once per record.
+# The connection uses CommitMode=2 (*CHG) so a batch that fails
+# is rolled back instead of being left partly inserted. The
+# table must be journaled for commitment control.
+#
 # Parameters
 # None
 #------------------------------------------------
@@ -28,8 +35,11 @@ import pyodbc
 # Initialize or set variables
 exitcode=0 #Init exitcode
 exitmessage=''
-connstring="DSN=*LOCAL;CommitMode=0" # Local IBMi ODBC DSN as current user
+connstring="DSN=*LOCAL;CommitMode=2" # Local IBMi ODBC DSN as current user. *CHG commitment control.
 reccounter=0
+batchsize=1000 # Records per executemany call and commit
+progressinterval=10000 # Log progress every n records
+usefastexecutemany=True # Send each batch as one parameter array (pyodbc fast_executemany)
 
 # TODO Set selected work variables  
 csv_filename="" # IFS Location to CSV File Ex: /tmp/qcustcdt.csv
@@ -43,25 +53,28 @@ print("Read CSV File and Write to DB2 Table")
 print("Start of Main Processing - " + time.strftime("%H:%M:%S"))
 print("OS:" + platform)
 
-def insert_qcustcdt(cursor,library,table,cusnum,lstnam,init,street,city,state,zipcod,cdtlmt,chgcod,baldue,cdtdue):
+def insert_qcustcdt_batch(cursor,library,table,rows):
     #----------------------------------------------------------
-    # Function: insert_qcustcdt
-    # Desc: Insert new record into Customer Master
+    # Function: insert_qcustcdt_batch
+    # Desc: Insert a batch of new records into Customer Master
     # :cursor - Open ODBC cursor
     # :library - IBMi library name for table  
     # :table - IBMi table name
-    # :param field names: Each individual field name needed
-    # :return: Result value from query. 1=Successful insert,  Any other value is an error. -2=Exception
+    # :rows - List of records. Each record has the field values
+    #  in physical file order: cusnum,lstnam,init,street,city,
+    #  state,zipcod,cdtlmt,chgcod,baldue,cdtdue
+    # :return: Number of records inserted. -2=Exception
     #----------------------------------------------------------
     try:
-       # Create the SQL statement 
-       sql = """insert into %s.%s (cusnum,lstnam,init,street,city,state,zipcod,cdtlmt,chgcod,baldue,cdtdue) VALUES(%s,'%s','%s','%s','%s','%s',%s,%s,%s,%s,%s)""" % (library,table,cusnum,lstnam,init,street,city,state,zipcod,cdtlmt,chgcod,baldue,cdtdue)
+       # Create the SQL statement with parameter markers.
+       # The driver handles quoting so names like O'Brien insert fine.
+       sql = """insert into %s.%s (cusnum,lstnam,init,street,city,state,zipcod,cdtlmt,chgcod,baldue,cdtdue) VALUES(?,?,?,?,?,?,?,?,?,?,?)""" % (library,table)
 
-       # Insert the record
-       rtnexecute=cursor.execute(sql)
+       # Insert the batch of records
+       cursor.executemany(sql,rows)
 
-       # Return rowcount affected
-       return cursor.rowcount
+       # Return number of records inserted
+       return len(rows)
 
     except Exception as e:
         print(e) # Print error to stdout   
@@ -77,6 +90,7 @@ try: # Try to perform main logic
       
       # Get cursor for open connection
       c = conn.cursor()
+      c.fast_executemany = usefastexecutemany
 
       # Bail if no CSV file specified
       if (csv_filename.strip()==""): 
@@ -90,23 +104,46 @@ try: # Try to perform main logic
         csv_reader = csv.reader(csv_file)
         next(csv_reader)  #  skip header row
 
-        # Read in each CSV record and insert to IBM i table 
-        print(f"Iterating CSV Records")
+        # Read in each CSV record and insert to IBM i table in batches
+        print(f"Iterating CSV Records. Batch size: {batchsize}")
+        starttime = time.time()
+        batch = []
         for row in csv_reader:
         
            # Increment current record counter 
            reccounter += 1 
         
-           # Print row info for logging. Just an example to log cust number and rec#. You can log what you want. 
-           print(f"Processing record: {reccounter} - Cusnum:{row[0]}")
-           
-           # Pass the fields from the CSV in the correct ordinal position to the insert_qcustcdt function. 
+           # Add the fields from the CSV in the correct ordinal position to the batch. 
            # In the QCUSTCDT.CSV file, field order matches the physical file.
-           rtninsert=insert_qcustcdt(c,ibmi_library,ibmi_file,row[0],row[1],row[2],row[3],row[4],row[5],row[6],row[7],row[8],row[9],row[10])
-
-           # Bail out if errors
-           if (rtninsert != 1):
-              raise Exception(f"Error occurred on insert to file: {ibmi_library}/{ibmi_file}")
+           batch.append(row[0:11])
+
+           # Insert and commit when the batch is full
+           if len(batch) >= batchsize:
+              rtninsert=insert_qcustcdt_batch(c,ibmi_library,ibmi_file,batch)
+
+              # Roll back the failed batch and bail out if errors
+              if (rtninsert != len(batch)):
+                 conn.rollback()
+                 raise Exception(f"Error occurred on insert to file: {ibmi_library}/{ibmi_file} near record {reccounter}")
+              conn.commit()
+              batch = []
+
+           # Log progress periodically rather than for every record
+           if reccounter % progressinterval == 0:
+              print(f"Processed records: {reccounter}")
+
+        # Insert and commit the last partial batch
+        if len(batch) > 0:
+           rtninsert=insert_qcustcdt_batch(c,ibmi_library,ibmi_file,batch)
+           if (rtninsert != len(batch)):
+              conn.rollback()
+              raise Exception(f"Error occurred on insert to file: {ibmi_library}/{ibmi_file} near record {reccounter}")
+           conn.commit()
+
+        # Throughput report
+        elapsed = time.time() - starttime
+        recspersec = int(reccounter / elapsed) if elapsed > 0 else reccounter
+        print(f"Inserted {reccounter} records in {elapsed:.2f} seconds. {recspersec} records/sec")
 
         # Close cursor and database connection. We're done 
         c.close()
@@ -114,7 +151,7 @@ try: # Try to perform main logic
 
         # Set success info
         exitcode=0
-        exitmessage=f"Completed successfully. {reccounter} records inserted."
+        exitmessage=f"Completed successfully. {reccounter} records inserted. {recspersec} records/sec."
  
 #------------------------------------------------
 # Handle Exceptions
@@ -6,6 +6,21 @@
 # This script will check the selected host/tcp port to see if it has an active
 # service running on it.
 #
+# Scan mode: when --host or --port is a list or range, or an --inventory
+# file is passed, every host/port pair is probed at the same time with
+# asyncio, up to --concurrency connects in flight, each given --timeout
+# seconds. Each host name is resolved once no matter how many ports it
+# has. The results come out as a table or JSON, so a sweep of thousands
+# of endpoints takes seconds instead of one timeout after another.
+#
+# Host names are looked up with getaddrinfo, so IPv6 works as well as
+# IPv4. Lookups, including the check for DNS servers that answer for
+# names that don't exist, are cached for --dnsttl seconds in a small
+# file so repeated monitoring runs skip the DNS round trips. When a host
+# has several addresses they are tried happy eyeballs style: the next
+# address is started if the last has not connected within 250 ms, and
+# the first connect wins.
+#
 # Parameters:
 # --host - TCP/IP host name or IP address
 # Valid formats: --host=1.1.1.1  or 
@@ -15,6 +30,30 @@
 #
 # --port - TCP/IP port to check
 # Ex: --port=80  - Scan TCP/IP port 80
+#
+# Scan mode host and port lists:
+#   --host ibmi1,ibmi2,10.0.0.1-20,10.0.1.0/28
+#     (10.0.0.1-20 is a range of the last IPv4 number. /28 is a network.)
+#   --port 22,23,446-449,8000-8010
+#
+# --inventory - File of endpoints, one per line: host, host:port or
+#   host followed by a port list. Hosts without ports use --port.
+#   Blank lines and lines starting with # are skipped. Default: blank
+# --concurrency - Most connects in flight at once. Default: 200
+# --timeout - Seconds to wait for each connect. Default: 1
+# --format - Scan output: table or json. Default: table
+# --outputfile - Also write the scan results as json to this file. Default: blank
+# --failonclosed - End with ExitCode 99 if any scanned port is not open.
+#   (True/False) Default: True
+# --dnsttl - Seconds to reuse DNS lookups. 0=look up every time. Default: 300
+# --dnscachefile - File that keeps DNS lookups between runs. none=keep
+#   them only for this run. A file not owned by the current user, or
+#   writable by others, is ignored, and saved entries never outlive
+#   the current --dnsttl. Default: pychecktcpport-dns.json in
+#   $XDG_CACHE_HOME or ~/.cache (created with mode 0700)
+#
+# Scan example:
+# python3 pychecktcpport.py --inventory /tmp/endpoints.txt --port 22,446,449 --concurrency 500 --format json
 #------------------------------------------------
 
 import argparse
@@ -30,6 +69,10 @@ from datetime import date
 import datetime
 from configparser import ConfigParser
 import socket
+import asyncio
+import concurrent.futures
+import ipaddress
+import json
 
 #------------------------------------------------
 # Script initialization
@@ -51,6 +94,13 @@ datetime3=time.strftime("%m/%d/%y-%H%M%S")
 # Create parm variables
 host=""
 port=""
+dnscache=None
+
+# Name that should not exist, to spot DNS servers that answer anyway
+captive_dns_name="BlahThisDomaynDontExist22.com"
+
+# Seconds before trying the next address of a host (RFC 8305)
+happy_eyeballs_delay=0.25
 
 #------------------------------------------------
 # Define some useful functions
@@ -92,55 +142,429 @@ def ltrim(strval):
     #-------------------------------------------------------
     return strval.lstrip()
 
-def DoesServiceExist(host,port):
+class DnsCache:
+    #-------------------------------------------------------
+    # Class: DnsCache
+    # Desc: getaddrinfo results kept for ttl seconds, in memory
+    #       and optionally in a file between runs. getaddrinfo does
+    #       not return the DNS record TTL, so one TTL is used for all.
+    #       Failed lookups are kept only for the captive DNS check
+    #       name, where failing is the normal answer.
+    # :ttl: Seconds to keep lookups. 0=no caching
+    # :cachefile: JSON file to load and save, or blank
+    #-------------------------------------------------------
+    def __init__(self,ttl=300,cachefile=""):
+       self.ttl = ttl
+       self.cachefile = cachefile
+       self.entries = {}
+       self.changed = False
+       self.hits = 0
+       self.lookups = 0
+       if cachefile != "" and ttl > 0 and os.path.isfile(cachefile):
+          self.load()
+
+    def load(self):
+       #-------------------------------------------------------
+       # Function: load
+       # Desc: Read lookups from the cache file. Only a file that
+       #       this user owns and no one else can write is trusted.
+       #       Entries are kept no longer than ttl from when they
+       #       were looked up, and never past ttl from now.
+       #-------------------------------------------------------
+       try:
+          with open(self.cachefile,"r") as infile:
+             info = os.fstat(infile.fileno())
+             if info.st_uid != os.getuid() or info.st_mode & 0o022:
+                print(f"DNS cache file {self.cachefile} is not private to this user. Not used.")
+                return
+             entries = json.load(infile)
+       except (OSError,ValueError):
+          return
+       if not isinstance(entries,dict):
+          return
+       now = time.time()
+       for host, entry in entries.items():
+          try:
+             stored = min(float(entry.get("stored",now)),now)
+             self.entries[host] = {"stored": stored,
+                                   "expires": min(float(entry["expires"]),stored + self.ttl),
+                                   "addresses": [str(address) for address in entry["addresses"]],
+                                   "error": str(entry["error"])}
+          except (KeyError,TypeError,ValueError):
+             continue
+
+    def lookup(self,host):
+       #-------------------------------------------------------
+       # Function: lookup
+       # Desc: Get a cached lookup that has not expired
+       # :host: Host name
+       # :return: Tuple of (address list, error) or None
+       #-------------------------------------------------------
+       entry = self.entries.get(host.lower())
+       if entry is None or entry["expires"] < time.time():
+          return None
+       self.hits += 1
+       return (entry["addresses"],entry["error"])
+
+    def store(self,host,addresses,error=""):
+       #-------------------------------------------------------
+       # Function: store
+       # Desc: Cache a lookup
+       # :host: Host name
+       # :addresses: List of IP addresses
+       # :error: Lookup error or blank
+       #-------------------------------------------------------
+       self.lookups += 1
+       if self.ttl > 0 and (error == "" or host == captive_dns_name):
+          now = time.time()
+          self.entries[host.lower()] = {"stored": now, "expires": now + self.ttl, "addresses": addresses, "error": error}
+          self.changed = True
+
+    async def resolve(self,host,timeout):
+       #-------------------------------------------------------
+       # Function: resolve
+       # Desc: Look up all IPv4 and IPv6 addresses of a host
+       # :host: Host name or IP address
+       # :timeout: Seconds to wait
+       # :return: Tuple of (address list in happy eyeballs order,
+       #          error or blank)
+       #-------------------------------------------------------
+       cached = self.lookup(host)
+       if cached is not None:
+          return cached
+       loop = asyncio.get_running_loop()
+       try:
+          addrinfo = await asyncio.wait_for(loop.getaddrinfo(host,None,type=socket.SOCK_STREAM),timeout)
+       except asyncio.TimeoutError:
+          return ([],"DNS lookup timed out")
+       except OSError as ex:
+          self.store(host,[],str(ex))
+          return ([],str(ex))
+       addresses = interleave_families(addrinfo)
+       self.store(host,addresses)
+       return (addresses,"")
+
+    async def captive_addresses(self,timeout):
+       #-------------------------------------------------------
+       # Function: captive_addresses
+       # Desc: Addresses DNS gives for a name that doesn't exist
+       # :timeout: Seconds to wait
+       # :return: Set of IP addresses, empty for a normal DNS server
+       #-------------------------------------------------------
+       addresses, error = await self.resolve(captive_dns_name,timeout)
+       return set(addresses)
+
+    def save(self):
+       #-------------------------------------------------------
+       # Function: save
+       # Desc: Write unexpired lookups to the cache file
+       #-------------------------------------------------------
+       if self.cachefile == "" or not self.changed:
+          return
+       now = time.time()
+       entries = {host: entry for host, entry in self.entries.items() if entry["expires"] >= now}
+       workfile = self.cachefile + "." + str(os.getpid())
+       try:
+          with os.fdopen(os.open(workfile,os.O_WRONLY | os.O_CREAT | os.O_TRUNC,0o600),"w") as outfile:
+             json.dump(entries,outfile)
+          os.replace(workfile,self.cachefile)
+       except OSError as ex:
+          print(f"DNS cache file {self.cachefile} not saved: {ex}")
+
+def default_dns_cache_file():
+    #-------------------------------------------------------
+    # Function: default_dns_cache_file
+    # Desc: DNS cache file for the current user, in a cache
+    #       directory only that user can write
+    # :return: File name in $XDG_CACHE_HOME or ~/.cache
+    #-------------------------------------------------------
+    cachedir = os.environ.get("XDG_CACHE_HOME","") or os.path.join(os.path.expanduser("~"),".cache")
+    os.makedirs(cachedir,mode=0o700,exist_ok=True)
+    return os.path.join(cachedir,"pychecktcpport-dns.json")
+
+def interleave_families(addrinfo):
+    #-------------------------------------------------------
+    # Function: interleave_families
+    # Desc: Order getaddrinfo results for happy eyeballs. Keeps
+    #       the system's preferred first address, then alternates
+    #       between IPv6 and IPv4 (RFC 8305).
+    # :addrinfo: getaddrinfo result list
+    # :return: List of unique IP addresses
+    #-------------------------------------------------------
+    addresses = list(dict.fromkeys(info[4][0] for info in addrinfo))
+    if not addresses:
+       return []
+    first = [address for address in addresses if (":" in address) == (":" in addresses[0])]
+    second = [address for address in addresses if (":" in address) != (":" in addresses[0])]
+    ordered = []
+    for index in range(max(len(first),len(second))):
+       ordered.extend(family[index] for family in (first,second) if index < len(family))
+    return ordered
+
+async def happy_eyeballs_connect(addresses,port,timeout,delay=happy_eyeballs_delay):
+    #-------------------------------------------------------
+    # Function: happy_eyeballs_connect
+    # Desc: Connect to the first address that answers. Starts the
+    #       next address after delay seconds, or at once when an
+    #       attempt fails. Other attempts are cancelled.
+    # :addresses: IP addresses in the order to try
+    # :port: TCP/IP port
+    # :timeout: Seconds to wait overall
+    # :delay: Seconds between starting attempts
+    # :return: Address that connected. Raises the last connect error,
+    #          or asyncio.TimeoutError.
+    #-------------------------------------------------------
+    if not addresses:
+       raise OSError("No addresses to connect to")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = {}
+    lasterror = None
+    nextaddress = 0
+    try:
+       while True:
+          if nextaddress < len(addresses):
+             address = addresses[nextaddress]
+             nextaddress += 1
+             pending[asyncio.ensure_future(asyncio.open_connection(address,port))] = address
+          if not pending:
+             raise lasterror
+          wait = deadline - loop.time()
+          if nextaddress < len(addresses):
+             wait = min(wait,delay)
+          if deadline - loop.time() <= 0:
+             raise asyncio.TimeoutError()
+          done, notdone = await asyncio.wait(pending.keys(),timeout=wait,return_when=asyncio.FIRST_COMPLETED)
+          for task in done:
+             address = pending.pop(task)
+             if task.exception() is None:
+                reader, writer = task.result()
+                writer.close()
+                return address
+             lasterror = task.exception()
+    finally:
+       for task in pending:
+          task.cancel()
+       # Close any other attempt that connected at the same moment
+       for task in pending:
+          if task.done() and not task.cancelled() and task.exception() is None:
+             task.result()[1].close()
+
+async def check_service(host,port,timeout,dnscache):
+    #-------------------------------------------------------
+    # Function: check_service
+    # Desc: Resolve a host and try to connect to a port
+    # :host: TCP/IP host name/ip
+    # :port: TCP/IP port
+    # :timeout: Seconds to wait for the lookup and the connect
+    # :dnscache: DnsCache
+    # :return: Tuple of (addresses, connected address or blank)
+    #-------------------------------------------------------
+    captive = await dnscache.captive_addresses(timeout)
+    addresses, error = await dnscache.resolve(host,timeout)
+    if error != "" or captive.intersection(addresses):
+       return (addresses,"")
+    try:
+       return (addresses,await happy_eyeballs_connect(addresses,port,timeout))
+    except (OSError,asyncio.TimeoutError):
+       return (addresses,"")
+
+def DoesServiceExist(host,port,timeout=1,dnscache=None):
     #-------------------------------------------------------
     # Function: DoesServiceExist
     # Desc: Check for TCP/IP active port
     # https://stackoverflow.com/questions/14110841/how-do-i-test-if-there-is-a-server-open-on-a-port-with-python
     # :host: TCP/IP host name/ip
     # :port: TCP/IP port
+    # :timeout: Seconds to wait for the connect. Default=1
+    # :dnscache: DnsCache to reuse lookups. Default=lookups not kept
     # :return: True-Service exists, False-Service does not exist
     #-------------------------------------------------------
 
-   captive_dns_addr = ""
-   host_addr = ""
-
    # Check for non-existent domain host name. Some DNS servers will return an IP address
-   # if they have a service running, so this will return that IP address if so.
-   # We can then check that IP address against what we get when we do a 
-   # getbyhostname with the actual host name
-   try:
-     # Get the ip address for invalid host. 
-     captive_dns_addr=socket.gethostbyname("BlahThisDomaynDontExist22.com") 
-   except:
-      # Continue 
-      pass 
-
-   # Let's see if our selected host exists now
+   # if they have a service running, so check_service compares that IP address with
+   # the addresses of the actual host name. Both lookups come from the DNS cache
+   # when they are fresh. 
+   if dnscache is None:
+      dnscache = DnsCache(0)
    try:
-
-    # Get IP address for our selected host
-    host_addr = socket.gethostbyname(host)
-    print(f"TCP/IP host IP address: {host_addr}")
-
-    # If bogus host IP and actual IP match, our host name is probably invalid
-    # or possibly offline ?
-    if (captive_dns_addr == host_addr):
-       return False
-  
-    # Now lets's check our actual host and port 
-    s = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-    s.settimeout(1)
-    s.connect((host,port))
-    s.close()
-
-   except:
+    addresses, connected = asyncio.run(check_service(host,port,timeout,dnscache))
+    print(f"TCP/IP host IP address: {', '.join(addresses)}")
+    if connected != "" and len(addresses) > 1:
+       print(f"Connected to: {connected}")
+   except Exception:
     # Something happened. Return false  
     # Could add detailed exception messages here if desired.
     return False
 
-   # All good, return true  
-   return True
+   # All good, return true if any address answered
+   return connected != ""
+
+def expand_hosts(hostspec):
+    #-------------------------------------------------------
+    # Function: expand_hosts
+    # Desc: Expand a comma separated host list with IPv4 ranges
+    #       like 10.0.0.1-20 and networks like 10.0.0.0/28
+    # :hostspec: Host list
+    # :return: List of host names and IP addresses
+    #-------------------------------------------------------
+    hosts = []
+    for item in hostspec.split(","):
+       item = item.strip()
+       if item == "":
+          continue
+       if "/" in item:
+          network = ipaddress.ip_network(item,strict=False)
+          hosts.extend(str(address) for address in (network.hosts() if network.num_addresses > 2 else network))
+       elif re.fullmatch(r"\d+\.\d+\.\d+\.\d+-\d+",item):
+          prefix, last = item.rsplit(".",1)
+          first, final = last.split("-")
+          hosts.extend(f"{prefix}.{number}" for number in range(int(first),int(final) + 1))
+       else:
+          hosts.append(item)
+    return hosts
+
+def expand_ports(portspec):
+    #-------------------------------------------------------
+    # Function: expand_ports
+    # Desc: Expand a comma separated port list with ranges
+    #       like 8000-8010
+    # :portspec: Port list
+    # :return: List of port numbers
+    #-------------------------------------------------------
+    ports = []
+    for item in portspec.replace(" ",",").split(","):
+       item = item.strip()
+       if item == "":
+          continue
+       if "-" in item:
+          first, final = item.split("-")
+          ports.extend(range(int(first),int(final) + 1))
+       else:
+          ports.append(int(item))
+    for port in ports:
+       if port < 1 or port > 65535:
+          raise Exception(f"Port {port} is not between 1 and 65535")
+    return ports
+
+def read_inventory(inventoryfile,defaultports):
+    #-------------------------------------------------------
+    # Function: read_inventory
+    # Desc: Read an endpoint inventory file
+    # :inventoryfile: File of host, host:port or host port-list lines
+    # :defaultports: Ports for hosts listed without any
+    # :return: List of (host, port) tuples
+    #-------------------------------------------------------
+    targets = []
+    with open(inventoryfile,"r") as infile:
+       for line in infile:
+          line = line.strip()
+          if line == "" or line.startswith("#"):
+             continue
+          parts = line.split(None,1)
+          host = parts[0]
+          ports = expand_ports(parts[1]) if len(parts) > 1 else []
+          # host:port, but not a bare IPv6 address
+          if len(parts) == 1 and host.count(":") == 1:
+             host, port = host.split(":")
+             ports = [int(port)]
+          if not ports:
+             if not defaultports:
+                raise Exception(f"No port for {host} in {inventoryfile} and no --port given")
+             ports = defaultports
+          targets.extend((host,port) for port in ports)
+    return targets
+
+async def resolve_host(host,captive,dnscache,semaphore,timeout):
+    #-------------------------------------------------------
+    # Function: resolve_host
+    # Desc: Look up a host once for all of its ports
+    # :host: TCP/IP host name/ip
+    # :captive: Addresses DNS gives for names that don't exist
+    # :dnscache: DnsCache
+    # :semaphore: Limit on lookups and connects in flight
+    # :timeout: Seconds to wait
+    # :return: Tuple of (IP address list or empty, error or blank)
+    #-------------------------------------------------------
+    async with semaphore:
+       addresses, error = await dnscache.resolve(host,timeout)
+    if error != "":
+       return ([],error)
+    if captive.intersection(addresses):
+       return ([],"Host not found (captive DNS answer)")
+    return (addresses,"")
+
+async def probe_port(host,addresses,port,semaphore,timeout):
+    #-------------------------------------------------------
+    # Function: probe_port
+    # Desc: Try one TCP connect to any address of a host
+    # :host: TCP/IP host name/ip
+    # :addresses: Resolved IP addresses
+    # :port: TCP/IP port
+    # :semaphore: Limit on lookups and connects in flight
+    # :timeout: Seconds to wait for the connect
+    # :return: Result dictionary
+    #-------------------------------------------------------
+    result = {"host": host, "port": port, "address": addresses[0], "status": "", "ms": None, "error": ""}
+    async with semaphore:
+       starttime = time.perf_counter()
+       try:
+          result["address"] = await happy_eyeballs_connect(addresses,port,timeout)
+          result["ms"] = round((time.perf_counter() - starttime) * 1000,1)
+          result["status"] = "open"
+       except asyncio.TimeoutError:
+          result["status"] = "timeout"
+       except ConnectionRefusedError:
+          result["ms"] = round((time.perf_counter() - starttime) * 1000,1)
+          result["status"] = "closed"
+       except OSError as ex:
+          result["status"] = "error"
+          result["error"] = ex.strerror or str(ex)
+    return result
+
+async def scan_ports(targets,concurrency,timeout,dnscache):
+    #-------------------------------------------------------
+    # Function: scan_ports
+    # Desc: Probe many host/port pairs at the same time
+    # :targets: List of (host, port) tuples
+    # :concurrency: Most lookups and connects in flight
+    # :timeout: Seconds to wait for each lookup and connect
+    # :dnscache: DnsCache
+    # :return: List of result dictionaries in target order
+    #-------------------------------------------------------
+    semaphore = asyncio.Semaphore(max(1,concurrency))
+    # getaddrinfo runs in the loop's executor. Give it a thread per
+    # lookup in flight so a lookup's timeout doesn't run out while it
+    # is still waiting for a thread.
+    asyncio.get_running_loop().set_default_executor(
+       concurrent.futures.ThreadPoolExecutor(max_workers=max(1,concurrency)))
+    captive = await dnscache.captive_addresses(timeout)
+
+    # Resolve each host once
+    hosts = list(dict.fromkeys(host for host, port in targets))
+    lookups = await asyncio.gather(*[resolve_host(host,captive,dnscache,semaphore,timeout) for host in hosts])
+    addresses = dict(zip(hosts,lookups))
+
+    async def probe(host,port):
+       hostaddresses, error = addresses[host]
+       if not hostaddresses:
+          return {"host": host, "port": port, "address": "", "status": "unresolved", "ms": None, "error": error}
+       return await probe_port(host,hostaddresses,port,semaphore,timeout)
+
+    return await asyncio.gather(*[probe(host,port) for host, port in targets])
+
+def print_scan_table(results):
+    #-------------------------------------------------------
+    # Function: print_scan_table
+    # Desc: Print scan results as an aligned table
+    # :results: List of result dictionaries
+    #-------------------------------------------------------
+    hostwidth = max([len("Host")] + [len(result["host"]) for result in results])
+    addresswidth = max([len("Address")] + [len(result["address"]) for result in results])
+    print(f"{'Host':<{hostwidth}} {'Port':>5} {'Address':<{addresswidth}} {'Status':<10} {'ms':>8}  Error")
+    for result in results:
+       ms = f"{result['ms']:.1f}" if result["ms"] is not None else ""
+       print(f"{result['host']:<{hostwidth}} {result['port']:>5} {result['address']:<{addresswidth}} {result['status']:<10} {ms:>8}  {result['error']}")
 
 #------------------------------------------------
 # Main script logic
@@ -160,14 +584,35 @@ try: # Try to perform main logic
    # an argument to prevent an auto-exit
    # Each argument has a long and short version
    parser = argparse.ArgumentParser()
-   parser.add_argument('-s','--host', required=True,help="TCP/IP host name or IP address to check")
-   parser.add_argument('-p','--port', required=True,help="TCP/IP port to check")
+   parser.add_argument('-s','--host', default="",required=False,help="TCP/IP host name or IP address to check, or a list or range to scan")
+   parser.add_argument('-p','--port', default="",required=False,help="TCP/IP port to check, or a list or range to scan")
+   parser.add_argument('-i','--inventory', default="",required=False,help="File of endpoints to scan. Default=blank")
+   parser.add_argument('-c','--concurrency', default="200",required=False,help="Most connects in flight when scanning. Default=200")
+   parser.add_argument('-t','--timeout', default="1",required=False,help="Seconds to wait for each connect. Default=1")
+   parser.add_argument('-f','--format', default="table",required=False,help="Scan output: table or json. Default=table")
+   parser.add_argument('-o','--outputfile', default="",required=False,help="Also write the scan results as json to this file. Default=blank")
+   parser.add_argument('--failonclosed', default="True",required=False,help="Fail if any scanned port is not open. Default=True")
+   parser.add_argument('--dnsttl', default="300",required=False,help="Seconds to reuse DNS lookups. 0=look up every time. Default=300")
+   parser.add_argument('--dnscachefile', default="",required=False,help="File that keeps DNS lookups between runs, or none. Default=pychecktcpport-dns.json in $XDG_CACHE_HOME or ~/.cache")
    # Parse the command line arguments 
    args = parser.parse_args()
 
    # Pull arguments into variables so they are meaningful
    host=args.host.strip()
    port=args.port.strip()
+   inventory=args.inventory.strip()
+   concurrency=int(args.concurrency)
+   timeout=float(args.timeout)
+   outputformat=args.format.strip().lower()
+   outputfile=args.outputfile.strip()
+   failonclosed=str2bool(args.failonclosed)
+   dnsttl=float(args.dnsttl)
+   dnscachefile=args.dnscachefile.strip()
+   if dnscachefile == "":
+      dnscachefile=default_dns_cache_file()
+   elif dnscachefile.lower() == "none":
+      dnscachefile=""
+   dnscache=DnsCache(dnsttl,dnscachefile)
  
    # Argument parsing is done. Let's do some work
    # In our case we will just PRINT the variables 
@@ -177,16 +622,53 @@ try: # Try to perform main logic
    print(f"TCP/IP host: {host}")
    print(f"TCP/IP port: {port}")
 
-   # Check for app running on selected port
-   rtn1 = DoesServiceExist(host,int(port))
+   # Build the list of endpoints
+   ports=expand_ports(port)
+   targets=[(targethost,targetport) for targethost in expand_hosts(host) for targetport in ports]
+   if inventory != "":
+      targets=targets + read_inventory(inventory,ports)
+   if len(targets) == 0:
+      raise Exception("Nothing to check. Pass --host and --port, or --inventory.")
+   if outputformat not in ("table","json"):
+      raise Exception("Unknown format " + outputformat + ". Use table or json.")
+
+   if len(targets) == 1 and inventory == "" and outputformat == "table" and outputfile == "":
+      # Check for app running on selected port. Use the parsed
+      # endpoint, so forms like 2222-2222 or host/32 work too.
+      targethost, targetport = targets[0]
+      rtn1 = DoesServiceExist(targethost,targetport,timeout,dnscache)
    
-   if (rtn1==True):
-      msg = f"TCP/IP service exists on {host}:{port}"
-      print (msg)
+      if (rtn1==True):
+         msg = f"TCP/IP service exists on {targethost}:{targetport}"
+         print (msg)
+      else:
+         msg = f"TCP/IP service does NOT exist on {targethost}:{targetport}"
+         print (msg)
+         raise Exception(msg) 
+
    else:
-      msg = f"TCP/IP service does NOT exist on {host}:{port}"
-      print (msg)
-      raise Exception(msg) 
+      print(f"Inventory: {inventory}")
+      print(f"Endpoints: {len(targets)}  Concurrency: {concurrency}  Timeout: {timeout}")
+
+      # Probe every endpoint at the same time, concurrency at a time
+      starttime=time.perf_counter()
+      results=asyncio.run(scan_ports(targets,concurrency,timeout,dnscache))
+      elapsed=time.perf_counter() - starttime
+
+      print(dashes)
+      if outputformat == "json":
+         print(json.dumps(results,indent=1))
+      else:
+         print_scan_table(results)
+      if outputfile != "":
+         with open(outputfile,"w") as outfile:
+            json.dump(results,outfile,indent=1)
+      openports=sum(1 for result in results if result["status"] == "open")
+      msg = f"{openports} of {len(results)} TCP/IP endpoints open. Seconds: {elapsed:.2f}"
+      print(msg)
+      print(f"DNS lookups: {dnscache.lookups}  From cache: {dnscache.hits}")
+      if failonclosed and openports < len(results):
+         raise Exception(msg)
 
    # Set success info
    exitcode=0
@@ -224,6 +706,8 @@ except Exception as ex: # Catch and handle exceptions
 finally: # Final processing
      # Do any final code and exit now
      # We log as much relevent info to STDOUT as needed
+     if dnscache is not None:
+        dnscache.save()
      print("")
      print(dashes)
      print('ExitCode:' + str(exitcode))
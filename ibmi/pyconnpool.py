@@ -0,0 +1,276 @@
+#!/QOpenSys/pkgs/bin/python3
+#------------------------------------------------
+# Script name: pyconnpool.py
+#
+# Description:
+# Small thread-safe database connection pool for the pyodbc
+# and ibm_db_dbi sample scripts. Connection setup is often
+# slower than the short queries that run over it, so
+# long-running scripts can check connections out of the pool
+# and give them back instead of connecting for every query.
+#
+# - Bounded: never more than maxsize open connections. Callers
+#   wait up to checkouttimeout seconds for a free connection.
+# - Health check: a connection that sat idle for healthinterval
+#   seconds or more runs healthsql (VALUES 1) before it is
+#   handed out. Dead connections are replaced.
+# - Idle eviction: connections idle for idletimeout seconds are
+#   closed at the next checkout/checkin and by an optional
+#   background reaper thread every reapinterval seconds.
+#
+# Pip packages needed:
+# pip3 install pyodbc (for odbc_pool)
+# ibm_db_dbi comes with the PASE python3-ibm_db package (for db2_pool)
+#
+# Usage:
+# import pyconnpool
+# pool = pyconnpool.odbc_pool("DSN=*LOCAL;CommitMode=0;",maxsize=4)
+# with pool.connection() as conn:
+#    cursor = conn.cursor()
+#    cursor.execute("select * from qiws.qcustcdt")
+# pool.close()
+#------------------------------------------------
+
+import threading
+import time
+import contextlib
+
+#------------------------------------------------
+# Define classes and functions
+#------------------------------------------------
+
+class PoolTimeoutError(Exception):
+    #-------------------------------------------------------
+    # Class: PoolTimeoutError
+    # Desc: No connection came free within checkouttimeout
+    #-------------------------------------------------------
+    pass
+
+class ConnectionPool:
+    #-------------------------------------------------------
+    # Class: ConnectionPool
+    # Desc: Thread-safe pool of DB-API connections
+    # :connectfunc: Function with no parms that opens a new connection
+    # :maxsize: Most open connections, checked out plus idle. Default=4
+    # :idletimeout: Close connections idle this many seconds. Default=300
+    # :healthsql: SQL run to check an idle connection. Default=VALUES 1
+    # :healthinterval: Check connections idle this many seconds or more
+    #                  before handing them out. 0=check every time. Default=30
+    # :checkouttimeout: Seconds to wait for a free connection. Default=30
+    # :reapinterval: Seconds between background idle evictions.
+    #                0=no reaper thread. Default=60
+    #-------------------------------------------------------
+    def __init__(self,connectfunc,maxsize=4,idletimeout=300,healthsql="VALUES 1",
+                 healthinterval=30,checkouttimeout=30,reapinterval=60):
+       if maxsize < 1:
+          raise ValueError("maxsize must be 1 or more")
+       self.connectfunc = connectfunc
+       self.maxsize = maxsize
+       self.idletimeout = idletimeout
+       self.healthsql = healthsql
+       self.healthinterval = healthinterval
+       self.checkouttimeout = checkouttimeout
+       self.idle = [] # (connection, last used time). Most recently used last.
+       self.size = 0 # Open connections, checked out plus idle
+       self.closed = False
+       self.lock = threading.Condition()
+       self.stats = {"created": 0, "reused": 0, "evicted": 0, "unhealthy": 0, "waits": 0}
+
+       # Optional background thread to close idle connections
+       self.reaperstop = threading.Event()
+       self.reaper = None
+       if reapinterval > 0:
+          self.reaper = threading.Thread(target=self._reap,args=(reapinterval,),daemon=True)
+          self.reaper.start()
+
+    def acquire(self):
+       #-------------------------------------------------------
+       # Function: acquire
+       # Desc: Check out a connection. Reuses an idle connection
+       #       if there is one, else opens a new one if the pool
+       #       is below maxsize, else waits for a checkin.
+       # :return: Open connection. Give it back with release.
+       #-------------------------------------------------------
+       deadline = time.monotonic() + self.checkouttimeout
+       while True:
+          conn = None
+          lastused = None
+          with self.lock:
+             while True:
+                if self.closed:
+                   raise Exception("Connection pool is closed")
+                self._evict_idle_locked()
+                if self.idle:
+                   conn, lastused = self.idle.pop()
+                   break
+                if self.size < self.maxsize:
+                   # Reserve the slot now, connect outside the lock
+                   self.size += 1
+                   break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                   raise PoolTimeoutError(f"No database connection free after {self.checkouttimeout} seconds")
+                self.stats["waits"] += 1
+                self.lock.wait(remaining)
+
+          # Open a new connection in the reserved slot
+          if conn is None:
+             try:
+                conn = self.connectfunc()
+             except Exception:
+                self._discard(None)
+                raise
+             with self.lock:
+                self.stats["created"] += 1
+             return conn
+
+          # Check a connection that has been idle a while
+          if time.monotonic() - lastused < self.healthinterval or self._healthy(conn):
+             with self.lock:
+                self.stats["reused"] += 1
+             return conn
+          with self.lock:
+             self.stats["unhealthy"] += 1
+          self._discard(conn)
+
+    def release(self,conn,discard=False):
+       #-------------------------------------------------------
+       # Function: release
+       # Desc: Give a connection back to the pool
+       # :conn: Connection from acquire
+       # :discard: True to close it instead of keeping it
+       #-------------------------------------------------------
+       if discard:
+          self._discard(conn)
+          return
+       with self.lock:
+          if self.closed:
+             self.size -= 1
+             self._close_quietly(conn)
+          else:
+             self.idle.append((conn,time.monotonic()))
+             self._evict_idle_locked()
+          self.lock.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+       #-------------------------------------------------------
+       # Function: connection
+       # Desc: Context manager that checks out a connection and
+       #       always gives it back. If the block raises, the
+       #       connection is rolled back, or closed if rollback
+       #       fails.
+       # :return: Open connection
+       #-------------------------------------------------------
+       conn = self.acquire()
+       try:
+          yield conn
+       except BaseException:
+          try:
+             conn.rollback()
+             self.release(conn)
+          except Exception:
+             self.release(conn,discard=True)
+          raise
+       else:
+          self.release(conn)
+
+    def evict_idle(self):
+       #-------------------------------------------------------
+       # Function: evict_idle
+       # Desc: Close connections idle longer than idletimeout
+       #-------------------------------------------------------
+       with self.lock:
+          self._evict_idle_locked()
+
+    def get_stats(self):
+       #-------------------------------------------------------
+       # Function: get_stats
+       # Desc: Pool counters for logging
+       # :return: Dictionary of counters plus open and idle counts
+       #-------------------------------------------------------
+       with self.lock:
+          stats = dict(self.stats)
+          stats["open"] = self.size
+          stats["idle"] = len(self.idle)
+          return stats
+
+    def close(self):
+       #-------------------------------------------------------
+       # Function: close
+       # Desc: Close idle connections and stop the reaper.
+       #       Checked out connections are closed when released.
+       #-------------------------------------------------------
+       self.reaperstop.set()
+       with self.lock:
+          self.closed = True
+          for conn, lastused in self.idle:
+             self._close_quietly(conn)
+          self.size -= len(self.idle)
+          self.idle = []
+          self.lock.notify_all()
+
+    def _evict_idle_locked(self):
+       # Oldest idle connections are at the front of the list
+       now = time.monotonic()
+       while self.idle and now - self.idle[0][1] > self.idletimeout:
+          conn, lastused = self.idle.pop(0)
+          self._close_quietly(conn)
+          self.size -= 1
+          self.stats["evicted"] += 1
+
+    def _healthy(self,conn):
+       try:
+          cursor = conn.cursor()
+          cursor.execute(self.healthsql)
+          cursor.fetchall()
+          cursor.close()
+          return True
+       except Exception:
+          return False
+
+    def _discard(self,conn):
+       if conn is not None:
+          self._close_quietly(conn)
+       with self.lock:
+          self.size -= 1
+          self.lock.notify()
+
+    def _close_quietly(self,conn):
+       try:
+          conn.close()
+       except Exception:
+          pass
+
+    def _reap(self,interval):
+       while not self.reaperstop.wait(interval):
+          self.evict_idle()
+
+    def __enter__(self):
+       return self
+
+    def __exit__(self,exc_type,exc_value,tb):
+       self.close()
+
+def odbc_pool(connstring,**poolparms):
+    #-------------------------------------------------------
+    # Function: odbc_pool
+    # Desc: Pool of pyodbc connections
+    # :connstring: ODBC connection string
+    # :poolparms: ConnectionPool keyword parms
+    # :return: ConnectionPool
+    #-------------------------------------------------------
+    import pyodbc
+    return ConnectionPool(lambda: pyodbc.connect(connstring),**poolparms)
+
+def db2_pool(*connectparms,**poolparms):
+    #-------------------------------------------------------
+    # Function: db2_pool
+    # Desc: Pool of ibm_db_dbi connections. With no connect
+    #       parms each connection is to *LOCAL as the current user.
+    # :connectparms: ibm_db_dbi.connect parms
+    # :poolparms: ConnectionPool keyword parms
+    # :return: ConnectionPool
+    #-------------------------------------------------------
+    import ibm_db_dbi
+    return ConnectionPool(lambda: ibm_db_dbi.connect(*connectparms),**poolparms)
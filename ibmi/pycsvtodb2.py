@@ -0,0 +1,785 @@
+#!/QOpenSys/pkgs/bin/python3
+#------------------------------------------------
+# Script name: pycsvtodb2.py
+#
+# Description:
+# This script will read any CSV file with a header row
+# and insert the records to the selected DB2 table.
+# It is a generic version of pyQcustcdtImportToDb2.py.
+#
+# CSV header names are matched to table column names
+# (case insensitive). Column types and lengths are read
+# once from QSYS2.SYSCOLUMNS and each CSV value is converted
+# to fit its column: DECIMAL/NUMERIC values are rounded to
+# the column scale, CHAR/VARCHAR values are cut to the column
+# length and empty numeric/date values become nulls.
+# Records are streamed from the file and inserted in batches
+# with parameter markers via executemany, one commit per batch.
+#
+# Restart and rejects:
+# After each committed batch the byte offset of the next CSV
+# record is written to a checkpoint file. If the import is run
+# again while the checkpoint file exists it resumes from that
+# offset instead of record 1. The checkpoint file is deleted
+# when the import completes. Resume is at-least-once: if the job
+# ends after a batch is committed but before its checkpoint is
+# written, that batch is inserted again on resume.
+# A run that is not resuming a checkpoint starts a new reject
+# file, replacing rejects left by an earlier run.
+# Records that fail conversion, or fail insert when their batch
+# is retried one record at a time, are written to a reject CSV
+# file with the record number and error, and the import goes on.
+# The reject file size is saved in the checkpoint and the file
+# is cut back to it on resume so rejects are not written twice.
+# The default CommitMode=2 (*CHG) lets a failed batch be rolled
+# back before it is retried, so the table must be journaled.
+# With CommitMode=0 (no commitment control) a failed batch may
+# already be partly inserted and can't be rolled back, so it is
+# not retried. The import stops at the failed batch instead of
+# inserting the earlier records of the batch twice.
+#
+# Parallel import:
+# With --workers greater than 1 the file is split into that
+# many byte ranges on record boundaries (found with mmap,
+# skipping newlines inside quoted fields). Each range is
+# parsed and inserted by its own worker process over its own
+# ODBC connection, with its own checkpoint file
+# (<checkpointfile>.<n>) and reject file (<rejectfile>.<n>).
+# Record counts are totaled at the end and the reject files
+# are merged into the reject file with file-wide record numbers.
+# A rerun resumes each range and reuses the original ranges.
+#
+# Pip packages needed:
+# pip3 install pyodbc
+#
+# Parameters
+# --csvfile/-csv=CSV file to import. First row must be column names.
+# --library/-lib=DB2 library/schema of the target table
+# --table/-table=DB2 target table
+# --connstring/-conn=ODBC connection string. Default=DSN=*LOCAL;CommitMode=2
+# --batchsize/-batch=Records per executemany call and commit. Default=1000
+# --progressinterval/-progress=Log progress every n records. Default=10000
+# --delimiter/-delim=CSV field delimiter. Default=,
+# --encoding/-encoding=CSV file encoding. Default=utf-8
+# --checkpointfile/-checkpoint=Checkpoint file. Default=<csvfile>.checkpoint
+# --rejectfile/-reject=Reject CSV file. Default=<csvfile>.rejects.csv
+# --resume/-resume=Resume from checkpoint file if found. True/False Default=True
+# --workers/-workers=Number of worker processes. Default=1
+#
+# Testing command line - CLI
+# python3 pycsvtodb2.py --csvfile /tmp/qcustcdt.csv --library QIWS --table QCUSTCDT2
+#------------------------------------------------
+
+import argparse
+import sys
+from sys import platform
+import os
+import time
+import traceback
+import csv
+import decimal
+import json
+import mmap
+import multiprocessing
+import pyodbc
+
+#------------------------------------------------
+# Script initialization
+#------------------------------------------------
+
+# Initialize or set variables
+appname="Import CSV File to DB2 Table"
+exitcode=0 #Init exitcode
+exitmessage=''
+reccounter=0
+
+# DB2 column types grouped by how CSV values are converted
+chartypes=("CHAR","VARCHAR","GRAPHIC","VARGRAPHIC","NCHAR","NVARCHAR")
+decimaltypes=("DECIMAL","NUMERIC")
+integertypes=("SMALLINT","INTEGER","BIGINT")
+floattypes=("REAL","DOUBLE","FLOAT","DECFLOAT")
+
+# Output messages to STDOUT for logging
+print("-------------------------------------------------------------------------------")
+print(appname)
+print("Start of Main Processing - " + time.strftime("%H:%M:%S"))
+print("OS:" + platform)
+
+#------------------------------------------------
+# Define some useful functions
+#------------------------------------------------
+
+def str2bool(strval):
+    #-------------------------------------------------------
+    # Function: str2bool
+    # Desc: Constructor
+    # :strval: String value for true or false
+    # :return: Return True if string value is" yes, true, t or 1
+    #-------------------------------------------------------
+    return strval.lower() in ("yes", "true", "t", "1")
+
+class OffsetLineReader:
+    #----------------------------------------------------------
+    # Class: OffsetLineReader
+    # Desc: Line iterator for csv.reader over a binary file that
+    #       keeps the byte offset of the next unread line.
+    #       csv.reader only pulls the lines it needs for the
+    #       current record, so after each record offset is
+    #       where the next record starts.
+    # :file - File opened in binary mode
+    # :encoding - Text encoding of the file
+    # :endoffset - Stop at this byte offset. None=end of file
+    #----------------------------------------------------------
+    def __init__(self,file,encoding,endoffset=None):
+       self.file = file
+       self.encoding = encoding
+       self.endoffset = endoffset
+       self.offset = file.tell()
+
+    def __iter__(self):
+       return self
+
+    def __next__(self):
+       if self.endoffset is not None and self.offset >= self.endoffset:
+          raise StopIteration
+       line = self.file.readline()
+       if not line:
+          raise StopIteration
+       self.offset += len(line)
+       return line.decode(self.encoding)
+
+def read_checkpoint(checkpointfile):
+    #----------------------------------------------------------
+    # Function: read_checkpoint
+    # Desc: Read checkpoint file if it exists
+    # :checkpointfile - Checkpoint file name
+    # :return: Checkpoint dictionary or None if no checkpoint
+    #----------------------------------------------------------
+    if os.path.isfile(checkpointfile)==False:
+       return None
+    with open(checkpointfile,"r") as file:
+       return json.load(file)
+
+def write_checkpoint(checkpointfile,checkpoint):
+    #----------------------------------------------------------
+    # Function: write_checkpoint
+    # Desc: Durably write checkpoint file. Written to a temp file,
+    #       synced to disk, then renamed over the old checkpoint
+    #       so a crash never leaves a half written checkpoint.
+    # :checkpointfile - Checkpoint file name
+    # :checkpoint - Checkpoint dictionary
+    #----------------------------------------------------------
+    tempfile = checkpointfile + ".tmp"
+    with open(tempfile,"w") as file:
+       json.dump(checkpoint,file)
+       file.flush()
+       os.fsync(file.fileno())
+    os.replace(tempfile,checkpointfile)
+
+def has_commit_control(connstring):
+    #----------------------------------------------------------
+    # Function: has_commit_control
+    # Desc: Check if the ODBC connection string runs under
+    #       commitment control. IBM i Access ODBC uses
+    #       CommitMode=2 (*CHG) when CommitMode is not set.
+    # :connstring - ODBC connection string
+    # :return: False if CommitMode=0 (*NONE), otherwise True
+    #----------------------------------------------------------
+    for keyword in connstring.split(";"):
+       name, sep, value = keyword.partition("=")
+       if name.strip().upper() == "COMMITMODE":
+          return value.strip() != "0"
+    return True
+
+def insert_batch(conn,cursor,sql,batch,rejects,commitcontrol=True):
+    #----------------------------------------------------------
+    # Function: insert_batch
+    # Desc: Insert and commit a batch of records. If the batch
+    #       fails it is rolled back and retried one record at a
+    #       time so only the bad records are rejected. Without
+    #       commitment control the rollback does nothing, so the
+    #       batch is not retried and the error is raised.
+    # :conn - Open ODBC connection
+    # :cursor - Open ODBC cursor
+    # :sql - Insert statement with parameter markers
+    # :batch - List of (record number, CSV row, insert values)
+    # :rejects - RejectWriter for records that fail
+    # :commitcontrol - True if a failed batch can be rolled back
+    # :return: Number of records inserted
+    #----------------------------------------------------------
+    try:
+       cursor.executemany(sql,[values for recnum, row, values in batch])
+       conn.commit()
+       return len(batch)
+    except Exception as e:
+       if commitcontrol==False:
+          raise Exception(f"Batch of records {batch[0][0]} to {batch[-1][0]} failed with no commitment control (CommitMode=0). "
+                          f"Some of these records may already be inserted. Check the table before resuming. {e}")
+       print(f"Batch ending at record {batch[-1][0]} failed. Retrying records one at a time. {e}")
+       conn.rollback()
+
+    inserted = 0
+    for recnum, row, values in batch:
+       try:
+          cursor.execute(sql,values)
+          inserted += 1
+       except Exception as e:
+          rejects.write(recnum,row,e)
+    conn.commit()
+    return inserted
+
+class RejectWriter:
+    #----------------------------------------------------------
+    # Class: RejectWriter
+    # Desc: Append rejected records to a CSV file with the
+    #       original fields followed by record number and error.
+    #       The file is only created when the first record is
+    #       rejected.
+    # :rejectfile - Reject CSV file name
+    # :header - CSV header row
+    #----------------------------------------------------------
+    def __init__(self,rejectfile,header):
+       self.rejectfile = rejectfile
+       self.header = header
+       self.file = None
+       self.count = 0
+
+    def write(self,recnum,row,error):
+       if self.file is None:
+          newfile = os.path.isfile(self.rejectfile)==False or os.path.getsize(self.rejectfile) == 0
+          self.file = open(self.rejectfile,"a",newline="",encoding="utf-8")
+          self.writer = csv.writer(self.file)
+          if newfile:
+             self.writer.writerow(self.header + ["REJECT_RECORD","REJECT_ERROR"])
+       self.writer.writerow(list(row) + [recnum,str(error).replace("\n"," ")])
+       self.count += 1
+
+    def flush(self):
+       # Make rejects durable before the checkpoint that skips them
+       if self.file is not None:
+          self.file.flush()
+          os.fsync(self.file.fileno())
+
+    def offset(self):
+       # Reject file size saved in the checkpoint
+       if self.file is not None:
+          return self.file.tell()
+       if os.path.isfile(self.rejectfile):
+          return os.path.getsize(self.rejectfile)
+       return 0
+
+    def close(self):
+       if self.file is not None:
+          self.file.close()
+
+def get_table_columns(cursor,library,table):
+    #----------------------------------------------------------
+    # Function: get_table_columns
+    # Desc: Read column names, types and lengths for a table
+    #       from the DB2 catalog
+    # :cursor - Open ODBC cursor
+    # :library - IBMi library name for table
+    # :table - IBMi table name
+    # :return: Dictionary of column name to
+    #          (data type, length, scale, nullable)
+    #----------------------------------------------------------
+    sql = """select column_name,data_type,length,numeric_scale,is_nullable
+             from qsys2.syscolumns
+             where (table_schema=? or system_table_schema=?)
+               and (table_name=? or system_table_name=?)
+             order by ordinal_position"""
+    cursor.execute(sql,library,library,table,table)
+    columns = {}
+    for name, datatype, length, scale, nullable in cursor.fetchall():
+       columns[name.strip().upper()] = (datatype.strip().upper(),length,scale,nullable.strip() == "Y")
+    return columns
+
+def make_converter(datatype,length,scale,nullable):
+    #----------------------------------------------------------
+    # Function: make_converter
+    # Desc: Build the function that converts a CSV string value
+    #       to fit one column. Built once per column so no type
+    #       checks are repeated for every record.
+    # :datatype - DB2 data type
+    # :length - Column length or precision
+    # :scale - Decimal scale
+    # :nullable - True if column allows nulls
+    # :return: Function that takes a CSV string and returns the
+    #          value to bind to the insert parameter marker
+    #----------------------------------------------------------
+    if datatype in chartypes:
+       def convert(value):
+          value = value.rstrip()
+          if value == "" and nullable:
+             return None
+          return value[:length]
+    elif datatype in decimaltypes:
+       quantum = decimal.Decimal(1).scaleb(-(scale or 0))
+       def convert(value):
+          value = value.strip()
+          if value == "":
+             return None
+          return decimal.Decimal(value).quantize(quantum,rounding=decimal.ROUND_HALF_UP)
+    elif datatype in integertypes:
+       def convert(value):
+          value = value.strip()
+          if value == "":
+             return None
+          return int(decimal.Decimal(value))
+    elif datatype in floattypes:
+       def convert(value):
+          value = value.strip()
+          if value == "":
+             return None
+          return float(value)
+    else:
+       # Dates, times, timestamps and anything else are passed
+       # as strings and converted by DB2
+       def convert(value):
+          value = value.strip()
+          if value == "":
+             return None
+          return value
+    return convert
+
+def map_csv_columns(header,tablecolumns):
+    #----------------------------------------------------------
+    # Function: map_csv_columns
+    # Desc: Match CSV header names to table columns
+    # :header - List of CSV header names
+    # :tablecolumns - Dictionary from get_table_columns
+    # :return: List of (CSV field index, column name, converter)
+    #          for each CSV field that matches a table column
+    #----------------------------------------------------------
+    mapping = []
+    for index, csvname in enumerate(header):
+       name = csvname.strip().upper()
+       if name in tablecolumns:
+          mapping.append((index,name,make_converter(*tablecolumns[name])))
+    return mapping
+
+def build_insert_sql(library,table,mapping):
+    #----------------------------------------------------------
+    # Function: build_insert_sql
+    # Desc: Build insert statement with parameter markers
+    # :library - IBMi library name for table
+    # :table - IBMi table name
+    # :mapping - List from map_csv_columns
+    # :return: SQL insert statement
+    #----------------------------------------------------------
+    columnlist = ",".join('"' + name + '"' for index, name, convert in mapping)
+    markers = ",".join("?" for item in mapping)
+    return f"insert into {library}.{table} ({columnlist}) values({markers})"
+
+def convert_row(row,mapping):
+    #----------------------------------------------------------
+    # Function: convert_row
+    # Desc: Convert one CSV record to insert parameter values
+    # :row - List of CSV field values
+    # :mapping - List from map_csv_columns
+    # :return: Tuple of converted values in insert column order
+    #----------------------------------------------------------
+    values = []
+    for index, name, convert in mapping:
+       if index >= len(row):
+          values.append(None)
+          continue
+       try:
+          values.append(convert(row[index]))
+       except (ValueError,ArithmeticError):
+          raise ValueError(f"Column {name} value '{row[index]}' does not fit the column type")
+    return tuple(values)
+
+def import_csv_range(conn,cursor,sql,mapping,header,csvfilename,encoding,delimiter,
+                     startoffset,endoffset,tablename,checkpointfile,rejectfile,resume,
+                     batchsize,progressinterval,label,commitcontrol=True):
+    #----------------------------------------------------------
+    # Function: import_csv_range
+    # Desc: Insert the CSV records in one byte range of the file
+    #       in batches. Checkpoint after each batch, resume from
+    #       the checkpoint if found and reject bad records.
+    # :conn - Open ODBC connection
+    # :cursor - Open ODBC cursor
+    # :sql - Insert statement with parameter markers
+    # :mapping - List from map_csv_columns
+    # :header - CSV header row
+    # :csvfilename - CSV file
+    # :encoding - CSV file encoding
+    # :delimiter - CSV field delimiter
+    # :startoffset - Byte offset of the first record
+    # :endoffset - Byte offset to stop at. None=end of file
+    # :tablename - LIBRARY.TABLE saved in the checkpoint
+    # :checkpointfile - Checkpoint file for this range
+    # :rejectfile - Reject CSV file for this range
+    # :resume - True to resume from checkpoint file if found
+    # :batchsize - Records per executemany call and commit
+    # :progressinterval - Log progress every n records
+    # :label - Prefix for log messages
+    # :commitcontrol - True if a failed batch can be rolled back
+    # :return: Tuple of (records read, records inserted, records rejected)
+    #----------------------------------------------------------
+    reccounter = 0
+    rejectcount = 0
+    insertcount = 0
+
+    # Pick up where the last run stopped if there is a checkpoint
+    checkpoint = read_checkpoint(checkpointfile) if resume else None
+    if checkpoint is not None:
+       if checkpoint.get("table") != tablename or "offset" not in checkpoint:
+          raise Exception(f"Checkpoint file {checkpointfile} is not for this import of {tablename}. Process cancelled.")
+       if checkpoint["offset"] < startoffset or checkpoint["offset"] > (endoffset or os.path.getsize(csvfilename)):
+          raise Exception(f"Checkpoint file {checkpointfile} is outside {csvfilename}. Process cancelled.")
+       startoffset = checkpoint["offset"]
+       reccounter = checkpoint["records"]
+       rejectcount = checkpoint["rejects"]
+       # Drop rejects written after the checkpoint. They are rejected again.
+       if "rejectoffset" in checkpoint and os.path.isfile(rejectfile):
+          if os.path.getsize(rejectfile) > checkpoint["rejectoffset"]:
+             os.truncate(rejectfile,checkpoint["rejectoffset"])
+       print(f"{label}Resuming after record {reccounter} at byte offset {startoffset}")
+    elif os.path.isfile(rejectfile):
+       # New run. Rejects of an earlier run describe other records.
+       os.remove(rejectfile)
+
+    with open(csvfilename, "rb") as csv_file:
+       csv_file.seek(startoffset)
+       lines = OffsetLineReader(csv_file,encoding,endoffset)
+       csv_reader = csv.reader(lines,delimiter=delimiter)
+       rejects = RejectWriter(rejectfile,header)
+       batch = []
+       for row in csv_reader:
+
+          # Skip blank lines
+          if len(row) == 0:
+             continue
+
+          # Increment current record counter
+          reccounter += 1
+
+          # Reject records that can't be converted to the column types
+          try:
+             batch.append((reccounter,row,convert_row(row,mapping)))
+          except Exception as e:
+             rejects.write(reccounter,row,e)
+
+          # Insert and commit when the batch is full, then checkpoint
+          if len(batch) >= batchsize:
+             insertcount += insert_batch(conn,cursor,sql,batch,rejects,commitcontrol)
+             rejects.flush()
+             write_checkpoint(checkpointfile,{"table": tablename,
+                                              "offset": lines.offset,
+                                              "records": reccounter,
+                                              "rejects": rejectcount + rejects.count,
+                                              "rejectoffset": rejects.offset()})
+             batch = []
+
+          # Log progress periodically rather than for every record
+          if reccounter % progressinterval == 0:
+             print(f"{label}Processed records: {reccounter}")
+
+       # Insert and commit the last partial batch
+       if len(batch) > 0:
+          insertcount += insert_batch(conn,cursor,sql,batch,rejects,commitcontrol)
+       rejects.flush()
+       rejectoffset = rejects.offset()
+       rejects.close()
+       rejectcount += rejects.count
+
+       # Final checkpoint so a parallel rerun skips finished ranges.
+       # The caller deletes it once the whole import is done.
+       write_checkpoint(checkpointfile,{"table": tablename,
+                                        "offset": lines.offset,
+                                        "records": reccounter,
+                                        "rejects": rejectcount,
+                                        "rejectoffset": rejectoffset})
+
+    return (reccounter,insertcount,rejectcount)
+
+def find_chunk_offsets(csvfilename,dataoffset,chunks):
+    #----------------------------------------------------------
+    # Function: find_chunk_offsets
+    # Desc: Split the data part of a CSV file into byte ranges
+    #       that start on record boundaries. The file is mapped
+    #       with mmap and scanned once for double quotes so a
+    #       newline inside a quoted field is never used as a
+    #       split point.
+    # :csvfilename - CSV file
+    # :dataoffset - Byte offset of the first record after the header
+    # :chunks - Number of ranges wanted
+    # :return: List of (start offset, end offset). May be fewer
+    #          than chunks for small files.
+    #----------------------------------------------------------
+    filesize = os.path.getsize(csvfilename)
+    if filesize <= dataoffset:
+       return [(dataoffset,filesize)]
+
+    offsets = [dataoffset]
+    with open(csvfilename,"rb") as file:
+       with mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ) as mm:
+          quotes = 0
+          scanned = dataoffset
+          for i in range(1,chunks):
+             target = dataoffset + (filesize - dataoffset) * i // chunks
+             if target <= scanned:
+                continue
+             # Count quotes up to the nominal split point in 16MB slices
+             while scanned < target:
+                sliceend = min(scanned + 16777216,target)
+                quotes += mm[scanned:sliceend].count(b'"')
+                scanned = sliceend
+             # Move on to the next newline that is outside quotes
+             while scanned < filesize:
+                newline = mm.find(b"\n",scanned)
+                if newline == -1:
+                   scanned = filesize
+                   break
+                quotes += mm[scanned:newline].count(b'"')
+                scanned = newline + 1
+                if quotes % 2 == 0:
+                   break
+             if scanned < filesize:
+                offsets.append(scanned)
+
+    offsets.append(filesize)
+    return list(zip(offsets[:-1],offsets[1:]))
+
+def import_chunk_worker(job):
+    #----------------------------------------------------------
+    # Function: import_chunk_worker
+    # Desc: Worker process body. Import one byte range of the
+    #       CSV file over a new ODBC connection.
+    # :job - Dictionary of import_csv_range parms plus
+    #        connstring and tablecolumns
+    # :return: Tuple of (records read, records inserted, records rejected)
+    #----------------------------------------------------------
+    # Write whole log lines so output from workers does not interleave
+    sys.stdout.reconfigure(line_buffering=True)
+    conn = pyodbc.connect(job["connstring"])
+    try:
+       cursor = conn.cursor()
+       cursor.fast_executemany = True
+       mapping = map_csv_columns(job["header"],job["tablecolumns"])
+       result = import_csv_range(conn,cursor,job["sql"],mapping,job["header"],
+                                 job["csvfilename"],job["encoding"],job["delimiter"],
+                                 job["startoffset"],job["endoffset"],job["tablename"],
+                                 job["checkpointfile"],job["rejectfile"],job["resume"],
+                                 job["batchsize"],job["progressinterval"],job["label"],
+                                 has_commit_control(job["connstring"]))
+       cursor.close()
+    finally:
+       conn.close()
+    return result
+
+def merge_reject_files(rejectfile,partfiles,recordbases):
+    #----------------------------------------------------------
+    # Function: merge_reject_files
+    # Desc: Append worker reject files to the reject file,
+    #       changing record numbers within each range to record
+    #       numbers within the whole file, then delete them.
+    # :rejectfile - Reject CSV file
+    # :partfiles - List of worker reject files in range order
+    # :recordbases - Records in the file before each range
+    #----------------------------------------------------------
+    writer = None
+    for partfile, recordbase in zip(partfiles,recordbases):
+       if os.path.isfile(partfile)==False:
+          continue
+       with open(partfile,"r",newline="",encoding="utf-8") as part:
+          reader = csv.reader(part)
+          header = next(reader)
+          if writer is None:
+             newfile = os.path.isfile(rejectfile)==False or os.path.getsize(rejectfile) == 0
+             outfile = open(rejectfile,"a",newline="",encoding="utf-8")
+             writer = csv.writer(outfile)
+             if newfile:
+                writer.writerow(header)
+          for row in reader:
+             # Record number is the second last field
+             row[-2] = str(int(row[-2]) + recordbase)
+             writer.writerow(row)
+       os.remove(partfile)
+    if writer is not None:
+       outfile.close()
+
+#------------------------------------------------
+# Main script logic
+#------------------------------------------------
+try: # Try to perform main logic
+
+      # Set up the command line argument parsing.
+      # If the parse_args function fails, the program will
+      # exit with an error 2. In Python 3.9, there is
+      # an argument to prevent an auto-exit
+      # Each argument has a long and short version
+      parser = argparse.ArgumentParser()
+      parser.add_argument('-csv','--csvfile', required=True,help="CSV file to import. First row must be column names")
+      parser.add_argument('-lib','--library', required=True,help="DB2 library/schema of the target table")
+      parser.add_argument('-table','--table', required=True,help="DB2 target table")
+      parser.add_argument('-conn','--connstring', default="DSN=*LOCAL;CommitMode=2",required=False,help="ODBC connection string. Default value=DSN=*LOCAL;CommitMode=2")
+      parser.add_argument('-batch','--batchsize', default="1000",required=False,help="Records per insert batch and commit. Default value=1000")
+      parser.add_argument('-progress','--progressinterval', default="10000",required=False,help="Log progress every n records. Default value=10000")
+      parser.add_argument('-delim','--delimiter', default=",",required=False,help="CSV field delimiter. Default value=,")
+      parser.add_argument('-encoding','--encoding', default="utf-8",required=False,help="CSV file encoding. Default value=utf-8")
+      parser.add_argument('-checkpoint','--checkpointfile', default="",required=False,help="Checkpoint file. Default value=<csvfile>.checkpoint")
+      parser.add_argument('-reject','--rejectfile', default="",required=False,help="Reject CSV file. Default value=<csvfile>.rejects.csv")
+      parser.add_argument('-resume','--resume', default="True",required=False,help="Resume from checkpoint file if found. Default value=True")
+      parser.add_argument('-workers','--workers', default="1",required=False,help="Number of worker processes. Default value=1")
+
+      # Parse the command line arguments
+      args = parser.parse_args()
+
+      # Pull arguments into variables so they are meaningful
+      csv_filename=args.csvfile.strip()
+      ibmi_library=args.library.strip().upper()
+      ibmi_file=args.table.strip().upper()
+      connstring=args.connstring.strip()
+      batchsize=int(args.batchsize)
+      progressinterval=int(args.progressinterval)
+      delimiter=args.delimiter
+      encoding=args.encoding.strip()
+      checkpointfile=args.checkpointfile.strip() or csv_filename + ".checkpoint"
+      rejectfile=args.rejectfile.strip() or csv_filename + ".rejects.csv"
+      resume=str2bool(args.resume)
+      workers=int(args.workers)
+
+      # Output parameter variables to log file
+      print("Parameters:")
+      print(f"CSV file: {csv_filename}")
+      print(f"Table: {ibmi_library}/{ibmi_file}")
+      print(f"Batch size: {batchsize}")
+      print(f"Checkpoint file: {checkpointfile}")
+      print(f"Reject file: {rejectfile}")
+      print(f"Resume: {resume}")
+      print(f"Workers: {workers}")
+
+      # Bail if CSV file not found
+      if os.path.isfile(csv_filename)==False:
+        raise Exception(f"CSV file {csv_filename} doesn't exist. Process cancelled.")
+
+      # Open ODBC connection
+      conn = pyodbc.connect(connstring)
+
+      # Get cursor for open connection
+      c = conn.cursor()
+      c.fast_executemany = True
+
+      # Read the table layout once from the catalog
+      tablecolumns = get_table_columns(c,ibmi_library,ibmi_file)
+      if len(tablecolumns) == 0:
+        raise Exception(f"Table {ibmi_library}/{ibmi_file} not found. Process cancelled.")
+
+      # Read the header row and match it to the table
+      print(f"Opening CSV File {csv_filename}")
+      with open(csv_filename, "rb") as csv_file:
+        lines = OffsetLineReader(csv_file,encoding)
+        header = next(csv.reader(lines,delimiter=delimiter))
+        dataoffset = lines.offset
+      mapping = map_csv_columns(header,tablecolumns)
+      for csvname in header:
+        if csvname.strip().upper() not in tablecolumns:
+          print(f"CSV column {csvname} is not in the table and will be skipped")
+      if len(mapping) == 0:
+        raise Exception(f"No CSV columns match columns in {ibmi_library}/{ibmi_file}. Process cancelled.")
+      sql = build_insert_sql(ibmi_library,ibmi_file,mapping)
+      print(f"Insert SQL: {sql}")
+      tablename = f"{ibmi_library}.{ibmi_file}"
+
+      # Parallel runs keep their byte ranges in the checkpoint file
+      # so a rerun resumes the same ranges
+      checkpoint = read_checkpoint(checkpointfile) if resume else None
+      if checkpoint is not None and "chunks" in checkpoint:
+        if checkpoint["table"] != tablename:
+          raise Exception(f"Checkpoint file {checkpointfile} is for table {checkpoint['table']}. Process cancelled.")
+        chunks = [tuple(chunk) for chunk in checkpoint["chunks"]]
+        print(f"Resuming parallel import of {len(chunks)} ranges")
+      elif workers > 1:
+        if checkpoint is not None:
+          raise Exception(f"Checkpoint file {checkpointfile} is from a run with 1 worker. Rerun with --workers 1 or --resume False. Process cancelled.")
+        chunks = find_chunk_offsets(csv_filename,dataoffset,workers)
+        write_checkpoint(checkpointfile,{"table": tablename,"chunks": chunks})
+        # New run. Range rejects are merged into a new reject file.
+        if os.path.isfile(rejectfile):
+          os.remove(rejectfile)
+      else:
+        chunks = None
+
+      # Read in each CSV record and insert to IBM i table in batches
+      print(f"Iterating CSV Records")
+      starttime = time.time()
+      if chunks is None:
+        reccounter, insertcount, rejectcount = import_csv_range(conn,c,sql,mapping,header,csv_filename,
+                                                                encoding,delimiter,dataoffset,None,
+                                                                tablename,checkpointfile,rejectfile,
+                                                                resume,batchsize,progressinterval,"",
+                                                                has_commit_control(connstring))
+        c.close()
+        conn.close()
+
+        # All done. Next run starts from the top.
+        os.remove(checkpointfile)
+      else:
+        # Workers open their own connections
+        c.close()
+        conn.close()
+        print(f"Importing {len(chunks)} ranges in parallel")
+        jobs = [{"connstring": connstring, "tablecolumns": tablecolumns, "sql": sql,
+                 "header": header, "csvfilename": csv_filename, "encoding": encoding,
+                 "delimiter": delimiter, "startoffset": start, "endoffset": end,
+                 "tablename": tablename, "checkpointfile": f"{checkpointfile}.{n + 1}",
+                 "rejectfile": f"{rejectfile}.{n + 1}", "resume": resume,
+                 "batchsize": batchsize, "progressinterval": progressinterval,
+                 "label": f"Range {n + 1}: "}
+                for n, (start, end) in enumerate(chunks)]
+
+        # Worker processes use fork so the script is not re-run in each child
+        with multiprocessing.get_context("fork").Pool(len(jobs)) as pool:
+          results = pool.map(import_chunk_worker,jobs)
+
+        # Total the counts and merge rejects with file-wide record numbers
+        recordbases = []
+        reccounter = 0
+        for records, inserted, rejected in results:
+          recordbases.append(reccounter)
+          reccounter += records
+        insertcount = sum(result[1] for result in results)
+        rejectcount = sum(result[2] for result in results)
+        merge_reject_files(rejectfile,[job["rejectfile"] for job in jobs],recordbases)
+
+        # All done. Next run starts from the top.
+        for job in jobs:
+          os.remove(job["checkpointfile"])
+        os.remove(checkpointfile)
+
+      # Throughput report
+      elapsed = time.time() - starttime
+      recspersec = int(insertcount / elapsed) if elapsed > 0 else insertcount
+      print(f"Inserted {insertcount} records in {elapsed:.2f} seconds. {recspersec} records/sec")
+      if rejectcount > 0:
+        print(f"Rejected {rejectcount} records. See {rejectfile}")
+
+      # Set success info
+      exitcode=0
+      exitmessage=f"Completed successfully. {reccounter} records read. {insertcount} records inserted. {rejectcount} records rejected. {recspersec} records/sec."
+
+#------------------------------------------------
+# Handle Exceptions
+#------------------------------------------------
+except Exception as ex: # Catch and handle exceptions
+   exitcode=99 # set return code for stdout
+   exitmessage=str(ex) # set exit message for stdout
+   print('Traceback Info') # output traceback info for stdout
+   traceback.print_exc()
+
+#------------------------------------------------
+# Always perform final processing
+#------------------------------------------------
+finally: # Final processing
+    # Do any final code and exit now
+    # We log as much relevent info to STDOUT as needed
+    print('ExitCode:' + str(exitcode))
+    print('ExitMessage:' + exitmessage)
+    print("End of Main Processing - " + time.strftime("%H:%M:%S"))
+    print("-------------------------------------------------------------------------------")
+
+    # Exit the script now
+    sys.exit(exitcode)
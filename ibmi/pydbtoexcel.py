@@ -4,16 +4,54 @@
 #
 # Description: 
 # This script will operform an SQL query and export
-# the results to an Excel file using Pandas
+# the results to an Excel file using Pandas.
+# Results can also be streamed to CSV, Parquet or
+# Arrow IPC files for downstream Spark/DuckDB jobs.
 #
 # Pip packages needed:
 # pip3 install pandas
 # pip3 install xlsxwriter
+# pip3 install pyarrow (only for Parquet/Arrow output)
 #
 # Parameters
 # P1=SQL query Ex: select * from qiws.qcustcdt
 # P2=Output excel file. Ex: /tmp/excelfile.xlsx
+#    The extension picks the output format unless --format is passed:
+#    .xlsx=Excel, .csv=CSV, .parquet=Parquet, .arrow/.feather/.ipc=Arrow IPC
 # p3=Replace existing=True-replace, False-Do not replace
+# --streaming/-stream=Stream rows from the cursor straight to the
+#   worksheet instead of loading a DataFrame. Keeps memory flat
+#   for very large results. True/False Default=False
+# --batchsize/-batch=Rows per cursor fetchmany when streaming. Default=10000
+# --sheetrows/-sheetrows=Data rows per worksheet before rolling over to a
+#   new worksheet. Default=1048575 (Excel limit less the heading row)
+# --filerows/-filerows=Data rows per workbook file before rolling over to
+#   a new file named <file>_001.xlsx, <file>_002.xlsx, etc.
+#   Implies streaming mode. Default=0 (single file)
+# --workers/-workers=Number of worker processes writing shard files in
+#   parallel when --filerows is used. Default=1
+# --format/-format=Output format: auto, xlsx, csv, parquet or arrow.
+#   auto picks the format from the output file extension. CSV, Parquet
+#   and Arrow are always streamed from the cursor, one Parquet row group
+#   or Arrow record batch per fetch batch. Default=auto
+# --benchmarkrows/-benchrows=Skip the database and write this many rows
+#   of a synthetic order table in every output format, reporting wall
+#   time and file size per format. P1 is ignored. Default=0 (off)
+#   Ex: pydbtoexcel.py bench /tmp/bench.xlsx True --benchmarkrows 1000000
+# --partcolumn/-partcol=Numeric column used to split the query into key
+#   ranges that are extracted in parallel, each over its own connection.
+#   Partial results are spooled to temp files and merged into the output
+#   in key range order. Only the order of the ranges is kept. An ORDER BY
+#   in the query is not applied within each range. Implies streaming
+#   mode. Default=blank (off)
+# --partitions/-parts=Number of key ranges and extract worker processes
+#   when --partcolumn is used. Default=4
+#
+# Returns
+# RTNEXCELFILE:<output file> (one line per shard file)
+# RTNROWCOUNT:<rows exported>
+# RTNROWSPERSEC:<rows per second>
+# RTNPEAKMEMMB:<peak resident memory in MB>
 #------------------------------------------------
 
 #------------------------------------------------
@@ -24,11 +62,33 @@ from sys import platform
 import os
 import time
 import traceback
+import argparse
+import csv
+import decimal
+import datetime
+import glob
+import multiprocessing
+import pickle
+import queue
+import tempfile
 import xlsxwriter
 import pandas as pd
 
 import ibm_db_dbi as db2 
 
+# pyarrow is only needed for Parquet/Arrow output
+try:
+   import pyarrow as pa
+   import pyarrow.parquet as pq
+except ImportError:
+   pa = None
+
+# resource is not available on Windows
+try:
+   import resource
+except ImportError:
+   resource = None
+
 #------------------------------------------------
 # Script initialization
 #------------------------------------------------
@@ -37,6 +97,10 @@ import ibm_db_dbi as db2
 exitcode=0 #Init exitcode
 exitmessage=''
 parmsexpected=3;
+maxsheetrows=1048575 # Excel 1,048,576 row limit less the heading row
+# Output format by file extension
+outputformats={".xlsx": "xlsx", ".csv": "csv", ".parquet": "parquet",
+               ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
 
 #Output messages to STDOUT for logging
 print("-------------------------------------------------------------------------------")
@@ -44,6 +108,660 @@ print("DB2 Query to Excel File")
 print("Start of Main Processing - " + time.strftime("%H:%M:%S"))
 print("OS:" + platform)
 
+#------------------------------------------------
+# Define some useful functions
+#------------------------------------------------
+
+def str2bool(strval):
+    #-------------------------------------------------------
+    # Function: str2bool
+    # Desc: Constructor
+    # :strval: String value for true or false
+    # :return: Return True if string value is" yes, true, t or 1
+    #-------------------------------------------------------
+    return strval.lower() in ("yes", "true", "t", "1")
+
+def get_peak_memory_mb():
+    #-------------------------------------------------------
+    # Function: get_peak_memory_mb
+    # Desc: Get peak resident memory used by this process
+    # :return: Peak memory in MB or 0 if not available
+    #-------------------------------------------------------
+    if resource is None:
+       return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on Mac and KB everywhere else
+    if platform == "darwin":
+       return peak / (1024 * 1024)
+    return peak / 1024
+
+def get_output_format(outputfile,outputformat):
+    #-------------------------------------------------------
+    # Function: get_output_format
+    # Desc: Resolve output format from parm or file extension
+    # :outputfile: Output file
+    # :outputformat: auto, xlsx, csv, parquet or arrow
+    # :return: Output format. xlsx if extension is not known
+    #-------------------------------------------------------
+    outputformat = outputformat.lower()
+    if outputformat == "auto":
+       ext = os.path.splitext(outputfile)[1].lower()
+       return outputformats.get(ext,"xlsx")
+    if outputformat not in outputformats.values():
+       raise Exception('Output format ' + outputformat + ' is not valid. Use auto, xlsx, csv, parquet or arrow.')
+    return outputformat
+
+def shard_file_name(outputfile,shardnum):
+    #-------------------------------------------------------
+    # Function: shard_file_name
+    # Desc: Build shard file name. Ex: /tmp/out.xlsx -> /tmp/out_001.xlsx
+    # :outputfile: Output file
+    # :shardnum: Shard number starting at 1
+    # :return: Shard file name
+    #-------------------------------------------------------
+    base, ext = os.path.splitext(outputfile)
+    return base + "_" + str(shardnum).zfill(3) + ext
+
+def arrow_field_types(description):
+    #-------------------------------------------------------
+    # Function: arrow_field_types
+    # Desc: Map cursor column descriptions to Arrow types so
+    #       every shard of one extract gets the same schema,
+    #       even when a column is all nulls in the first batch.
+    # :description: cursor.description
+    # :return: List of Arrow types. None for a column whose
+    #          type is not known. None if pyarrow is missing.
+    #-------------------------------------------------------
+    if pa is None:
+       return None
+    fieldtypes = []
+    for col in description:
+       typecode, precision, scale = col[1], col[4], col[5]
+       fieldtype = None
+       if typecode is not None:
+          # ibm_db_dbi type objects compare equal to their DB2 type names
+          if typecode == getattr(db2,"DECIMAL",None):
+             if not precision or precision > 38:
+                precision = 38
+             fieldtype = pa.decimal128(precision,scale or 0)
+          elif typecode in (getattr(db2,"NUMBER",None),getattr(db2,"BIGINT",None)):
+             fieldtype = pa.int64()
+          elif typecode == getattr(db2,"FLOAT",None):
+             fieldtype = pa.float64()
+          elif typecode == getattr(db2,"DATE",None):
+             fieldtype = pa.date32()
+          elif typecode == getattr(db2,"TIME",None):
+             fieldtype = pa.time64("us")
+          elif typecode == getattr(db2,"DATETIME",None):
+             fieldtype = pa.timestamp("us")
+          elif typecode == getattr(db2,"BINARY",None):
+             fieldtype = pa.binary()
+          elif typecode in (getattr(db2,"STRING",None),getattr(db2,"TEXT",None),getattr(db2,"XML",None)):
+             fieldtype = pa.string()
+       fieldtypes.append(fieldtype)
+    return fieldtypes
+
+def fetch_batches(cursor,batchsize):
+    #-------------------------------------------------------
+    # Function: fetch_batches
+    # Desc: Generator that returns cursor rows in fetchmany batches
+    # :cursor: Cursor with executed query
+    # :batchsize: Rows per fetchmany call
+    # :return: Yields list of rows until cursor is exhausted
+    #-------------------------------------------------------
+    while True:
+       rows = cursor.fetchmany(batchsize)
+       if not rows:
+          break
+       yield rows
+
+class ExcelShardWriter:
+    #-------------------------------------------------------
+    # Class: ExcelShardWriter
+    # Desc: Write rows to one xlsxwriter constant_memory workbook,
+    #       rolling over to a new worksheet every sheetrows rows.
+    #       Only the current row is held in memory.
+    # :excelfile: Excel output file
+    # :columns: List of column headings
+    # :sheetrows: Data rows per worksheet
+    #-------------------------------------------------------
+    def __init__(self,excelfile,columns,sheetrows):
+       # constant_memory flushes each row to disk once the next row starts
+       self.workbook = xlsxwriter.Workbook(excelfile,{'constant_memory': True,
+                                                     'strings_to_urls': False,
+                                                     'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+       self.columns = columns
+       self.sheetrows = sheetrows
+       self.rowcount = 0
+       self.add_sheet()
+
+    def add_sheet(self):
+       # Start a new worksheet with column headings
+       self.worksheet = self.workbook.add_worksheet()
+       self.worksheet.write_row(0,0,self.columns)
+       self.sheetrow = 0
+
+    def write_rows(self,rows):
+       for row in rows:
+          if self.sheetrow >= self.sheetrows:
+             self.add_sheet()
+          self.sheetrow += 1
+          self.worksheet.write_row(self.sheetrow,0,row)
+       self.rowcount += len(rows)
+
+    def close(self):
+       self.workbook.close()
+
+class CsvShardWriter:
+    #-------------------------------------------------------
+    # Class: CsvShardWriter
+    # Desc: Stream rows to a CSV file with a heading row
+    # :csvfile: CSV output file
+    # :columns: List of column headings
+    #-------------------------------------------------------
+    def __init__(self,csvfile,columns):
+       self.file = open(csvfile,"w",newline="",encoding="utf-8")
+       self.writer = csv.writer(self.file)
+       self.writer.writerow(columns)
+       self.rowcount = 0
+
+    def write_rows(self,rows):
+       self.writer.writerows(rows)
+       self.rowcount += len(rows)
+
+    def close(self):
+       self.file.close()
+
+class ArrowShardWriter:
+    #-------------------------------------------------------
+    # Class: ArrowShardWriter
+    # Desc: Stream rows to a Parquet or Arrow IPC file. Each
+    #       batch of rows becomes one Parquet row group or one
+    #       Arrow record batch. Column types come from the
+    #       cursor description. Columns of unknown type are
+    #       typed from the first batch.
+    # :outputfile: Output file
+    # :columns: List of column names
+    # :outputformat: parquet or arrow
+    # :fieldtypes: List of Arrow types from arrow_field_types
+    #-------------------------------------------------------
+    def __init__(self,outputfile,columns,outputformat,fieldtypes=None):
+       if pa is None:
+          raise Exception('pyarrow is required for ' + outputformat + ' output. pip3 install pyarrow')
+       self.outputfile = outputfile
+       self.columns = columns
+       self.outputformat = outputformat
+       self.fieldtypes = fieldtypes or [None] * len(columns)
+       # Columns of unknown type that were all nulls in the first batch
+       self.textcolumns = []
+       self.schema = None
+       self.writer = None
+       self.rowcount = 0
+
+    def open_writer(self):
+       if self.outputformat == "parquet":
+          self.writer = pq.ParquetWriter(self.outputfile,self.schema)
+       else:
+          self.writer = pa.ipc.new_file(self.outputfile,self.schema)
+
+    def infer_schema(self,values):
+       fields = []
+       for colnum, (name, fieldtype) in enumerate(zip(self.columns,self.fieldtypes)):
+          if fieldtype is not None:
+             fields.append(pa.field(name,fieldtype))
+             continue
+          fieldtype = pa.array(values[colnum]).type
+          # Column with only nulls so far. Store as string.
+          if pa.types.is_null(fieldtype):
+             fieldtype = pa.string()
+             self.textcolumns.append(colnum)
+          # Widen decimals so later batches with bigger values still fit
+          elif pa.types.is_decimal(fieldtype):
+             fieldtype = pa.decimal128(38,fieldtype.scale)
+          fields.append(pa.field(name,fieldtype))
+       self.schema = pa.schema(fields)
+
+    def write_rows(self,rows):
+       if not rows:
+          return
+       # Pivot row tuples into columns
+       values = list(zip(*rows))
+       if self.schema is None:
+          self.infer_schema(values)
+          self.open_writer()
+       # Later values in a column typed from nulls are stored as text
+       for colnum in self.textcolumns:
+          values[colnum] = [value if value is None or isinstance(value,str) else str(value)
+                            for value in values[colnum]]
+       arrays = [pa.array(column,type=field.type) for column, field in zip(values,self.schema)]
+       batch = pa.RecordBatch.from_arrays(arrays,schema=self.schema)
+       if self.outputformat == "parquet":
+          self.writer.write_table(pa.Table.from_batches([batch]))
+       else:
+          self.writer.write_batch(batch)
+       self.rowcount += len(rows)
+
+    def close(self):
+       # Empty result still gets a file with the column names
+       if self.writer is None:
+          self.schema = pa.schema([pa.field(name,fieldtype or pa.string())
+                                   for name, fieldtype in zip(self.columns,self.fieldtypes)])
+          self.open_writer()
+       self.writer.close()
+
+def open_shard_writer(outputfile,columns,sheetrows,outputformat,fieldtypes=None):
+    #-------------------------------------------------------
+    # Function: open_shard_writer
+    # Desc: Open the writer for the selected output format
+    # :outputfile: Output file
+    # :columns: List of column headings
+    # :sheetrows: Data rows per worksheet. Only used for xlsx.
+    # :outputformat: xlsx, csv, parquet or arrow
+    # :fieldtypes: Arrow column types. Only used for parquet/arrow.
+    # :return: Writer with write_rows and close methods
+    #-------------------------------------------------------
+    if outputformat == "csv":
+       return CsvShardWriter(outputfile,columns)
+    if outputformat in ("parquet","arrow"):
+       return ArrowShardWriter(outputfile,columns,outputformat,fieldtypes)
+    return ExcelShardWriter(outputfile,columns,sheetrows)
+
+def write_shard_worker(outputfile,columns,sheetrows,outputformat,fieldtypes,rowqueue):
+    #-------------------------------------------------------
+    # Function: write_shard_worker
+    # Desc: Worker process body. Write row batches taken from
+    #       the queue to one shard file until None is received.
+    # :outputfile: Shard file name
+    # :columns: List of column headings
+    # :sheetrows: Data rows per worksheet
+    # :outputformat: xlsx, csv, parquet or arrow
+    # :fieldtypes: Arrow column types
+    # :rowqueue: multiprocessing queue of row batches
+    #-------------------------------------------------------
+    writer = open_shard_writer(outputfile,columns,sheetrows,outputformat,fieldtypes)
+    while True:
+       rows = rowqueue.get()
+       if rows is None:
+          break
+       writer.write_rows(rows)
+    writer.close()
+
+class ShardWriterProcess:
+    #-------------------------------------------------------
+    # Class: ShardWriterProcess
+    # Desc: Same write_rows/close interface as the shard writers
+    #       but the file is written by a worker process.
+    #       The queue is bounded so the reader cannot run far
+    #       ahead of a slow writer. If the worker dies the next
+    #       write or close raises instead of waiting forever.
+    # :mpcontext: multiprocessing context
+    # :outputfile: Shard file name
+    # :columns: List of column headings
+    # :sheetrows: Data rows per worksheet
+    # :outputformat: xlsx, csv, parquet or arrow
+    # :fieldtypes: Arrow column types
+    #-------------------------------------------------------
+    def __init__(self,mpcontext,outputfile,columns,sheetrows,outputformat,fieldtypes=None):
+       self.outputfile = outputfile
+       self.rowqueue = mpcontext.Queue(maxsize=4)
+       self.process = mpcontext.Process(target=write_shard_worker,
+                                        args=(outputfile,columns,sheetrows,outputformat,fieldtypes,self.rowqueue))
+       self.process.start()
+
+    def _put(self,item):
+       # Wait for queue space while the worker is still running
+       while True:
+          try:
+             self.rowqueue.put(item,timeout=1)
+             return
+          except queue.Full:
+             if not self.process.is_alive():
+                self.rowqueue.cancel_join_thread()
+                raise Exception('Worker writing ' + self.outputfile + ' stopped with exit code ' + str(self.process.exitcode))
+
+    def write_rows(self,rows):
+       self._put(rows)
+
+    def close(self):
+       self._put(None)
+
+    def terminate(self):
+       # Stop the worker after a failure elsewhere
+       if self.process.is_alive():
+          self.process.terminate()
+       self.process.join()
+       self.rowqueue.cancel_join_thread()
+
+    def join(self):
+       self.process.join()
+       if self.process.exitcode != 0:
+          self.rowqueue.cancel_join_thread()
+          raise Exception('Worker writing ' + self.outputfile + ' failed with exit code ' + str(self.process.exitcode))
+
+def write_shards(outputfile,columns,batches,sheetrows,filerows,workers,outputformat,fieldtypes=None):
+    #-------------------------------------------------------
+    # Function: write_shards
+    # Desc: Write row batches to one file, or to a new shard
+    #       file every filerows rows. Shards are written by
+    #       up to workers processes in parallel when workers > 1.
+    # :outputfile: Output file
+    # :columns: List of column headings
+    # :batches: Iterable of row batches
+    # :sheetrows: Data rows per worksheet
+    # :filerows: Data rows per file. 0=single file
+    # :workers: Number of parallel shard writer processes
+    # :outputformat: xlsx, csv, parquet or arrow
+    # :fieldtypes: Arrow column types shared by all shards
+    # :return: List of (file name, row count) for each file written
+    #-------------------------------------------------------
+    shards = []
+    active = []
+    writer = None
+    shardrows = 0
+    limit = filerows if filerows > 0 else sys.maxsize
+    # Worker processes use fork so the script is not re-run in each child
+    mpcontext = multiprocessing.get_context("fork") if workers > 1 else None
+
+    def open_shard():
+       # Open the next shard writer, waiting for a free worker if needed
+       shardfile = shard_file_name(outputfile,len(shards) + 1) if filerows > 0 else outputfile
+       shards.append([shardfile,0])
+       if mpcontext is None:
+          return open_shard_writer(shardfile,columns,sheetrows,outputformat,fieldtypes)
+       while len(active) >= workers:
+          active.pop(0).join()
+       shardwriter = ShardWriterProcess(mpcontext,shardfile,columns,sheetrows,outputformat,fieldtypes)
+       active.append(shardwriter)
+       return shardwriter
+
+    try:
+       for rows in batches:
+          start = 0
+          while start < len(rows):
+             if writer is None or shardrows >= limit:
+                if writer is not None:
+                   writer.close()
+                writer = open_shard()
+                shardrows = 0
+             take = min(len(rows) - start,limit - shardrows)
+             writer.write_rows(rows[start:start + take])
+             shards[-1][1] += take
+             shardrows += take
+             start += take
+
+       # Empty result still gets a file with column headings
+       if writer is None:
+          writer = open_shard()
+       writer.close()
+    except BaseException:
+       # Don't leave workers waiting for rows that won't come
+       for shardwriter in active:
+          shardwriter.terminate()
+       active.clear()
+       raise
+    finally:
+       # Wait for any shard still being written
+       for shardwriter in active:
+          shardwriter.join()
+
+    return [tuple(shard) for shard in shards]
+
+def export_streaming(conn,sqlquery,outputfile,batchsize,sheetrows,filerows,workers,outputformat):
+    #-------------------------------------------------------
+    # Function: export_streaming
+    # Desc: Run query and write rows to the output file in
+    #       fetchmany batches. Excel uses xlsxwriter
+    #       constant_memory workbooks. Only one batch per
+    #       writer is held in memory.
+    # :conn: Open DB2 connection
+    # :sqlquery: SQL query to run
+    # :outputfile: Output file
+    # :batchsize: Rows per fetchmany call
+    # :sheetrows: Data rows per worksheet
+    # :filerows: Data rows per file. 0=single file
+    # :workers: Number of parallel shard writer processes
+    # :outputformat: xlsx, csv, parquet or arrow
+    # :return: List of (file name, row count) for each file written
+    #-------------------------------------------------------
+    cursor = conn.cursor()
+    cursor.execute(sqlquery)
+    columns = [col[0] for col in cursor.description]
+    shards = write_shards(outputfile,columns,fetch_batches(cursor,batchsize),
+                          sheetrows,filerows,workers,outputformat,
+                          arrow_field_types(cursor.description))
+    cursor.close()
+    return shards
+
+def sql_number(value):
+    #-------------------------------------------------------
+    # Function: sql_number
+    # Desc: Format a number as an SQL literal
+    # :value: int, float or Decimal
+    # :return: Literal without exponent notation
+    #-------------------------------------------------------
+    if isinstance(value,decimal.Decimal):
+       return format(value,'f')
+    return str(value)
+
+def partition_where_clauses(partcolumn,lowvalue,highvalue,partitions):
+    #-------------------------------------------------------
+    # Function: partition_where_clauses
+    # Desc: Split the key range lowvalue-highvalue into equal
+    #       ranges. Nulls go to the first range so no rows
+    #       are lost.
+    # :partcolumn: Partition column name
+    # :lowvalue: Lowest key value
+    # :highvalue: Highest key value
+    # :partitions: Number of ranges wanted
+    # :return: List of SQL where clauses in key order
+    #-------------------------------------------------------
+    if isinstance(lowvalue,int) and isinstance(highvalue,int):
+       bounds = [lowvalue + (highvalue - lowvalue) * i // partitions for i in range(partitions + 1)]
+    else:
+       step = (highvalue - lowvalue) / partitions
+       bounds = [lowvalue + step * i for i in range(partitions)] + [highvalue]
+
+    # Small key ranges can produce the same bound more than once
+    bounds = sorted(set(bounds))
+    if len(bounds) == 1:
+       bounds.append(bounds[0])
+
+    clauses = []
+    for i in range(len(bounds) - 1):
+       upperop = " <= " if i == len(bounds) - 2 else " < "
+       clause = "(" + partcolumn + " >= " + sql_number(bounds[i]) + " and " + partcolumn + upperop + sql_number(bounds[i + 1]) + ")"
+       if i == 0:
+          clause = "(" + clause + " or " + partcolumn + " is null)"
+       clauses.append(clause)
+    return clauses
+
+def extract_partition_worker(job):
+    #-------------------------------------------------------
+    # Function: extract_partition_worker
+    # Desc: Worker process body. Run one key range query over a
+    #       new connection and spool the row batches to a file.
+    # :job: Tuple of (key range SQL query, rows per fetchmany
+    #       call, temp file for pickled row batches)
+    # :return: Row count
+    #-------------------------------------------------------
+    sqlquery, batchsize, spoolfile = job
+    rowcount = 0
+    conn = db2.connect()
+    try:
+       cursor = conn.cursor()
+       cursor.execute(sqlquery)
+       with open(spoolfile,"wb") as spool:
+          for rows in fetch_batches(cursor,batchsize):
+             pickle.dump(rows,spool,pickle.HIGHEST_PROTOCOL)
+             rowcount += len(rows)
+       cursor.close()
+    finally:
+       conn.close()
+    return rowcount
+
+def read_spool_batches(spoolfile):
+    #-------------------------------------------------------
+    # Function: read_spool_batches
+    # Desc: Generator that returns row batches from a spool file
+    # :spoolfile: Temp file of pickled row batches
+    # :return: Yields list of rows until end of file
+    #-------------------------------------------------------
+    with open(spoolfile,"rb") as spool:
+       while True:
+          try:
+             yield pickle.load(spool)
+          except EOFError:
+             break
+
+def export_partitioned(sqlquery,outputfile,batchsize,sheetrows,filerows,workers,outputformat,partcolumn,partitions):
+    #-------------------------------------------------------
+    # Function: export_partitioned
+    # Desc: Split the query on key ranges of partcolumn and run
+    #       the range queries concurrently in a process pool,
+    #       each over its own connection. Ranges are merged
+    #       into the output file in key order as soon as each
+    #       one is done, while later ranges are still running.
+    #       Rows within a range are not sorted by the query's
+    #       ORDER BY.
+    # :sqlquery: SQL query to run
+    # :outputfile: Output file
+    # :batchsize: Rows per fetchmany call
+    # :sheetrows: Data rows per worksheet
+    # :filerows: Data rows per file. 0=single file
+    # :workers: Number of parallel shard writer processes
+    # :outputformat: xlsx, csv, parquet or arrow
+    # :partcolumn: Numeric partition column
+    # :partitions: Number of key ranges and worker processes
+    # :return: List of (file name, row count) for each file written
+    #-------------------------------------------------------
+    # Get column headings and the key range over a short-lived
+    # connection. It is closed before the pool forks, so no worker
+    # inherits a live CLI connection handle.
+    conn = db2.connect()
+    try:
+       cursor = conn.cursor()
+       cursor.execute("select * from (" + sqlquery + ") as q where 1=0")
+       columns = [col[0] for col in cursor.description]
+       fieldtypes = arrow_field_types(cursor.description)
+       cursor.execute("select min(" + partcolumn + "), max(" + partcolumn + ") from (" + sqlquery + ") as q")
+       lowvalue, highvalue = cursor.fetchone()
+       cursor.close()
+
+       # No keys at all. Plain streaming export is all we need.
+       if lowvalue is None:
+          return export_streaming(conn,sqlquery,outputfile,batchsize,sheetrows,filerows,workers,outputformat)
+    finally:
+       conn.close()
+    if not isinstance(lowvalue,(int,float,decimal.Decimal)):
+       raise Exception('Partition column ' + partcolumn + ' must be numeric. Process cancelled.')
+
+    clauses = partition_where_clauses(partcolumn,lowvalue,highvalue,partitions)
+    print("Partition ranges: " + str(len(clauses)))
+
+    # One spool file per range
+    spoolfiles = []
+    for clause in clauses:
+       spoolhandle, spoolfile = tempfile.mkstemp(prefix="pydbtoexcel_",suffix=".part")
+       os.close(spoolhandle)
+       spoolfiles.append(spoolfile)
+    jobs = [("select * from (" + sqlquery + ") as q where " + clause,batchsize,spoolfile)
+            for clause, spoolfile in zip(clauses,spoolfiles)]
+
+    def merged_batches(results):
+       # Read back each range in key order as soon as it is done
+       for spoolfile, rowcount in zip(spoolfiles,results):
+          yield from read_spool_batches(spoolfile)
+          os.remove(spoolfile)
+
+    try:
+       # Worker processes use fork so the script is not re-run in each child
+       with multiprocessing.get_context("fork").Pool(len(jobs)) as pool:
+          results = pool.imap(extract_partition_worker,jobs)
+          shards = write_shards(outputfile,columns,merged_batches(results),
+                                sheetrows,filerows,workers,outputformat,fieldtypes)
+    finally:
+       for spoolfile in spoolfiles:
+          if os.path.isfile(spoolfile):
+             os.remove(spoolfile)
+
+    return shards
+
+class SyntheticCursor:
+    #-------------------------------------------------------
+    # Class: SyntheticCursor
+    # Desc: Stand-in cursor for --benchmarkrows. Generates rows
+    #       of an order table with the column types DB2 returns.
+    # :rowcount: Number of rows to generate
+    #-------------------------------------------------------
+    description = [("ORDNUM",None,None,None,None,None,None),
+                   ("CUSNUM",None,None,None,None,None,None),
+                   ("ITEM",None,None,None,None,None,None),
+                   ("QTY",None,None,None,None,None,None),
+                   ("AMOUNT",None,None,None,None,None,None),
+                   ("ORDDATE",None,None,None,None,None,None)]
+
+    def __init__(self,rowcount):
+       self.rowcount = rowcount
+       self.nextrow = 0
+       self.basedate = datetime.date(2015,1,1)
+
+    def fetchmany(self,size):
+       end = min(self.nextrow + size,self.rowcount)
+       rows = [(i,
+                100000 + i % 5000,
+                "ITEM" + str(i % 997).zfill(6),
+                i % 50 + 1,
+                decimal.Decimal(i % 100000) / 100,
+                self.basedate + datetime.timedelta(days=i % 3650))
+               for i in range(self.nextrow,end)]
+       self.nextrow = end
+       return rows
+
+    def close(self):
+       pass
+
+def run_benchmark(outputfile,rowcount,batchsize,sheetrows):
+    #-------------------------------------------------------
+    # Function: run_benchmark
+    # Desc: Write a synthetic table in each output format and
+    #       print wall time and file size for each. The first
+    #       line is the original pandas to_excel path.
+    # :outputfile: Output file. Extension is replaced per format.
+    # :rowcount: Rows in the synthetic table
+    # :batchsize: Rows per fetchmany call
+    # :sheetrows: Data rows per worksheet
+    #-------------------------------------------------------
+    base = os.path.splitext(outputfile)[0]
+    columns = [col[0] for col in SyntheticCursor.description]
+    print("Benchmark rows: " + str(rowcount))
+    print("Format        Seconds    Rows/Sec     Size MB")
+
+    for outputformat, ext in (("xlsx-pandas",".xlsx"),("xlsx",".xlsx"),("csv",".csv"),
+                              ("parquet",".parquet"),("arrow",".arrow")):
+       if outputformat in ("parquet","arrow") and pa is None:
+          print(outputformat.ljust(12) + "  skipped - pyarrow not installed")
+          continue
+       benchfile = base + "_bench_" + outputformat + ext
+       if os.path.isfile(benchfile):
+          os.remove(benchfile)
+
+       starttime = time.time()
+       if outputformat == "xlsx-pandas":
+          rows = []
+          for batch in fetch_batches(SyntheticCursor(rowcount),batchsize):
+             rows.extend(batch)
+          pd.DataFrame.from_records(rows,columns=columns).to_excel(benchfile,index=False)
+          rows = None
+       else:
+          write_shards(benchfile,columns,fetch_batches(SyntheticCursor(rowcount),batchsize),
+                       sheetrows,0,1,outputformat)
+       elapsed = time.time() - starttime
+
+       print(outputformat.ljust(12) +
+             str(round(elapsed,2)).rjust(9) +
+             str(int(rowcount / elapsed) if elapsed > 0 else rowcount).rjust(12) +
+             str(round(os.path.getsize(benchfile) / (1024 * 1024),2)).rjust(12))
+
 #------------------------------------------------
 # Main script logic
 #------------------------------------------------
@@ -54,40 +772,125 @@ try: # Try to perform main logic
    if len(sys.argv) < parmsexpected + 1:
         raise Exception(str(parmsexpected) + ' required parms - [SQL Query] [Excel Output File] [Replace-True/False]. Process cancelled.')
    
+   # Set up the command line argument parsing.
+   # The first 3 parms stay positional so existing callers still work.
+   parser = argparse.ArgumentParser()
+   parser.add_argument('sqlquery',help="SQL query")
+   parser.add_argument('excelfile',help="Output file. Extension picks the format unless --format is passed")
+   parser.add_argument('replace',help="Replace output file. True/False")
+   parser.add_argument('-stream','--streaming', default="False",required=False,help="Stream rows to Excel with constant memory. Default value=False")
+   parser.add_argument('-batch','--batchsize', default="10000",required=False,help="Rows per fetch when streaming. Default value=10000")
+   parser.add_argument('-sheetrows','--sheetrows', default=str(maxsheetrows),required=False,help="Data rows per worksheet. Default value=" + str(maxsheetrows))
+   parser.add_argument('-filerows','--filerows', default="0",required=False,help="Data rows per shard file. 0=single file. Default value=0")
+   parser.add_argument('-workers','--workers', default="1",required=False,help="Parallel shard file writer processes. Default value=1")
+   parser.add_argument('-format','--format', default="auto",required=False,help="Output format: auto, xlsx, csv, parquet or arrow. Default value=auto")
+   parser.add_argument('-benchrows','--benchmarkrows', default="0",required=False,help="Benchmark output formats on a synthetic table of this many rows. Default value=0")
+   parser.add_argument('-partcol','--partcolumn', default="",required=False,help="Numeric column to split the query on for parallel extract. Default value=blank")
+   parser.add_argument('-parts','--partitions', default="4",required=False,help="Parallel extract key ranges/worker processes. Default value=4")
+
+   # Parse the command line arguments 
+   args = parser.parse_args()
+
    # Set parameter work variables from command line args
    parmscriptname = sys.argv[0] 
-   parmsqlquery= sys.argv[1] 
-   parmexcelfile= sys.argv[2]
-   parmreplace= eval(sys.argv[3]) #replace-True/False
+   parmsqlquery= args.sqlquery
+   parmexcelfile= args.excelfile
+   parmreplace= eval(args.replace) #replace-True/False
+   parmstreaming= str2bool(args.streaming)
+   parmbatchsize= int(args.batchsize)
+   parmsheetrows= int(args.sheetrows)
+   parmfilerows= int(args.filerows)
+   parmworkers= int(args.workers)
+   parmformat= get_output_format(args.excelfile,args.format)
+   parmbenchmarkrows= int(args.benchmarkrows)
+   parmpartcolumn= args.partcolumn.strip()
+   parmpartitions= int(args.partitions)
    print("SQL: " + parmsqlquery)
    print("Excel output file: " + parmexcelfile)
    print("Replace output file if found: " + str(parmreplace))
+   print("Streaming mode: " + str(parmstreaming))
+   print("Batch size: " + str(parmbatchsize))
+   print("Rows per sheet: " + str(parmsheetrows))
+   print("Rows per file: " + str(parmfilerows))
+   print("Workers: " + str(parmworkers))
+   print("Output format: " + parmformat)
+   print("Partition column: " + parmpartcolumn)
+   print("Partitions: " + str(parmpartitions))
+
+   # Need at least one key range
+   if parmpartitions < 1:
+      raise Exception('Partitions must be 1 or more. Process cancelled.')
+
+   # Make sure sheet size fits in Excel
+   if parmsheetrows < 1 or parmsheetrows > maxsheetrows:
+      raise Exception('Rows per sheet must be between 1 and ' + str(maxsheetrows) + '. Process cancelled.')
+
+   # Benchmark output formats without touching the database
+   if parmbenchmarkrows > 0:
+      run_benchmark(parmexcelfile,parmbenchmarkrows,parmbatchsize,parmsheetrows)
+   else:
+      # File sharding, partitioning and non-Excel formats are only done by the streaming writer
+      if parmfilerows > 0 or parmformat != "xlsx" or parmpartcolumn != "":
+         parmstreaming = True
 
-   # Check for Excel file in IFS and delete if found
-   exists = os.path.isfile(parmexcelfile)
-   if exists: 
-      if parmreplace==True:
-        os.remove(parmexcelfile)
+      # Check for Excel file or shard files in IFS and delete if found
+      if parmfilerows > 0:
+         base, ext = os.path.splitext(parmexcelfile)
+         existingfiles = sorted(glob.glob(glob.escape(base) + "_[0-9][0-9][0-9]*" + glob.escape(ext)))
       else:
-        raise Exception('File ' + parmexcelfile + ' exists and replace not selected. Process cancelled.')
+         existingfiles = [parmexcelfile] if os.path.isfile(parmexcelfile) else []
+      for existingfile in existingfiles:
+         if parmreplace==True:
+           os.remove(existingfile)
+         else:
+           raise Exception('File ' + existingfile + ' exists and replace not selected. Process cancelled.')
 
-   # Connect to database using PASE DB2 driver
-   conn = db2.connect()
+      # Connect to database using PASE DB2 driver.
+      # Partitioned extracts open their own connections.
+      conn = db2.connect() if parmpartcolumn == "" else None
+      starttime = time.time()
 
-   # Run SQL query via Pandas
-   df = pd.read_sql(parmsqlquery,conn)
+      if parmpartcolumn != "":
+         # Extract key ranges in parallel and merge them into the output
+         shards = export_partitioned(parmsqlquery,parmexcelfile,parmbatchsize,
+                                     parmsheetrows,parmfilerows,parmworkers,parmformat,
+                                     parmpartcolumn,parmpartitions)
+      elif parmstreaming:
+         # Stream cursor rows straight to the worksheet(s)
+         shards = export_streaming(conn,parmsqlquery,parmexcelfile,parmbatchsize,
+                                   parmsheetrows,parmfilerows,parmworkers,parmformat)
+      else:
+         # Run SQL query via Pandas
+         df = pd.read_sql(parmsqlquery,conn)
+         shards = [(parmexcelfile,len(df))]
 
-   # Export the DataFrame to Excel. 
-   # Make sure index column with row number. (Inex=false)
-   df.to_excel(parmexcelfile,index=False)
-   
-   # Check for file and make sure it exists now. Bail if not found.
-   exists = os.path.isfile(parmexcelfile)
-   if exists==False: 
-        raise Exception('Output file ' + parmexcelfile + ' was not created. Process cancelled.')
+         # Export the DataFrame to Excel. 
+         # Make sure index column with row number. (Inex=false)
+         # Roll over to a new worksheet if the rows don't fit on one.
+         if len(df) > parmsheetrows:
+            with pd.ExcelWriter(parmexcelfile,engine='xlsxwriter') as excelwriter:
+               for sheetnum, start in enumerate(range(0,len(df),parmsheetrows)):
+                  df.iloc[start:start + parmsheetrows].to_excel(excelwriter,sheet_name="Sheet" + str(sheetnum + 1),index=False)
+         else:
+            df.to_excel(parmexcelfile,index=False)
+
+      elapsed = time.time() - starttime
+      if conn is not None:
+         conn.close()
+      rowcount = sum(shardrows for shardfile, shardrows in shards)
+
+      # Check for files and make sure they exist now. Bail if not found.
+      for shardfile, shardrows in shards:
+         exists = os.path.isfile(shardfile)
+         if exists==False: 
+              raise Exception('Output file ' + shardfile + ' was not created. Process cancelled.')
 
-   # Output return parm info in case user wants to know file name created from RPG/CL  
-   print("RTNEXCELFILE:" + parmexcelfile)
+      # Output return parm info in case user wants to know file name created from RPG/CL  
+      for shardfile, shardrows in shards:
+         print("RTNEXCELFILE:" + shardfile)
+      print("RTNROWCOUNT:" + str(rowcount))
+      print("RTNROWSPERSEC:" + str(int(rowcount / elapsed) if elapsed > 0 else rowcount))
+      print("RTNPEAKMEMMB:" + str(round(get_peak_memory_mb(),1)))
 
    # Set success info
    exitcode=0
@@ -8,6 +8,15 @@
 # run this script to open and close your ODBC connection to 
 # make sure the ODBC driver works as expected. 
 #
+# It is also a connection latency benchmark. --connections
+# connections are opened one after another (serial) and then
+# --concurrency at a time (concurrent). Each one runs a
+# VALUES 1 round trip and is closed. The p50/p95/p99 connect
+# and round trip times plus connections/sec are reported for
+# each phase, so slow host servers show up before jobs start
+# timing out. Run it from a scheduled job and set --maxp95ms
+# to get a failing exit code when connects get slow.
+#
 # Pip packages needed:
 # pip3 install pyodbc
 #
@@ -18,7 +27,17 @@
 # Install IBM ACS ODBC Driver, Python3.x and PYODBC - via pip3 
 #
 # Parameters
-# None
+# --connstring/-conn=ODBC connection string. Default=DSN=*LOCAL;CommitMode=0;
+# --connections/-connections=Connections to open in each phase. Default=10
+# --concurrency/-concurrency=Connections opened at the same time in the
+#   concurrent phase. 1=serial phase only. Default=4
+# --format/-format=Output format: text or json. Default=text
+# --outputfile/-outfile=Also write the json results to this file. Default=blank
+# --maxp95ms/-maxp95ms=Fail with exit code 99 if p95 connect milliseconds
+#   in any phase is higher than this. 0=no limit. Default=0
+#
+# Testing command line - CLI
+# python3 pyodbcconnectiontest.py --connections 50 --concurrency 8 --format json
 #------------------------------------------------
 # Imports
 #------------------------------------------------
@@ -27,6 +46,9 @@ from sys import platform
 import time
 import traceback
 import datetime as dt
+import argparse
+import json
+import concurrent.futures
 import pyodbc as db2
 
 #------------------------------------------------
@@ -38,6 +60,106 @@ exitcode=0 #Init exitcode
 exitmessage=''
 parmsexpected=0;
 
+#------------------------------------------------
+# Define some useful functions
+#------------------------------------------------
+
+def percentile(values,pct):
+    #-------------------------------------------------------
+    # Function: percentile
+    # Desc: Nearest-rank percentile of a list of numbers
+    # :values: List of numbers
+    # :pct: Percentile to return, 0-100
+    # :return: Percentile value or 0 if the list is empty
+    #-------------------------------------------------------
+    if len(values) == 0:
+       return 0
+    ordered = sorted(values)
+    rank = max(1,-(-len(ordered) * pct // 100)) # Rank rounded up
+    return ordered[int(rank) - 1]
+
+def time_connection(connstring):
+    #-------------------------------------------------------
+    # Function: time_connection
+    # Desc: Open one connection, run a VALUES 1 round trip
+    #       and close it
+    # :connstring: ODBC connection string
+    # :return: Dictionary of connectms, roundtripms and error.
+    #          Times are None if that step was not reached.
+    #-------------------------------------------------------
+    result = {"connectms": None, "roundtripms": None, "error": ""}
+    conn = None
+    try:
+       starttime = time.perf_counter()
+       conn = db2.connect(connstring)
+       result["connectms"] = (time.perf_counter() - starttime) * 1000
+       starttime = time.perf_counter()
+       cursor = conn.cursor()
+       cursor.execute("VALUES 1")
+       cursor.fetchone()
+       cursor.close()
+       result["roundtripms"] = (time.perf_counter() - starttime) * 1000
+    except Exception as ex:
+       result["error"] = str(ex)
+    finally:
+       if conn is not None:
+          try:
+             conn.close()
+          except Exception:
+             pass
+    return result
+
+def run_phase(connstring,connections,concurrency):
+    #-------------------------------------------------------
+    # Function: run_phase
+    # Desc: Time a number of connections, concurrency at a time
+    # :connstring: ODBC connection string
+    # :connections: Connections to open
+    # :concurrency: Connections open at the same time. 1=serial
+    # :return: Dictionary of phase results
+    #-------------------------------------------------------
+    starttime = time.perf_counter()
+    if concurrency <= 1:
+       results = [time_connection(connstring) for i in range(connections)]
+    else:
+       with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+          results = list(executor.map(time_connection,[connstring] * connections))
+    elapsed = time.perf_counter() - starttime
+
+    connectms = [r["connectms"] for r in results if r["connectms"] is not None]
+    roundtripms = [r["roundtripms"] for r in results if r["roundtripms"] is not None]
+    errors = [r["error"] for r in results if r["error"] != ""]
+    phase = {"connections": connections,
+             "concurrency": max(1,concurrency),
+             "succeeded": len(roundtripms),
+             "failed": len(errors),
+             "seconds": round(elapsed,3),
+             "connectionspersec": round(len(roundtripms) / elapsed,1) if elapsed > 0 else 0,
+             "connectms": {},
+             "roundtripms": {},
+             "errors": sorted(set(errors))}
+    for name, values in (("connectms",connectms),("roundtripms",roundtripms)):
+       for pct in (50,95,99):
+          phase[name][f"p{pct}"] = round(percentile(values,pct),2)
+       phase[name]["max"] = round(max(values),2) if values else 0
+    return phase
+
+def print_phase(name,phase):
+    #-------------------------------------------------------
+    # Function: print_phase
+    # Desc: Print phase results as text
+    # :name: Phase name
+    # :phase: Dictionary from run_phase
+    #-------------------------------------------------------
+    print(f"{name} - connections: {phase['connections']}  concurrency: {phase['concurrency']}  "
+          f"succeeded: {phase['succeeded']}  failed: {phase['failed']}  seconds: {phase['seconds']}")
+    print(f"   Connections/sec: {phase['connectionspersec']}")
+    for label, key in (("Connect ms   ","connectms"),("Round trip ms","roundtripms")):
+       ms = phase[key]
+       print(f"   {label} p50: {ms['p50']}  p95: {ms['p95']}  p99: {ms['p99']}  max: {ms['max']}")
+    for error in phase["errors"]:
+       print(f"   Error: {error}")
+
 #Output messages to STDOUT for logging
 print("-------------------------------------------------------------------------------")
 print("IBM ODBC Connection Test Sample")
@@ -48,6 +170,18 @@ print("Start of Main Processing - " + time.strftime("%H:%M:%S"))
 #------------------------------------------------
 try: # Try to perform main logic
 
+   # Set up the command line argument parsing
+   # If this script is called without parms it does a single
+   # connect test plus the default benchmark.
+   parser = argparse.ArgumentParser()
+   parser.add_argument('-conn','--connstring', default="",required=False,help="ODBC connection string. Default=connstring set in this script")
+   parser.add_argument('-connections','--connections', default="10",required=False,help="Connections to open in each phase. Default value=10")
+   parser.add_argument('-concurrency','--concurrency', default="4",required=False,help="Connections opened at the same time in the concurrent phase. Default value=4")
+   parser.add_argument('-format','--format', default="text",choices=["text","json"],required=False,help="Output format: text or json. Default value=text")
+   parser.add_argument('-outfile','--outputfile', default="",required=False,help="Also write the json results to this file. Default value=blank")
+   parser.add_argument('-maxp95ms','--maxp95ms', default="0",required=False,help="Fail if p95 connect ms is higher than this. 0=no limit. Default value=0")
+   args = parser.parse_args()
+
    # TODO - Uncomment whichever connection string sample you want to use  
 
    # ODBC default *LOCAL DSN connection string when running natively in PASE
@@ -65,6 +199,15 @@ try: # Try to perform main logic
    # (Universal connection string for PC, Linux or IBMi)
    #connstring = 'Driver={IBM i Access ODBC Driver};System=192.168.1.1;Uid=IBMIUSER;Pwd=IBMIPASS;CommitMode=0;'
 
+   # Connection string from the command line wins
+   if args.connstring.strip() != "":
+      connstring = args.connstring.strip()
+   parmconnections = int(args.connections)
+   parmconcurrency = int(args.concurrency)
+   parmformat = args.format
+   parmoutputfile = args.outputfile.strip()
+   parmmaxp95ms = float(args.maxp95ms)
+
    # Connect to database
    conn = db2.connect(connstring)
    
@@ -76,6 +219,35 @@ try: # Try to perform main logic
 
    # Close database connection
    conn.close() 
+
+   # Benchmark serial connections, then concurrent connections
+   phases = {}
+   if parmconnections > 0:
+      print("Timing serial connections - " + time.strftime("%H:%M:%S"))
+      phases["serial"] = run_phase(connstring,parmconnections,1)
+      if parmconcurrency > 1:
+         print("Timing concurrent connections - " + time.strftime("%H:%M:%S"))
+         phases["concurrent"] = run_phase(connstring,parmconnections,parmconcurrency)
+
+   # Output results
+   results = {"timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+              "phases": phases}
+   if parmformat == "json":
+      print(json.dumps(results,indent=2))
+   else:
+      for name, phase in phases.items():
+         print_phase(name.capitalize(),phase)
+   if parmoutputfile != "":
+      with open(parmoutputfile,"w") as outfile:
+         json.dump(results,outfile,indent=2)
+
+   # Fail on connect errors or slow connects
+   failed = sum(phase["failed"] for phase in phases.values())
+   if failed > 0:
+      raise Exception(f"{failed} benchmark connections failed")
+   for name, phase in phases.items():
+      if parmmaxp95ms > 0 and phase["connectms"]["p95"] > parmmaxp95ms:
+         raise Exception(f"{name.capitalize()} p95 connect time {phase['connectms']['p95']} ms is over the {parmmaxp95ms} ms limit")
    
    # Set success info
    exitcode=0
@@ -84,6 +256,9 @@ try: # Try to perform main logic
 #------------------------------------------------
 # Handle Exceptions
 #------------------------------------------------
+except SystemExit as ex: # Most likely from the argument parser
+   exitcode=ex.code
+   exitmessage=str(ex)
 except Exception as ex: # Catch and handle exceptions
    exitcode=99 # set return code for stdout
    exitmessage=str(ex) # set exit message for stdout
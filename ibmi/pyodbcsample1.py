@@ -5,9 +5,30 @@
 # Description: 
 # This script is a sample to read an IBM i table using 
 # pyodbc and the IBM i Access ODBC Driver. 
+# Rows are fetched in fetchmany(arraysize) batches and written
+# as they arrive, so large tables are never held in memory.
+# Timings for connect, execute, first row and total fetch
+# are logged at the end.
 #
 # Parameters:
-# None 
+# --sql/-sql=SQL query to run. Default=SELECT * FROM qiws.qcustcdt
+# --format/-format=Output format: text (aligned columns), csv or jsonl. Default=text
+# --outputfile/-outfile=Output file. Default=blank (write rows to stdout)
+#   csv and jsonl rows written to stdout are kept clean: the log lines
+#   and ExitCode/ExitMessage go to stderr instead.
+# --arraysize/-arraysize=Rows per fetchmany call. Default=1000
+# --connstring/-conn=ODBC connection string. Default=DSN=*LOCAL;CommitMode=0;EXTCOLINFO=1;
+# --sqlfile/-sqlfile=Long-running mode. Run each line of this file as a
+#   query, or each line read from stdin if - is passed. Queries run on
+#   --threads threads over connections reused from a pyconnpool.py
+#   connection pool instead of connecting for every query. Each result
+#   is written as one block when its query is done. Default=blank (off)
+# --poolsize/-poolsize=Most pooled connections for --sqlfile. Default=4
+# --threads/-threads=Queries run at the same time for --sqlfile. Default=4
+#
+# Testing command line - CLI
+# python3 pyodbcsample1.py --sql "select * from qiws.qcustcdt" --format csv --outputfile /tmp/qcustcdt.csv
+# python3 pyodbcsample1.py --sqlfile - --format jsonl < /tmp/queries.sql
 #
 # Pip packages needed:
 # pip3 install pyodbc
@@ -24,6 +45,14 @@ import pyodbc
 import sys
 import time
 import traceback
+import argparse
+import csv
+import json
+import datetime
+import decimal
+import io
+import threading
+import concurrent.futures
 
 #------------------------------------------------
 # Script initialization
@@ -39,32 +68,264 @@ odbcconnstring="DSN=*LOCAL;CommitMode=0;EXTCOLINFO=1;"
 # Run as specific user on selected system with soft coded connection string
 #odbcconnstring= "Driver={IBM i Access ODBC Driver};System=1.1.1.1;Uid=USER01;Pwd=PASS01;CommitMode=0;EXTCOLINFO=1;"
 
+# csv and jsonl rows written to stdout must not be mixed with log
+# lines, so log to stderr in that case. Rows go to rowstdout.
+rowstdout = sys.stdout
+preparser = argparse.ArgumentParser(add_help=False)
+preparser.add_argument('-format','--format', default="text")
+preparser.add_argument('-outfile','--outputfile', default="")
+preargs = preparser.parse_known_args()[0]
+if preargs.format in ("csv","jsonl") and preargs.outputfile.strip() == "":
+   sys.stdout = sys.stderr
+
 # Output messages to STDOUT for logging
 print(dashes)
 print("Start of Main Processing - " + time.strftime("%H:%M:%S"))
 
+#------------------------------------------------
+# Define some useful functions
+#------------------------------------------------
+
+def json_value(value):
+    #-------------------------------------------------------
+    # Function: json_value
+    # Desc: Convert DB2 values json can't write on its own.
+    #       Decimals are written as strings so no digits are lost.
+    # :value: Column value
+    # :return: Value json can write
+    #-------------------------------------------------------
+    if isinstance(value,decimal.Decimal):
+       return str(value)
+    if isinstance(value,(datetime.datetime,datetime.date,datetime.time)):
+       return value.isoformat()
+    if isinstance(value,(bytes,bytearray)):
+       return value.hex()
+    raise TypeError("Type " + type(value).__name__ + " is not JSON serializable")
+
+def get_column_widths(description,rows,maxwidth=60):
+    #-------------------------------------------------------
+    # Function: get_column_widths
+    # Desc: Work out text column widths from the column sizes
+    #       and the first batch of rows. Later values that are
+    #       wider than their column are written in full.
+    # :description: cursor.description
+    # :rows: First batch of rows
+    # :maxwidth: Widest column size to pad to
+    # :return: List of column widths
+    #-------------------------------------------------------
+    widths = []
+    for i, col in enumerate(description):
+       # Column size plus room for sign and decimal point
+       size = min((col[3] or 0) + 2,maxwidth)
+       longest = max([len(str(row[i])) for row in rows],default=0)
+       widths.append(max(len(col[0]),size,longest))
+    return widths
+
+def write_rows(cursor,outfile,outputformat,arraysize):
+    #-------------------------------------------------------
+    # Function: write_rows
+    # Desc: Fetch rows in batches and write each batch as soon
+    #       as it arrives
+    # :cursor: Cursor with executed query
+    # :outfile: Open output file or sys.stdout
+    # :outputformat: text, csv or jsonl
+    # :arraysize: Rows per fetchmany call
+    # :return: Tuple of (row count, seconds until first row)
+    #-------------------------------------------------------
+    starttime = time.perf_counter()
+    columns = [col[0] for col in cursor.description]
+    rows = cursor.fetchmany(arraysize)
+    firstrowtime = time.perf_counter() - starttime
+    rowcount = 0
+
+    # Headings
+    if outputformat == "csv":
+       writer = csv.writer(outfile)
+       writer.writerow(columns)
+    elif outputformat == "text":
+       widths = get_column_widths(cursor.description,rows)
+       outfile.write(" ".join(name.ljust(width) for name, width in zip(columns,widths)).rstrip() + "\n")
+       outfile.write(" ".join("-" * width for width in widths) + "\n")
+
+    while rows:
+       if outputformat == "csv":
+          writer.writerows(rows)
+       elif outputformat == "jsonl":
+          for row in rows:
+             outfile.write(json.dumps(dict(zip(columns,row)),default=json_value) + "\n")
+       else:
+          for row in rows:
+             outfile.write(" ".join(("" if value is None else str(value)).ljust(width) for value, width in zip(row,widths)).rstrip() + "\n")
+       rowcount += len(rows)
+       rows = cursor.fetchmany(arraysize)
+
+    return (rowcount,firstrowtime)
+
+def run_pooled_query(pool,queryno,sql,outputformat,arraysize):
+    #-------------------------------------------------------
+    # Function: run_pooled_query
+    # Desc: Run one query over a pooled connection and format
+    #       its rows into a block of text
+    # :pool: pyconnpool.ConnectionPool
+    # :queryno: Query number for the block heading
+    # :sql: SQL query to run
+    # :outputformat: text, csv or jsonl
+    # :arraysize: Rows per fetchmany call
+    # :return: Tuple of (output text block, row count, error message or blank)
+    #-------------------------------------------------------
+    block = io.StringIO()
+    block.write(f"Query {queryno}: {sql}\n")
+    starttime = time.perf_counter()
+    rowcount = 0
+    error = ""
+    try:
+       with pool.connection() as conn:
+          cursor = conn.cursor()
+          cursor.execute(sql)
+          if cursor.description is not None:
+             rowcount, firstrowtime = write_rows(cursor,block,outputformat,arraysize)
+          cursor.close()
+    except Exception as e:
+       error = str(e)
+       block.write(f"Error: {error}\n")
+    block.write(f"Query {queryno} rows: {rowcount} seconds: {time.perf_counter() - starttime:.3f}\n")
+    return (block.getvalue(),rowcount,error)
+
+def run_query_stream(sqlfile,outfile,connstring,outputformat,arraysize,poolsize,threads):
+    #-------------------------------------------------------
+    # Function: run_query_stream
+    # Desc: Long-running mode. Read queries one per line and run
+    #       them on a thread pool over pooled connections. Blank
+    #       lines and lines starting with -- are skipped.
+    # :sqlfile: Open file of queries or sys.stdin
+    # :outfile: Open output file or sys.stdout
+    # :connstring: ODBC connection string
+    # :outputformat: text, csv or jsonl
+    # :arraysize: Rows per fetchmany call
+    # :poolsize: Most pooled connections
+    # :threads: Queries run at the same time
+    # :return: Tuple of (queries run, queries failed, pool stats)
+    #-------------------------------------------------------
+    # Only needed in this mode so the script still runs on its own
+    import pyconnpool
+
+    outlock = threading.Lock()
+    counts = {"queries": 0, "failed": 0}
+
+    def write_block(future):
+       # Write each result block whole as soon as its query is done
+       block, rowcount, error = future.result()
+       with outlock:
+          counts["queries"] += 1
+          if error != "":
+             counts["failed"] += 1
+          outfile.write(block)
+          outfile.flush()
+
+    with pyconnpool.odbc_pool(connstring,maxsize=poolsize) as pool:
+       with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+          queryno = 0
+          for line in sqlfile:
+             sql = line.strip()
+             if sql == "" or sql.startswith("--"):
+                continue
+             queryno += 1
+             future = executor.submit(run_pooled_query,pool,queryno,sql,outputformat,arraysize)
+             future.add_done_callback(write_block)
+       stats = pool.get_stats()
+
+    return (counts["queries"],counts["failed"],stats)
+
 #------------------------------------------------
 # Main script logic
 #------------------------------------------------
 try: # Try to perform main logic
 
-   # Connect to the database and get a cursor
-   print("Connecting to IBM i database via PYODBC - " + time.strftime("%H:%M:%S"))
-   conn = pyodbc.connect(odbcconnstring)
-   cursor = conn.cursor()
-   
-   # Run the db query
-   print("Querying IBM i database via PYODBC - " + time.strftime("%H:%M:%S"))
-   cursor.execute("SELECT * FROM qiws.qcustcdt")
-   
-   # Output the data
-   print("Outputting query results - " + time.strftime("%H:%M:%S"))
-   for row in cursor.fetchall():
-       print(row)
-   
-   # Close connection
-   conn.close()
-   
+   # Set up the command line argument parsing
+   parser = argparse.ArgumentParser()
+   parser.add_argument('-sql','--sql', default="SELECT * FROM qiws.qcustcdt",required=False,help="SQL query to run")
+   parser.add_argument('-format','--format', default="text",choices=["text","csv","jsonl"],required=False,help="Output format. Default value=text")
+   parser.add_argument('-outfile','--outputfile', default="",required=False,help="Output file. Default value=blank for stdout")
+   parser.add_argument('-arraysize','--arraysize', default="1000",required=False,help="Rows per fetchmany call. Default value=1000")
+   parser.add_argument('-conn','--connstring', default=odbcconnstring,required=False,help="ODBC connection string")
+   parser.add_argument('-sqlfile','--sqlfile', default="",required=False,help="File of queries, one per line, or - for stdin. Default value=blank")
+   parser.add_argument('-poolsize','--poolsize', default="4",required=False,help="Most pooled connections for --sqlfile. Default value=4")
+   parser.add_argument('-threads','--threads', default="4",required=False,help="Queries run at the same time for --sqlfile. Default value=4")
+   args = parser.parse_args()
+
+   # Pull arguments into variables so they are meaningful
+   parmsql = args.sql.strip()
+   parmformat = args.format
+   parmoutputfile = args.outputfile.strip()
+   parmarraysize = int(args.arraysize)
+   odbcconnstring = args.connstring.strip()
+   parmsqlfile = args.sqlfile.strip()
+   parmpoolsize = int(args.poolsize)
+   parmthreads = int(args.threads)
+
+   if parmsqlfile != "":
+      # Long-running mode. Many queries over pooled connections.
+      print("Running queries from " + ("stdin" if parmsqlfile == "-" else parmsqlfile) + " - " + time.strftime("%H:%M:%S"))
+      outfile = open(parmoutputfile,"w",newline="",encoding="utf-8") if parmoutputfile != "" else rowstdout
+      sqlfile = sys.stdin if parmsqlfile == "-" else open(parmsqlfile,"r")
+      try:
+         phasestart = time.perf_counter()
+         queries, failed, stats = run_query_stream(sqlfile,outfile,odbcconnstring,parmformat,
+                                                   parmarraysize,parmpoolsize,parmthreads)
+         elapsed = time.perf_counter() - phasestart
+      finally:
+         if sqlfile is not sys.stdin:
+            sqlfile.close()
+         if outfile is not rowstdout:
+            outfile.close()
+
+      # Output timings and pool usage
+      print(dashes)
+      print(f"Queries: {queries}  Failed: {failed}  Seconds: {elapsed:.3f}")
+      if elapsed > 0:
+         print(f"Queries/sec: {queries / elapsed:.1f}")
+      print(f"Connections opened: {stats['created']}  Reused: {stats['reused']}  Evicted: {stats['evicted']}  Unhealthy: {stats['unhealthy']}")
+      if failed > 0:
+         raise Exception(f"{failed} of {queries} queries failed")
+   else:
+      # Connect to the database and get a cursor
+      print("Connecting to IBM i database via PYODBC - " + time.strftime("%H:%M:%S"))
+      phasestart = time.perf_counter()
+      conn = pyodbc.connect(odbcconnstring)
+      cursor = conn.cursor()
+      cursor.arraysize = parmarraysize
+      connecttime = time.perf_counter() - phasestart
+
+      # Run the db query
+      print("Querying IBM i database via PYODBC - " + time.strftime("%H:%M:%S"))
+      print("SQL: " + parmsql)
+      phasestart = time.perf_counter()
+      cursor.execute(parmsql)
+      executetime = time.perf_counter() - phasestart
+
+      # Output the data as it is fetched
+      print("Outputting query results - " + time.strftime("%H:%M:%S"))
+      phasestart = time.perf_counter()
+      if parmoutputfile != "":
+         with open(parmoutputfile,"w",newline="",encoding="utf-8") as outfile:
+            rowcount, firstrowtime = write_rows(cursor,outfile,parmformat,parmarraysize)
+      else:
+         rowcount, firstrowtime = write_rows(cursor,rowstdout,parmformat,parmarraysize)
+      fetchtime = time.perf_counter() - phasestart
+
+      # Close connection
+      conn.close()
+
+      # Output timings
+      print(dashes)
+      print(f"Rows: {rowcount}")
+      print(f"Connect seconds: {connecttime:.3f}")
+      print(f"Execute seconds: {executetime:.3f}")
+      print(f"First row seconds: {firstrowtime:.3f}")
+      print(f"Total fetch seconds: {fetchtime:.3f}")
+      if fetchtime > 0:
+         print(f"Rows/sec: {int(rowcount / fetchtime)}")
+
    # Set success info
    exitcode=0
    exitmessage='Completed successfully'
@@ -72,6 +333,10 @@ try: # Try to perform main logic
 #------------------------------------------------
 # Catch and Handle Exceptions
 #------------------------------------------------
+# System Exit occurred. Most likely from argument parser
+except SystemExit as ex:
+   exitcode=ex.code
+   exitmessage=str(ex)
 except: 
    exitcode=99
    exitmessage='Error occurred'
@@ -0,0 +1,679 @@
+#!/QOpenSys/pkgs/bin/python3
+#------------------------------------------------
+# Script name: pysftpbroker.py
+#
+# Description:
+# Optional local broker that keeps authenticated SSH connections
+# open for pysftpdownload.py, pysftpupload.py and pysftprmtcmd.py.
+# Each script run normally pays for a key exchange and login. When a
+# CL job calls the scripts hundreds of times a day that adds up, so
+# the broker logs in once per host/port/user/credentials and hands
+# out new channels on that connection to each script run.
+#
+# The scripts talk to the broker over a Unix socket when passed
+# --broker. Each request opens one channel: an SFTP subsystem that is
+# relayed byte for byte, or a remote command whose stdout, stderr and
+# exit status are sent back in small frames. If the broker is not
+# running the scripts connect directly as before.
+#
+# Connections with no open channels are closed after --idletimeout
+# seconds. Dropped connections are replaced on the next request.
+# Credentials are sent with every request and are part of the cache
+# key, so a connection is only reused by callers that know its
+# password or key. The socket is created readable and writable by
+# the broker's user only, in a directory only that user can open:
+# $XDG_RUNTIME_DIR if set, otherwise ~/.pysftpbroker (mode 0700).
+# Before sending a request the scripts check that the socket file
+# and, where the OS reports it (SO_PEERCRED), the process listening
+# on it belong to the same user. If not, nothing is sent and they
+# connect directly. The broker only serves callers of its own user
+# and won't remove or reuse a socket file owned by another user.
+#
+# Pip packages needed:
+# pip3 install pysftp
+#
+# Parameters
+# --socket/-socket=Unix socket path.
+#   Default=$XDG_RUNTIME_DIR/pysftpbroker.sock or ~/.pysftpbroker/pysftpbroker.sock
+# --idletimeout/-idletimeout=Close connections idle this many seconds.
+#   Default=300
+# --keepalive/-keepalive=Seconds between SSH keepalives on cached
+#   connections. 0=none. Default=30
+# --status/-status=Print the cached connections of a running broker
+#   and exit. True/False Default=False
+# --stop/-stop=Stop a running broker. True/False Default=False
+#
+# Testing command line - CLI
+# python3 pysftpbroker.py --idletimeout 600
+# python3 pysftpdownload.py -host sftp1 -port 22 -user user1 -pass pass1 -privatekey "" -privatepass ""
+#   -fromfile /outbound/sales.csv -tofile /tmp/sales.csv -broker auto
+#------------------------------------------------
+# Imports
+#------------------------------------------------
+import os
+import sys
+import time
+import stat
+import json
+import socket
+import select
+import struct
+import hashlib
+import threading
+import socketserver
+import argparse
+import paramiko
+
+#------------------------------------------------
+# Define classes and functions
+#------------------------------------------------
+
+# Exec output frame types: stdout data, stderr data, exit status
+FRAME_STDOUT = b"O"
+FRAME_STDERR = b"E"
+FRAME_EXIT = b"X"
+
+class BrokerUnavailable(Exception):
+    #-------------------------------------------------------
+    # Class: BrokerUnavailable
+    # Desc: No broker is listening on the socket
+    #-------------------------------------------------------
+    pass
+
+def check_private_dir(dirpath):
+    #-------------------------------------------------------
+    # Function: check_private_dir
+    # Desc: Make sure a directory belongs to the current user
+    #       and no other user can open it
+    # :dirpath: Directory path
+    #-------------------------------------------------------
+    info = os.lstat(dirpath)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+       raise BrokerUnavailable("Broker directory " + dirpath + " is not a directory owned by this user")
+    if info.st_mode & 0o077:
+       raise BrokerUnavailable("Broker directory " + dirpath + " can be opened by other users. Run chmod 700 " + dirpath)
+
+def default_socket_path():
+    #-------------------------------------------------------
+    # Function: default_socket_path
+    # Desc: Broker socket path for the current user, in
+    #       $XDG_RUNTIME_DIR or a ~/.pysftpbroker directory
+    #       created with mode 0700
+    # :return: Socket path
+    #-------------------------------------------------------
+    socketdir = os.environ.get("XDG_RUNTIME_DIR","")
+    if socketdir == "" or not os.path.isdir(socketdir):
+       socketdir = os.path.join(os.path.expanduser("~"),".pysftpbroker")
+       os.makedirs(socketdir,mode=0o700,exist_ok=True)
+    check_private_dir(socketdir)
+    return os.path.join(socketdir,"pysftpbroker.sock")
+
+def check_socket_owner(socketpath):
+    #-------------------------------------------------------
+    # Function: check_socket_owner
+    # Desc: Make sure the socket file belongs to the current user
+    #       so a socket planted by another user is never trusted
+    # :socketpath: Broker socket path
+    # :return: False if there is no socket file
+    #-------------------------------------------------------
+    try:
+       info = os.lstat(socketpath)
+    except FileNotFoundError:
+       return False
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+       raise BrokerUnavailable("Broker socket " + socketpath + " is not a socket owned by this user. Not used")
+    return True
+
+def peer_uid(sock):
+    #-------------------------------------------------------
+    # Function: peer_uid
+    # Desc: User ID of the process at the other end of a Unix
+    #       socket
+    # :sock: Connected Unix socket
+    # :return: User ID or None if the OS doesn't report it
+    #-------------------------------------------------------
+    if not hasattr(socket,"SO_PEERCRED"):
+       return None
+    creds = sock.getsockopt(socket.SOL_SOCKET,socket.SO_PEERCRED,struct.calcsize("3i"))
+    return struct.unpack("3i",creds)[1]
+
+def socket_path(broker):
+    #-------------------------------------------------------
+    # Function: socket_path
+    # Desc: Resolve the --broker parm of the scripts
+    # :broker: Socket path, auto for the default path or blank
+    # :return: Socket path or blank for no broker
+    #-------------------------------------------------------
+    return default_socket_path() if broker.lower() == "auto" else broker
+
+def send_line(sock,message):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+def read_line(sock,limit=65536):
+    # One byte at a time so nothing after the line is consumed
+    data = bytearray()
+    while not data.endswith(b"\n"):
+       byte = sock.recv(1)
+       if not byte:
+          raise EOFError("Broker connection closed")
+       data += byte
+       if len(data) > limit:
+          raise Exception("Broker message too long")
+    return json.loads(data.decode("utf-8"))
+
+def broker_request(socketpath,message):
+    #-------------------------------------------------------
+    # Function: broker_request
+    # Desc: Connect to the broker and send one request
+    # :socketpath: Broker socket path
+    # :message: Request dictionary
+    # :return: Tuple of (connected socket, reply dictionary)
+    #-------------------------------------------------------
+    if not check_socket_owner(socketpath):
+       raise BrokerUnavailable("No SFTP broker on " + socketpath)
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+       sock.connect(socketpath)
+    except (FileNotFoundError,ConnectionRefusedError) as ex:
+       sock.close()
+       raise BrokerUnavailable("No SFTP broker on " + socketpath + ": " + str(ex))
+    # Credentials only go to a broker run by this user
+    uid = peer_uid(sock)
+    if uid is not None and uid != os.getuid():
+       sock.close()
+       raise BrokerUnavailable("Broker socket " + socketpath + " is served by user ID " + str(uid) + ". Not used")
+    try:
+       send_line(sock,message)
+       reply = read_line(sock)
+    except Exception:
+       sock.close()
+       raise
+    if not reply.get("ok"):
+       sock.close()
+       raise paramiko.SSHException("SFTP broker: " + reply.get("error",""))
+    return (sock,reply)
+
+class BrokerChannel:
+    #-------------------------------------------------------
+    # Class: BrokerChannel
+    # Desc: Client end of one brokered channel. Has the parts of
+    #       paramiko Channel that SFTPClient and the scripts use,
+    #       so paramiko.SFTPClient and exec loops work unchanged.
+    # :transport: BrokerTransport it came from
+    #-------------------------------------------------------
+    def __init__(self,transport):
+       self.transport = transport
+       self.sock = None
+       self.framed = False
+       self.stdout = bytearray()
+       self.stderr = bytearray()
+       self.pending = bytearray()
+       self.exitstatus = None
+       self.eof = False
+       self.timeout = None
+
+    def _open(self,kind,**parms):
+       request = dict(self.transport.credentials)
+       request.update(kind=kind,**parms)
+       self.sock, reply = broker_request(self.transport.socketpath,request)
+       self.transport.cached = reply.get("cached",False)
+
+    def invoke_subsystem(self,subsystem):
+       self._open("subsystem",subsystem=subsystem)
+
+    def exec_command(self,command):
+       self._open("exec",command=command)
+       self.framed = True
+
+    def get_transport(self):
+       return self.transport
+
+    def get_name(self):
+       return "broker"
+
+    def fileno(self):
+       return self.sock.fileno()
+
+    def settimeout(self,timeout):
+       self.timeout = timeout
+       self.sock.settimeout(timeout)
+
+    def gettimeout(self):
+       return self.timeout
+
+    def setblocking(self,blocking):
+       self.settimeout(None if blocking else 0.0)
+
+    def send(self,data):
+       return self.sock.send(data)
+
+    def sendall(self,data):
+       self.sock.sendall(data)
+
+    def _readable(self,wait):
+       return bool(select.select([self.sock],[],[],wait)[0])
+
+    def _pump(self,wait=0):
+       # Read what the broker has sent and split it into frames
+       if self.eof:
+          return
+       if not self._readable(wait):
+          if wait is not None and wait > 0:
+             raise socket.timeout("Timed out waiting for the SFTP broker")
+          return
+       data = self.sock.recv(65536)
+       if not data:
+          self.eof = True
+          return
+       self.pending += data
+       while len(self.pending) >= 5:
+          frametype = self.pending[:1]
+          length = struct.unpack(">i",self.pending[1:5])[0]
+          if frametype == FRAME_EXIT:
+             self.exitstatus = length
+             del self.pending[:5]
+             continue
+          if len(self.pending) < 5 + length:
+             break
+          (self.stdout if frametype == FRAME_STDOUT else self.stderr).extend(self.pending[5:5 + length])
+          del self.pending[:5 + length]
+
+    def recv_ready(self):
+       if not self.framed:
+          return self._readable(0)
+       self._pump()
+       return len(self.stdout) > 0
+
+    def recv(self,count):
+       if not self.framed:
+          return self.sock.recv(count)
+       while not self.stdout and not self.eof:
+          self._pump(self.timeout)
+       data = bytes(self.stdout[:count])
+       del self.stdout[:count]
+       return data
+
+    def recv_stderr_ready(self):
+       self._pump()
+       return len(self.stderr) > 0
+
+    def recv_stderr(self,count):
+       while not self.stderr and not self.eof:
+          self._pump(self.timeout)
+       data = bytes(self.stderr[:count])
+       del self.stderr[:count]
+       return data
+
+    def exit_status_ready(self):
+       self._pump()
+       return self.exitstatus is not None or self.eof
+
+    def recv_exit_status(self):
+       while self.exitstatus is None and not self.eof:
+          self._pump(None)
+       return -1 if self.exitstatus is None else self.exitstatus
+
+    def shutdown_write(self):
+       self.sock.shutdown(socket.SHUT_WR)
+
+    def close(self):
+       if self.sock is not None:
+          self.sock.close()
+
+class BrokerTransport:
+    #-------------------------------------------------------
+    # Class: BrokerTransport
+    # Desc: Stands in for a paramiko Transport. Each open_session
+    #       is a new channel on the broker's cached connection.
+    # :socketpath: Broker socket path
+    # :credentials: Dictionary of host, port, user, password,
+    #               privatekeyfile and privatekeypass
+    #-------------------------------------------------------
+    def __init__(self,socketpath,credentials):
+       self.socketpath = socketpath
+       self.credentials = credentials
+       self.cached = False
+
+    def open_session(self,window_size=None,max_packet_size=None,timeout=None):
+       return BrokerChannel(self)
+
+    def is_active(self):
+       return True
+
+class BrokerConnection:
+    #-------------------------------------------------------
+    # Class: BrokerConnection
+    # Desc: Stands in for pysftp.Connection with the methods the
+    #       pysftp scripts use, over a brokered SFTP channel
+    # :transport: BrokerTransport
+    #-------------------------------------------------------
+    def __init__(self,transport):
+       self.sftp_client = paramiko.SFTPClient.from_transport(transport)
+       self.cached = transport.cached
+
+    def isfile(self,remotepath):
+       try:
+          return stat.S_ISREG(self.sftp_client.stat(remotepath).st_mode)
+       except IOError:
+          return False
+
+    def isdir(self,remotepath):
+       try:
+          return stat.S_ISDIR(self.sftp_client.stat(remotepath).st_mode)
+       except IOError:
+          return False
+
+    def remove(self,remotefile):
+       self.sftp_client.remove(remotefile)
+
+    def put(self,localpath,remotepath):
+       return self.sftp_client.put(localpath,remotepath)
+
+    def get(self,remotepath,localpath):
+       return self.sftp_client.get(remotepath,localpath)
+
+    def close(self):
+       self.sftp_client.close()
+
+def broker_connect(socketpath,host,port,user,password,privatekeyfile,privatekeypass):
+    #-------------------------------------------------------
+    # Function: broker_connect
+    # Desc: Get an SFTP connection through the broker
+    # :socketpath: Broker socket path
+    # :return: BrokerConnection. Raises BrokerUnavailable if no
+    #          broker is running.
+    #-------------------------------------------------------
+    credentials = {"host": host, "port": int(port), "user": user, "password": password,
+                   "privatekeyfile": privatekeyfile, "privatekeypass": privatekeypass}
+    return BrokerConnection(BrokerTransport(socketpath,credentials))
+
+class CachedConnection:
+    #-------------------------------------------------------
+    # Class: CachedConnection
+    # Desc: One authenticated SSH connection held by the broker
+    # :credentials: Request dictionary with the login details
+    # :keepalive: Seconds between SSH keepalives. 0=none
+    #-------------------------------------------------------
+    def __init__(self,credentials,keepalive):
+       import pysftp
+       cnopts = pysftp.CnOpts()
+       cnopts.hostkeys = None
+       if credentials["privatekeyfile"] != "":
+          self.connection = pysftp.Connection(credentials["host"],port=credentials["port"],username=credentials["user"],
+                                              private_key=credentials["privatekeyfile"],private_key_pass=credentials["privatekeypass"],cnopts=cnopts)
+       else:
+          self.connection = pysftp.Connection(credentials["host"],port=credentials["port"],username=credentials["user"],
+                                              password=credentials["password"],private_key=None,private_key_pass=None,cnopts=cnopts)
+       self.transport = self.connection.sftp_client.get_channel().get_transport()
+       if keepalive > 0:
+          self.transport.set_keepalive(keepalive)
+       self.active = 0
+       self.lastused = time.monotonic()
+       self.requests = 0
+
+    def close(self):
+       try:
+          self.connection.close()
+       except Exception:
+          pass
+
+class BrokerServer(socketserver.ThreadingMixIn,socketserver.UnixStreamServer):
+    #-------------------------------------------------------
+    # Class: BrokerServer
+    # Desc: Unix socket server holding the connection cache
+    # :socketpath: Unix socket path
+    # :idletimeout: Close connections idle this many seconds
+    # :keepalive: Seconds between SSH keepalives. 0=none
+    #-------------------------------------------------------
+    daemon_threads = True
+
+    def __init__(self,socketpath,idletimeout=300,keepalive=30):
+       self.idletimeout = idletimeout
+       self.keepalive = keepalive
+       self.connections = {}
+       self.lock = threading.Lock()
+       oldumask = os.umask(0o177) # Socket only for this user
+       try:
+          socketserver.UnixStreamServer.__init__(self,socketpath,BrokerHandler)
+       finally:
+          os.umask(oldumask)
+       self.reaperstop = threading.Event()
+       threading.Thread(target=self._reap,daemon=True).start()
+
+    def verify_request(self,request,client_address):
+       # Only serve scripts run by the broker's own user
+       uid = peer_uid(request)
+       return uid is None or uid == os.getuid()
+
+    def checkout(self,credentials):
+       #-------------------------------------------------------
+       # Function: checkout
+       # Desc: Get the cached connection for a login, connecting
+       #       if there is none or the cached one has dropped
+       # :credentials: Request dictionary with the login details
+       # :return: Tuple of (CachedConnection, True if it was cached)
+       #-------------------------------------------------------
+       # Credentials are hashed into the key so only callers that
+       # know them get the connection
+       secret = hashlib.sha256("\0".join([credentials["password"],credentials["privatekeyfile"],
+                                          credentials["privatekeypass"]]).encode("utf-8")).hexdigest()
+       key = (credentials["host"],credentials["port"],credentials["user"],secret)
+       with self.lock:
+          cached = self.connections.get(key)
+          if cached is not None and not cached.transport.is_active():
+             log(f"Connection to {key[2]}@{key[0]}:{key[1]} dropped")
+             del self.connections[key]
+             cached.close()
+             cached = None
+          if cached is not None:
+             cached.active += 1
+             cached.requests += 1
+             return (cached,True)
+       # Log in outside the lock so other hosts aren't held up
+       starttime = time.perf_counter()
+       connection = CachedConnection(credentials,self.keepalive)
+       log(f"Connected to {key[2]}@{key[0]}:{key[1]} in {time.perf_counter() - starttime:.2f} seconds")
+       with self.lock:
+          if key in self.connections:
+             # Another request connected first. Use that one.
+             connection.close()
+             connection = self.connections[key]
+          else:
+             self.connections[key] = connection
+          connection.active += 1
+          connection.requests += 1
+          return (connection,False)
+
+    def checkin(self,connection):
+       with self.lock:
+          connection.active -= 1
+          connection.lastused = time.monotonic()
+
+    def status(self):
+       #-------------------------------------------------------
+       # Function: status
+       # Desc: Describe the cached connections
+       # :return: List of dictionaries
+       #-------------------------------------------------------
+       now = time.monotonic()
+       with self.lock:
+          return [{"host": key[0], "port": key[1], "user": key[2], "active": connection.active,
+                   "requests": connection.requests, "idleseconds": round(now - connection.lastused)}
+                  for key, connection in self.connections.items()]
+
+    def _reap(self):
+       while not self.reaperstop.wait(min(30,max(1,self.idletimeout / 2))):
+          now = time.monotonic()
+          with self.lock:
+             expired = [key for key, connection in self.connections.items()
+                        if connection.active == 0 and (now - connection.lastused > self.idletimeout or
+                                                       not connection.transport.is_active())]
+             closing = [self.connections.pop(key) for key in expired]
+          for key, connection in zip(expired,closing):
+             log(f"Closing idle connection to {key[2]}@{key[0]}:{key[1]}")
+             connection.close()
+
+    def close_all(self):
+       self.reaperstop.set()
+       with self.lock:
+          for connection in self.connections.values():
+             connection.close()
+          self.connections = {}
+
+class BrokerHandler(socketserver.BaseRequestHandler):
+    #-------------------------------------------------------
+    # Class: BrokerHandler
+    # Desc: Serves one request from a script: a status or stop
+    #       request, or one channel on a cached connection
+    #-------------------------------------------------------
+    def handle(self):
+       sock = self.request
+       try:
+          request = read_line(sock)
+       except Exception:
+          return
+       kind = request.get("kind","")
+       if kind == "status":
+          send_line(sock,{"ok": True, "connections": self.server.status()})
+          return
+       if kind == "stop":
+          send_line(sock,{"ok": True})
+          threading.Thread(target=self.server.shutdown,daemon=True).start()
+          return
+       if kind not in ("subsystem","exec"):
+          send_line(sock,{"ok": False, "error": "Unknown request " + kind})
+          return
+
+       try:
+          connection, cached = self.server.checkout(request)
+       except Exception as ex:
+          send_line(sock,{"ok": False, "error": "Connect failed: " + str(ex)})
+          return
+       channel = None
+       try:
+          try:
+             channel = connection.transport.open_session()
+             if kind == "exec":
+                channel.exec_command(request["command"])
+                channel.shutdown_write() # No stdin
+             else:
+                channel.invoke_subsystem(request["subsystem"])
+          except Exception as ex:
+             send_line(sock,{"ok": False, "error": str(ex)})
+             return
+          send_line(sock,{"ok": True, "cached": cached})
+          if kind == "exec":
+             self.relay_exec(sock,channel)
+          else:
+             self.relay(sock,channel)
+       except OSError:
+          pass # Script went away
+       finally:
+          if channel is not None:
+             channel.close()
+          self.server.checkin(connection)
+
+    def relay(self,sock,channel):
+       # Copy bytes both ways until either end closes
+       while True:
+          readable = select.select([sock,channel],[],[])[0]
+          if sock in readable:
+             data = sock.recv(65536)
+             if not data:
+                return
+             channel.sendall(data)
+          if channel in readable:
+             data = channel.recv(65536)
+             if not data:
+                return
+             sock.sendall(data)
+
+    def relay_exec(self,sock,channel):
+       # Frame stdout and stderr as they arrive, then the exit status
+       while True:
+          gotdata = False
+          if channel.recv_ready():
+             data = channel.recv(65536)
+             sock.sendall(FRAME_STDOUT + struct.pack(">i",len(data)) + data)
+             gotdata = True
+          if channel.recv_stderr_ready():
+             data = channel.recv_stderr(65536)
+             sock.sendall(FRAME_STDERR + struct.pack(">i",len(data)) + data)
+             gotdata = True
+          if not gotdata:
+             if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+             readable = select.select([channel,sock],[],[],0.1)[0]
+             if sock in readable and not sock.recv(1):
+                return # Script went away
+       sock.sendall(FRAME_EXIT + struct.pack(">i",channel.recv_exit_status()))
+
+def log(message):
+    print(time.strftime("%Y-%m-%d %H:%M:%S") + " " + message,flush=True)
+
+#------------------------------------------------
+# Main script logic
+#------------------------------------------------
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser()
+   parser.add_argument('-socket','--socket', default="",required=False,help="Unix socket path. Default value=$XDG_RUNTIME_DIR/pysftpbroker.sock or ~/.pysftpbroker/pysftpbroker.sock")
+   parser.add_argument('-idletimeout','--idletimeout', default="300",required=False,help="Close connections idle this many seconds. Default value=300")
+   parser.add_argument('-keepalive','--keepalive', default="30",required=False,help="Seconds between SSH keepalives. Default value=30")
+   parser.add_argument('-status','--status', default="False",required=False,help="Print the cached connections of a running broker. Default value=False")
+   parser.add_argument('-stop','--stop', default="False",required=False,help="Stop a running broker. Default value=False")
+   args = parser.parse_args()
+
+   try:
+      socketpath = args.socket.strip() if args.socket.strip() != "" else default_socket_path()
+      if args.status.lower() in ("yes", "true", "t", "1"):
+         sock, reply = broker_request(socketpath,{"kind": "status"})
+         sock.close()
+         print(f"SFTP broker on {socketpath}: {len(reply['connections'])} cached connections")
+         for entry in reply["connections"]:
+            print(f"{entry['user']}@{entry['host']}:{entry['port']}  Active channels: {entry['active']}  "
+                  f"Requests: {entry['requests']}  Idle seconds: {entry['idleseconds']}")
+         sys.exit(0)
+      if args.stop.lower() in ("yes", "true", "t", "1"):
+         sock, reply = broker_request(socketpath,{"kind": "stop"})
+         sock.close()
+         print("SFTP broker on " + socketpath + " stopped")
+         sys.exit(0)
+   except BrokerUnavailable as ex:
+      print(str(ex))
+      sys.exit(99)
+
+   # Clear a socket file left by a broker that ended without cleanup.
+   # Anything not owned by this user is left alone.
+   if os.path.lexists(socketpath):
+      try:
+         check_socket_owner(socketpath)
+      except BrokerUnavailable as ex:
+         print(str(ex) + ". Use another --socket.")
+         sys.exit(99)
+      sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+      try:
+         sock.connect(socketpath)
+         uid = peer_uid(sock)
+         if uid is not None and uid != os.getuid():
+            print("Socket " + socketpath + " is served by user ID " + str(uid) + ". Use another --socket.")
+         else:
+            print("An SFTP broker is already running on " + socketpath)
+         sys.exit(99)
+      except (ConnectionRefusedError,FileNotFoundError):
+         os.remove(socketpath)
+      finally:
+         sock.close()
+
+   server = BrokerServer(socketpath,float(args.idletimeout),int(args.keepalive))
+   log(f"SFTP broker listening on {socketpath}. Idle timeout {args.idletimeout} seconds.")
+   try:
+      server.serve_forever()
+   except KeyboardInterrupt:
+      pass
+   finally:
+      server.close_all()
+      server.server_close()
+      if os.path.exists(socketpath):
+         os.remove(socketpath)
+      log("SFTP broker stopped")
+   sys.exit(0)
@@ -3,27 +3,68 @@
 # Script name: pysftprmtcmd.py
 #
 # Description: 
-# This script will run up to 5 individual remote QSH/PASE or other SSH commands over SFTP SSH channel.
+# This script will run any number of individual remote QSH/PASE or other SSH commands over SFTP SSH channel.
 # The commands are run separately.
 # If you want commands run together, create a .bat file, PowerShell script or shell script to run on the remote system.
 # This version utilizes user ID and password or a user and private key file.
 #
+# All commands share one SSH connection. Each command runs on its own
+# channel of that connection, so there is no login per command. Commands
+# come from repeated --command parms, --command2 to --command5 and a
+# --commandfile, in that order. By default they run one after another.
+# With --parallel above 1, independent commands run at the same time on
+# separate channels and each output line is prefixed with [command number].
+# Output is printed as it arrives, not after the command ends. A summary
+# shows each command's exit status and elapsed seconds.
+#
+# With --inventory the same command list runs on every host in an
+# inventory file, up to --hostworkers hosts at a time, each over its own
+# SSH connection with the same credentials. Output lines are prefixed
+# with [host], and a table at the end shows each host's result, failed
+# command count, highest exit status and seconds. A fleet-wide check
+# takes about as long as the slowest host instead of the sum of all hosts.
+#
 # Pip packages needed:
 # pip3 install pysftp
 # pip3 install pysftp-extension (may not be needed)
 #
 # Parameters
-# --sftphost/-host=SFTP Host
-# --sftpport/-port=SFTP Port
-# --sftpuser/-user=SFTP User (User name is always required)
+# --sftphost/-host=SFTP Host. Not needed with --inventory.
+# --sftpport/-port=SFTP Port. Optional with --inventory. Default=22
+# --sftpuser/-user=SFTP User (User name is always required, either here
+#   or on every --inventory line)
 # --sftppass/-pass=SFTP Pass (Pasword can be empty if using private key)
 # --privatekeyfile/-privatekey=SFTP SSH private key file
 # --privatekeypass/-privatepass=SFTP SSH private key password if there is one
-# --command/-cmd=Remote command 1
+#   Port, user, password and key parms are only required without --inventory.
+# --command/-cmd=Remote command. Can be given more than once.
 # --command2/-cmd2=Remote command 2
 # --command3/-cmd3=Remote command 3
 # --command4/-cmd4=Remote command 4
 # --command5/-cmd5=Remote command 5
+# --commandfile/-cmdfile=File of remote commands, one per line, or - for
+#   stdin. Blank lines and lines starting with # are skipped. Default=blank
+# --parallel/-parallel=Commands run at the same time. 1=one after another.
+#   Default=1
+# --failonerror/-failonerror=End with ExitCode 99 if any command returns
+#   a non-zero exit status. True/False Default=False
+# --inventory/-inventory=File of hosts to run the commands on, one per
+#   line as host, host:port or user@host:port. IPv6 addresses are written
+#   as [addr]:port, or as a bare addr without a port. Port and user default
+#   to --sftpport and --sftpuser. Blank lines and lines starting with # are
+#   skipped. Default=blank
+# --hostworkers/-hostworkers=Hosts run at the same time for --inventory.
+#   Default=10
+# --broker/-broker=Reuse a login held by pysftpbroker.py. Socket path or
+#   auto for the default socket. Connects directly if no broker is
+#   running. Default=blank (no broker)
+#
+# Example:
+# python3 pysftprmtcmd.py -host ibmi1 -port 22 -user user1 -pass pass1 -privatekey "" -privatepass ""
+#   -cmdfile /tmp/nightly.txt -parallel 4 -failonerror True
+# Fan-out example:
+# python3 pysftprmtcmd.py -inventory /tmp/lpars.txt -port 22 -user user1 -pass pass1 -privatekey "" -privatepass ""
+#   -cmd "system 'WRKSYSSTS'" -hostworkers 20
 #------------------------------------------------
 # Useful Python links
 # https://stackoverflow.com/questions/53864260/no-hostkey-for-host-found-when-connecting-to-sftp-server-with-pysftp-usi
@@ -35,6 +76,10 @@ import sys
 from sys import platform
 import os
 import time
+import select
+import codecs
+import threading
+import concurrent.futures
 import traceback
 import csv
 import datetime as dt
@@ -59,6 +104,304 @@ print(appname)
 print("Start of Main Processing - " + time.strftime("%H:%M:%S"))
 print("OS:" + platform)
 
+#------------------------------------------------
+# Define some useful functions
+#------------------------------------------------
+
+def str2bool(strval):
+    #-------------------------------------------------------
+    # Function: str2bool
+    # Desc: Constructor
+    # :strval: String value for true or false
+    # :return: Return True if string value is" yes, true, t or 1
+    #-------------------------------------------------------
+    return strval.lower() in ("yes", "true", "t", "1")
+
+def sftp_connect(host,port,user,password,privatekeyfile,privatekeypass,broker=""):
+    #-------------------------------------------------------
+    # Function: sftp_connect
+    # Desc: Connect via User and password or User and Private Key
+    #       if key file specified. With a broker socket the login
+    #       is reused from pysftpbroker.py if it is running.
+    # :broker: Broker socket path, auto or blank for no broker
+    # :return: pysftp Connection or pysftpbroker.BrokerConnection
+    #-------------------------------------------------------
+    if broker != "":
+       import pysftpbroker
+       try:
+          connection = pysftpbroker.broker_connect(pysftpbroker.socket_path(broker),host,port,user,password,privatekeyfile,privatekeypass)
+          print("Broker connection: " + ("cached" if connection.cached else "new"))
+          return connection
+       except pysftpbroker.BrokerUnavailable as ex:
+          print(str(ex) + ". Connecting directly.")
+
+    # Sample SFTP options
+    cnopts = pysftp.CnOpts()
+    cnopts.hostkeys = None
+
+    # https://pypi.org/project/pysftp-extension/
+    if (privatekeyfile!=""):
+       return pysftp.Connection(host, port=port, username=user, private_key=privatekeyfile, private_key_pass=privatekeypass, cnopts=cnopts)
+    else:
+       return pysftp.Connection(host, port=port, username=user, password=password,private_key=None,private_key_pass=None,cnopts=cnopts)
+
+def read_lines(filename):
+    #-------------------------------------------------------
+    # Function: read_lines
+    # Desc: Read the non-blank, non-comment lines of a file
+    # :filename: File name or - for stdin
+    # :return: List of stripped lines
+    #-------------------------------------------------------
+    infile = sys.stdin if filename == "-" else open(filename,"r")
+    try:
+       return [line.strip() for line in infile if line.strip() != "" and not line.strip().startswith("#")]
+    finally:
+       if infile is not sys.stdin:
+          infile.close()
+
+def read_commands(commandfile):
+    #-------------------------------------------------------
+    # Function: read_commands
+    # Desc: Read remote commands from a file, one per line
+    # :commandfile: File name or - for stdin
+    # :return: List of commands
+    #-------------------------------------------------------
+    return read_lines(commandfile)
+
+def read_inventory(inventoryfile,defaultport,defaultuser):
+    #-------------------------------------------------------
+    # Function: read_inventory
+    # Desc: Read a host inventory file
+    # :inventoryfile: File of host, host:port or user@host:port lines.
+    #                 IPv6 hosts as [addr]:port or a bare addr.
+    # :defaultport: Port for hosts without one
+    # :defaultuser: User for hosts without one
+    # :return: List of (label, host, port, user) tuples. The label
+    #          is the inventory line, used to prefix output.
+    #-------------------------------------------------------
+    hosts = []
+    for line in read_lines(inventoryfile):
+       host = line
+       user = defaultuser
+       port = defaultport
+       if "@" in host:
+          user, host = host.rsplit("@",1)
+       if host.startswith("["):
+          # [addr] or [addr]:port
+          host, bracket, rest = host[1:].partition("]")
+          if bracket == "" or (rest != "" and rest.startswith(":") == False):
+             raise Exception("Inventory line " + line + " is not valid. Use [addr]:port for IPv6 addresses.")
+          if rest != "":
+             port = int(rest[1:])
+       elif host.count(":") == 1:
+          host, port = host.split(":")
+          port = int(port)
+       # More than one : is a bare IPv6 address with no port
+       if user == "":
+          raise Exception("Inventory line " + line + " has no user and --sftpuser was not passed.")
+       hosts.append((line,host,port,user))
+    return hosts
+
+class OutputPrinter:
+    #-------------------------------------------------------
+    # Class: OutputPrinter
+    # Desc: Prints command output a whole line at a time so
+    #       lines from concurrent commands don't mix
+    # :lock: Lock shared by all printers
+    # :prefix: Text put in front of each line
+    #-------------------------------------------------------
+    def __init__(self,lock,prefix=""):
+       self.lock = lock
+       self.prefix = prefix
+       self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+       self.pending = ""
+
+    def write(self,data):
+       #-------------------------------------------------------
+       # Function: write
+       # Desc: Print the complete lines in a piece of output and
+       #       keep the rest for the next piece
+       # :data: Output bytes
+       #-------------------------------------------------------
+       lines = (self.pending + self.decoder.decode(data)).split("\n")
+       self.pending = lines.pop()
+       if lines:
+          with self.lock:
+             for line in lines:
+                print(self.prefix + line,flush=True)
+
+    def flush(self):
+       #-------------------------------------------------------
+       # Function: flush
+       # Desc: Print any last line without a line end
+       #-------------------------------------------------------
+       self.pending += self.decoder.decode(b"",final=True)
+       if self.pending != "":
+          with self.lock:
+             print(self.prefix + self.pending,flush=True)
+          self.pending = ""
+
+def run_command(transport,command,lock,prefix=""):
+    #-------------------------------------------------------
+    # Function: run_command
+    # Desc: Run one remote command on a new channel of an open
+    #       SSH transport and print stdout and stderr as it arrives
+    # :transport: Authenticated paramiko Transport
+    # :command: Remote command
+    # :lock: Lock for printing
+    # :prefix: Text put in front of each output line
+    # :return: Tuple of (exit status, elapsed seconds). Exit status
+    #          is -1 if the server did not send one.
+    #-------------------------------------------------------
+    starttime = time.perf_counter()
+    channel = transport.open_session()
+    try:
+       channel.exec_command(command)
+       stdout = OutputPrinter(lock,prefix)
+       stderr = OutputPrinter(lock,prefix + "stderr: ")
+       while True:
+          gotdata = False
+          if channel.recv_ready():
+             stdout.write(channel.recv(32768))
+             gotdata = True
+          if channel.recv_stderr_ready():
+             stderr.write(channel.recv_stderr(32768))
+             gotdata = True
+          if not gotdata:
+             if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+             # Wakes on stdout data. Stderr is picked up within the timeout.
+             select.select([channel],[],[],0.1)
+       stdout.flush()
+       stderr.flush()
+       return (channel.recv_exit_status(),time.perf_counter() - starttime)
+    finally:
+       channel.close()
+
+def run_commands(transport,commands,parallel,lock=None,host=""):
+    #-------------------------------------------------------
+    # Function: run_commands
+    # Desc: Run a list of remote commands over one SSH transport,
+    #       one after another or several at a time
+    # :transport: Authenticated paramiko Transport
+    # :commands: List of remote commands
+    # :parallel: Commands run at the same time. 1=one after another.
+    # :lock: Lock for printing, shared when several hosts run at once
+    # :host: Host label to prefix output with. Blank=no host prefix.
+    # :return: List of (command, exit status, elapsed seconds, error)
+    #          in command order. Error is blank if the command ran.
+    #-------------------------------------------------------
+    if lock is None:
+       lock = threading.Lock()
+    results = [None] * len(commands)
+    nextcommand = [0]
+
+    def prefix(cmdno):
+       labels = ([host] if host != "" else []) + ([str(cmdno + 1)] if parallel > 1 else [])
+       return "[" + " ".join(labels) + "] " if labels else ""
+
+    def worker():
+       while True:
+          with lock:
+             cmdno = nextcommand[0]
+             if cmdno >= len(commands):
+                return
+             nextcommand[0] += 1
+             if host == "":
+                print("-------------------------------------------------------------------------------")
+             print(prefix(cmdno) + f"Command {cmdno + 1}: " + commands[cmdno],flush=True)
+          starttime = time.perf_counter()
+          try:
+             exitstatus, elapsed = run_command(transport,commands[cmdno],lock,prefix(cmdno))
+             results[cmdno] = (commands[cmdno],exitstatus,elapsed,"")
+          except Exception as ex:
+             results[cmdno] = (commands[cmdno],-1,time.perf_counter() - starttime,str(ex))
+
+    threads = [threading.Thread(target=worker) for i in range(max(1,min(parallel,len(commands))))]
+    for thread in threads:
+       thread.start()
+    for thread in threads:
+       thread.join()
+    return results
+
+def run_fanout(hosts,commands,parallel,hostworkers,password,privatekeyfile,privatekeypass,broker=""):
+    #-------------------------------------------------------
+    # Function: run_fanout
+    # Desc: Run the same command list on many hosts at once, each
+    #       over its own SSH connection, hostworkers hosts at a time
+    # :hosts: List of (label, host, port, user) tuples
+    # :commands: List of remote commands
+    # :parallel: Commands run at the same time on each host
+    # :hostworkers: Hosts run at the same time
+    # :password: SSH password for every host
+    # :privatekeyfile: SSH private key file for every host
+    # :privatekeypass: SSH private key password
+    # :broker: Broker socket path, auto or blank for no broker
+    # :return: List of (label, command results, elapsed seconds, error)
+    #          in inventory order. Error is blank if the host connected.
+    #-------------------------------------------------------
+    lock = threading.Lock()
+
+    def run_host(hostentry):
+       label, host, port, user = hostentry
+       starttime = time.perf_counter()
+       try:
+          sftp = sftp_connect(host,port,user,password,privatekeyfile,privatekeypass,broker)
+       except Exception as ex:
+          with lock:
+             print(f"[{label}] Connect failed: {ex}",flush=True)
+          return (label,[],time.perf_counter() - starttime,"Connect failed: " + str(ex))
+       try:
+          results = run_commands(sftp.sftp_client.get_channel().get_transport(),commands,parallel,lock,label)
+          return (label,results,time.perf_counter() - starttime,"")
+       except Exception as ex:
+          return (label,[],time.perf_counter() - starttime,str(ex))
+       finally:
+          sftp.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1,hostworkers)) as executor:
+       return list(executor.map(run_host,hosts))
+
+def print_summary(results):
+    #-------------------------------------------------------
+    # Function: print_summary
+    # Desc: Print exit status and seconds for each command
+    # :results: List from run_commands
+    # :return: Count of failed commands
+    #-------------------------------------------------------
+    print(f"{'#':>4} {'Status':>6} {'Seconds':>8}  Command")
+    failed = 0
+    for cmdno, (command, exitstatus, cmdelapsed, error) in enumerate(results,1):
+       if exitstatus != 0:
+          failed += 1
+       print(f"{cmdno:>4} {exitstatus:>6} {cmdelapsed:>8.2f}  {command}" + (f"  Error: {error}" if error != "" else ""))
+    return failed
+
+def print_host_summary(hostresults):
+    #-------------------------------------------------------
+    # Function: print_host_summary
+    # Desc: Print one line per host for a fan-out run
+    # :hostresults: List from run_fanout
+    # :return: Count of hosts that failed to connect or had a
+    #          failed command
+    #-------------------------------------------------------
+    width = max([len("Host")] + [len(host) for host, results, elapsed, error in hostresults])
+    print(f"{'Host':<{width}} {'Result':<8} {'Failed':>6} {'MaxRC':>6} {'Seconds':>8}")
+    failedhosts = 0
+    for host, results, elapsed, error in hostresults:
+       failed = sum(1 for result in results if result[1] != 0)
+       maxstatus = max([result[1] for result in results],default=0)
+       if error != "":
+          result = "ERROR"
+       elif failed > 0:
+          result = "FAILED"
+       else:
+          result = "OK"
+       if result != "OK":
+          failedhosts += 1
+       print(f"{host:<{width}} {result:<8} {failed:>6} {maxstatus:>6} {elapsed:>8.2f}" + (f"  {error}" if error != "" else ""))
+    return failedhosts
+
 #------------------------------------------------
 # Main script logic
 #------------------------------------------------
@@ -72,18 +415,28 @@ try: # Try to perform main logic
    # exit with an error 2. In Python 3.9, there is 
    # an argument to prevent an auto-exit
    # Each argument has a long and short version
+   # Inventory lines can carry their own user and port
+   preparser = argparse.ArgumentParser(add_help=False)
+   preparser.add_argument('-inventory','--inventory', default="")
+   needconnect = preparser.parse_known_args()[0].inventory.strip() == ""
    parser = argparse.ArgumentParser()
-   parser.add_argument('-host','--sftphost', required=True,help="SFTP server host/ip")
-   parser.add_argument('-port','--sftpport', required=True,help="SFTP port")
-   parser.add_argument('-user','--sftpuser', required=True,help="SFTP user")
-   parser.add_argument('-pass','--sftppass', required=True,help="SFTP password")
-   parser.add_argument('-privatekey','--privatekeyfile', required=True,help="Private key file")
-   parser.add_argument('-privatepass','--privatekeypass', required=True,help="Private key password")
-   parser.add_argument('-cmd','--command', required=True,help="Command")
+   parser.add_argument('-host','--sftphost', default="",required=False,help="SFTP server host/ip. Not needed with --inventory")
+   parser.add_argument('-port','--sftpport', default="22",required=needconnect,help="SFTP port. Default value=22 with --inventory")
+   parser.add_argument('-user','--sftpuser', default="",required=needconnect,help="SFTP user")
+   parser.add_argument('-pass','--sftppass', default="",required=needconnect,help="SFTP password")
+   parser.add_argument('-privatekey','--privatekeyfile', default="",required=needconnect,help="Private key file")
+   parser.add_argument('-privatepass','--privatekeypass', default="",required=needconnect,help="Private key password")
+   parser.add_argument('-cmd','--command', action="append",default=[],required=False,help="Command. Can be given more than once")
    parser.add_argument('-cmd2','--command2',default="", required=False,help="Command 2")
    parser.add_argument('-cmd3','--command3',default="", required=False,help="Command 3")
    parser.add_argument('-cmd4','--command4',default="", required=False,help="Command 4")
    parser.add_argument('-cmd5','--command5',default="", required=False,help="Command 5")
+   parser.add_argument('-cmdfile','--commandfile',default="", required=False,help="File of commands, one per line, or - for stdin. Default value=blank")
+   parser.add_argument('-parallel','--parallel',default="1", required=False,help="Commands run at the same time. Default value=1")
+   parser.add_argument('-failonerror','--failonerror',default="False", required=False,help="Fail if any command returns a non-zero exit status. Default value=False")
+   parser.add_argument('-inventory','--inventory',default="", required=False,help="File of hosts to run the commands on. Default value=blank")
+   parser.add_argument('-hostworkers','--hostworkers',default="10", required=False,help="Hosts run at the same time for --inventory. Default value=10")
+   parser.add_argument('-broker','--broker', default="",required=False,help="pysftpbroker.py socket path or auto. Default value=blank")
 
    # Parse the command line arguments 
    args = parser.parse_args()
@@ -93,11 +446,17 @@ try: # Try to perform main logic
    parmsftpport=int(args.sftpport.strip())
    parmsftpuser=args.sftpuser.strip()
    parmsftppass=args.sftppass.strip()
-   parmcommand=args.command.strip()
+   parmcommands=[command.strip() for command in args.command]
    parmcommand2=args.command2.strip()
    parmcommand3=args.command3.strip()
    parmcommand4=args.command4.strip()
    parmcommand5=args.command5.strip()
+   parmcommandfile=args.commandfile.strip()
+   parmparallel=int(args.parallel)
+   parmfailonerror=str2bool(args.failonerror)
+   parminventory=args.inventory.strip()
+   parmhostworkers=int(args.hostworkers)
+   parmbroker=args.broker.strip()
    parmsprivatekeyfile=args.privatekeyfile.strip()
    parmsprivatekeypass=args.privatekeypass.strip()
 
@@ -106,79 +465,70 @@ try: # Try to perform main logic
    print("SFTP Host: " + parmsftphost)
    print("SFTP Port: " + str(parmsftpport))   
    print("SFTP User: " + parmsftpuser)
-   print("Command 1: " + parmcommand)
+   for parmcommand in parmcommands:
+      print("Command: " + parmcommand)
    print("Command 2: " + parmcommand2)
    print("Command 3: " + parmcommand3)
    print("Command 4: " + parmcommand4)
    print("Command 5: " + parmcommand5)
+   print("Command file: " + parmcommandfile)
+   print("Parallel: " + str(parmparallel))
+   print("Fail on error: " + str(parmfailonerror))
+   print("Inventory: " + parminventory)
+   print("Host workers: " + str(parmhostworkers))
+   print("Broker: " + parmbroker)
+
+   # Build the command list in order
+   commands=parmcommands + [parmcommand2,parmcommand3,parmcommand4,parmcommand5]
+   if parmcommandfile != "":
+      commands=commands + read_commands(parmcommandfile)
+   commands=[command for command in commands if command != ""]
+   if len(commands) == 0:
+      raise Exception("No commands to run. Pass --command or --commandfile.")
+   if parmsftphost == "" and parminventory == "":
+      raise Exception("No host to run on. Pass --sftphost or --inventory.")
    
-   # Sample SFTP options
-   cnopts = pysftp.CnOpts()
-   cnopts.hostkeys = None
-
-   # Connect via User and password or User and Private Key if key file specified   
-   # https://pypi.org/project/pysftp-extension/
-   if (parmsprivatekeyfile!=""):
-      sftp=pysftp.Connection(parmsftphost, port=parmsftpport, username=parmsftpuser, private_key=parmsprivatekeyfile, private_key_pass=parmsprivatekeypass, cnopts=cnopts)
+   if parminventory != "":
+      # Run the command list on every inventory host at once
+      hosts=read_inventory(parminventory,parmsftpport,parmsftpuser)
+      print(f"Hosts: {len(hosts)}")
+      print("-------------------------------------------------------------------------------")
+      starttime=time.perf_counter()
+      hostresults=run_fanout(hosts,commands,parmparallel,parmhostworkers,parmsftppass,parmsprivatekeyfile,parmsprivatekeypass,parmbroker)
+      elapsed=time.perf_counter() - starttime
+      print("-------------------------------------------------------------------------------")
+
+      # Output per host summary
+      print("Summary:")
+      failedhosts=print_host_summary(hostresults)
+      print(f"Hosts: {len(hostresults)}  Failed: {failedhosts}  Seconds: {elapsed:.2f}  Sum of host seconds: {sum(result[2] for result in hostresults):.2f}")
+      connectfailed=sum(1 for result in hostresults if result[3] != "")
+      if connectfailed > 0:
+         raise Exception(str(connectfailed) + " of " + str(len(hostresults)) + " hosts could not run the commands.")
+      if parmfailonerror and failedhosts > 0:
+         raise Exception(str(failedhosts) + " of " + str(len(hostresults)) + " hosts had failed commands.")
+
    else:
-      sftp=pysftp.Connection(parmsftphost, port=parmsftpport, username=parmsftpuser, password=parmsftppass,private_key=None,private_key_pass=None,cnopts=cnopts)
+      # Connect via User and password or User and Private Key if key file specified   
+      sftp=sftp_connect(parmsftphost,parmsftpport,parmsftpuser,parmsftppass,parmsprivatekeyfile,parmsprivatekeypass,parmbroker)
    
       ##sftp.server_extensions={'server-sig-algs','ssh-rsa'}
       ###with sftp.cd('/tmp'):           #Ex: temporarily chdir to selected dir if needed
 
-   # Run command 1
-   if parmcommand.strip() != "":   
-      print("-------------------------------------------------------------------------------")
-      print("Command: " + parmcommand)
-      stdout=sftp.execute(parmcommand)
-      for curstdout in stdout:
-          print(curstdout.decode("utf-8"),end = '')
-
-   # TODO - Need to parse return text for now. haven't figure this out return code yet with pysftp. 
-   # Get return code from command 1 by using echo
-   #if parmcommand.strip() != "":   
-   #   stdout= sftp.execute("echo $?")
-   #   # Only iterate first element which should be return code
-   #   for curstdout in stdout:
-   #       sshrtn=int(curstdout.decode("utf-8"))
-   #       print(sshrtn)
-   #       break;
-
-   # Run command 2
-   if parmcommand2.strip() != "":
-      print("-------------------------------------------------------------------------------")
-      print("Command2: " + parmcommand2)  
-      stdout2=sftp.execute(parmcommand2)
-      for curstdout in stdout2:
-          print(curstdout.decode("utf-8"),end = '')
-   
-   # Run command 3
-   if parmcommand3.strip() != "":
+      # Run every command on its own channel of the one SSH transport
+      starttime=time.perf_counter()
+      results=run_commands(sftp.sftp_client.get_channel().get_transport(),commands,parmparallel)
+      elapsed=time.perf_counter() - starttime
       print("-------------------------------------------------------------------------------")
-      print("Command3: " + parmcommand3)  
-      stdout3=sftp.execute(parmcommand3)
-      for curstdout in stdout3:
-          print(curstdout.decode("utf-8"),end = '')
-   
-   # Run command 4
-   if parmcommand4.strip() != "":
-      print("-------------------------------------------------------------------------------")
-      print("Command4: " + parmcommand4)  
-      stdout4=sftp.execute(parmcommand4)
-      for curstdout in stdout4:
-          print(curstdout.decode("utf-8"),end = '')
-   
-   # Run command 5
-   if parmcommand5.strip() != "":
-      print("-------------------------------------------------------------------------------")
-      print("Command5: " + parmcommand5)  
-      stdout5= sftp.execute(parmcommand5)
-      for curstdout in stdout5:
-          print(curstdout.decode("utf-8"),end = '')
- 
-   print("-------------------------------------------------------------------------------")
                         
-   sftp.close()
+      sftp.close()
+
+      # Output summary
+      print("Summary:")
+      failed=print_summary(results)
+      print(f"Commands: {len(results)}  Failed: {failed}  Seconds: {elapsed:.2f}")
+      if parmfailonerror and failed > 0:
+         raise Exception(str(failed) + " of " + str(len(results)) + " commands failed.")
 
    # Set success info
    exitcode=0
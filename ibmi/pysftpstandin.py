@@ -0,0 +1,323 @@
+#!/QOpenSys/pkgs/bin/python3
+#------------------------------------------------
+# Script name: pysftpstandin.py
+#
+# Description:
+# Local stand-in SFTP server for testing and benchmarking the
+# pysftp scripts without a real partner system. Serves a local
+# directory over SFTP on localhost and accepts any user and
+# password or key. A latency proxy can sit in front of it and
+# delay traffic in both directions to act like a slow WAN link.
+#
+# Used by the --benchmark mode of pysftpdownload.py. Can also be
+# run on its own and pointed at by the other pysftp scripts.
+#
+# Not a secure server. Only listens on 127.0.0.1.
+#
+# Pip packages needed:
+# pip3 install paramiko
+#
+# Parameters
+# --root/-root=Local directory to serve. Default=current directory
+# --port/-port=Port to listen on. 0=any free port. Default=2222
+# --latencyms/-latencyms=Round trip milliseconds added by the latency proxy.
+#   0=no proxy. Default=0
+#
+# Testing command line - CLI
+# python3 pysftpstandin.py --root /tmp/outbound --port 2222 --latencyms 80
+#------------------------------------------------
+# Imports
+#------------------------------------------------
+import os
+import sys
+import time
+import socket
+import threading
+import collections
+import argparse
+import paramiko
+
+#------------------------------------------------
+# Define classes and functions
+#------------------------------------------------
+
+class StandinAuth(paramiko.ServerInterface):
+    #-------------------------------------------------------
+    # Class: StandinAuth
+    # Desc: Accept any login and session channel
+    #-------------------------------------------------------
+    def check_auth_password(self,username,password):
+       return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self,username,key):
+       return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self,username):
+       return "password,publickey"
+
+    def check_channel_request(self,kind,chanid):
+       return paramiko.OPEN_SUCCEEDED
+
+class StandinHandle(paramiko.SFTPHandle):
+    #-------------------------------------------------------
+    # Class: StandinHandle
+    # Desc: Open file on the stand-in server
+    #-------------------------------------------------------
+    def stat(self):
+       try:
+          return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def chattr(self,attr):
+       try:
+          paramiko.SFTPServer.set_file_attr(self.filename,attr)
+          return paramiko.SFTP_OK
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+class StandinSFTP(paramiko.SFTPServerInterface):
+    #-------------------------------------------------------
+    # Class: StandinSFTP
+    # Desc: SFTP requests mapped onto a local root directory
+    #-------------------------------------------------------
+    root = os.getcwd()
+
+    def _local(self,path):
+       return os.path.join(self.root,self.canonicalize(path).lstrip("/"))
+
+    def canonicalize(self,path):
+       return os.path.normpath("/" + path).replace("//","/")
+
+    def list_folder(self,path):
+       try:
+          folder = self._local(path)
+          entries = []
+          for name in os.listdir(folder):
+             attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(folder,name)))
+             attr.filename = name
+             entries.append(attr)
+          return entries
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def stat(self,path):
+       try:
+          return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def lstat(self,path):
+       try:
+          return paramiko.SFTPAttributes.from_stat(os.lstat(self._local(path)))
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def open(self,path,flags,attr):
+       localpath = self._local(path)
+       try:
+          fd = os.open(localpath,flags | getattr(os,"O_BINARY",0),0o644)
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+       if (flags & os.O_CREAT) and (attr is not None):
+          attr._flags &= ~attr.FLAG_PERMISSIONS
+          paramiko.SFTPServer.set_file_attr(localpath,attr)
+       if flags & os.O_WRONLY:
+          mode = "ab" if flags & os.O_APPEND else "wb"
+       elif flags & os.O_RDWR:
+          mode = "a+b" if flags & os.O_APPEND else "r+b"
+       else:
+          mode = "rb"
+       handle = StandinHandle(flags)
+       handle.filename = localpath
+       handle.readfile = handle.writefile = os.fdopen(fd,mode)
+       return handle
+
+    def remove(self,path):
+       try:
+          os.remove(self._local(path))
+          return paramiko.SFTP_OK
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def rename(self,oldpath,newpath):
+       try:
+          os.replace(self._local(oldpath),self._local(newpath))
+          return paramiko.SFTP_OK
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def posix_rename(self,oldpath,newpath):
+       return self.rename(oldpath,newpath)
+
+    def mkdir(self,path,attr):
+       try:
+          os.mkdir(self._local(path))
+          return paramiko.SFTP_OK
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def rmdir(self,path):
+       try:
+          os.rmdir(self._local(path))
+          return paramiko.SFTP_OK
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def chattr(self,path,attr):
+       try:
+          paramiko.SFTPServer.set_file_attr(self._local(path),attr)
+          return paramiko.SFTP_OK
+       except OSError as ex:
+          return paramiko.SFTPServer.convert_errno(ex.errno)
+
+class StandinServer:
+    #-------------------------------------------------------
+    # Class: StandinServer
+    # Desc: Stand-in SFTP server on 127.0.0.1 with its own
+    #       accept thread and one thread per connection
+    # :root: Local directory to serve
+    # :port: Port to listen on. 0=any free port
+    #-------------------------------------------------------
+    def __init__(self,root,port=0):
+       self.root = os.path.abspath(root)
+       self.hostkey = paramiko.RSAKey.generate(2048)
+       self.listener = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+       self.listener.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+       self.listener.bind(("127.0.0.1",port))
+       self.listener.listen(50)
+       self.port = self.listener.getsockname()[1]
+       self.transports = []
+       self.thread = threading.Thread(target=self._accept,daemon=True)
+       self.thread.start()
+
+    def _accept(self):
+       # Each server gets its own handler class so roots don't mix
+       sftpclass = type("StandinSFTPRoot",(StandinSFTP,),{"root": self.root})
+       while True:
+          try:
+             conn, address = self.listener.accept()
+          except OSError:
+             return
+          transport = paramiko.Transport(conn)
+          transport.add_server_key(self.hostkey)
+          transport.set_subsystem_handler("sftp",paramiko.SFTPServer,sftpclass)
+          transport.start_server(server=StandinAuth())
+          self.transports.append(transport)
+
+    def close(self):
+       self.listener.close()
+       for transport in self.transports:
+          transport.close()
+
+class LatencyProxy:
+    #-------------------------------------------------------
+    # Class: LatencyProxy
+    # Desc: TCP proxy on 127.0.0.1 that holds every chunk of
+    #       data for half the round trip time in each direction.
+    #       Data keeps flowing while it waits, like a long link,
+    #       so only request/response round trips get slower.
+    # :targetport: Local port to forward to
+    # :latencyms: Round trip milliseconds to add
+    # :port: Port to listen on. 0=any free port
+    #-------------------------------------------------------
+    def __init__(self,targetport,latencyms,port=0):
+       self.targetport = targetport
+       self.delay = latencyms / 2000.0
+       self.listener = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+       self.listener.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+       self.listener.bind(("127.0.0.1",port))
+       self.listener.listen(50)
+       self.port = self.listener.getsockname()[1]
+       self.thread = threading.Thread(target=self._accept,daemon=True)
+       self.thread.start()
+
+    def _accept(self):
+       while True:
+          try:
+             client, address = self.listener.accept()
+          except OSError:
+             return
+          server = socket.create_connection(("127.0.0.1",self.targetport))
+          for sock in (client,server):
+             sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+          self._pipe(client,server)
+          self._pipe(server,client)
+
+    def _pipe(self,source,target):
+       # One thread reads and stamps chunks, one sends them when due
+       chunks = collections.deque()
+       ready = threading.Condition()
+
+       def reader():
+          while True:
+             try:
+                data = source.recv(262144)
+             except OSError:
+                data = b""
+             with ready:
+                chunks.append((time.monotonic() + self.delay,data))
+                ready.notify()
+             if not data:
+                return
+
+       def sender():
+          while True:
+             with ready:
+                while not chunks:
+                   ready.wait()
+                due, data = chunks.popleft()
+             wait = due - time.monotonic()
+             if wait > 0:
+                time.sleep(wait)
+             try:
+                if not data:
+                   target.shutdown(socket.SHUT_WR)
+                   return
+                target.sendall(data)
+             except OSError:
+                return
+
+       threading.Thread(target=reader,daemon=True).start()
+       threading.Thread(target=sender,daemon=True).start()
+
+    def close(self):
+       self.listener.close()
+
+def start_standin(root,latencyms=0,port=0):
+    #-------------------------------------------------------
+    # Function: start_standin
+    # Desc: Start a stand-in SFTP server, behind a latency proxy
+    #       if latencyms is set
+    # :root: Local directory to serve
+    # :latencyms: Round trip milliseconds to add. 0=no proxy
+    # :port: Port to listen on. 0=any free port
+    # :return: Tuple of (port to connect to, list of objects to close)
+    #-------------------------------------------------------
+    server = StandinServer(root,0 if latencyms > 0 else port)
+    if latencyms <= 0:
+       return (server.port,[server])
+    proxy = LatencyProxy(server.port,latencyms,port)
+    return (proxy.port,[proxy,server])
+
+#------------------------------------------------
+# Main script logic
+#------------------------------------------------
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser()
+   parser.add_argument('-root','--root', default=".",required=False,help="Local directory to serve. Default value=current directory")
+   parser.add_argument('-port','--port', default="2222",required=False,help="Port to listen on. Default value=2222")
+   parser.add_argument('-latencyms','--latencyms', default="0",required=False,help="Round trip milliseconds to add. Default value=0")
+   args = parser.parse_args()
+
+   port, servers = start_standin(args.root,float(args.latencyms),int(args.port))
+   print(f"Stand-in SFTP server for {os.path.abspath(args.root)} on 127.0.0.1 port {port}" +
+         (f" with {args.latencyms} ms latency" if float(args.latencyms) > 0 else ""))
+   print("Press Ctrl-C to stop")
+   try:
+      while True:
+         time.sleep(3600)
+   except KeyboardInterrupt:
+      for server in servers:
+         server.close()
+      sys.exit(0)
@@ -6,6 +6,22 @@
 # This script will upload a specified local file to a remote sftp server.
 # This version utilizes user ID and password or a user and private key file.
 #
+# With --sync True the local file is a directory and the remote file is
+# a remote directory. The whole local tree is uploaded over one SSH
+# connection, spread across --channels concurrent SFTP channels. Each
+# remote directory is listed once, and files whose remote size and
+# modified time already match the local file are skipped, so only new
+# and changed files are sent. Changed files are replaced. Files are
+# uploaded to <name>.partial and renamed into place when complete, and
+# the remote modified time is set to the local one for the next sync.
+#
+# --compress gzip or zstd compresses each file while it streams out, so
+# text files like CSV and spool exports use less of a slow link. The
+# compressed data goes straight to the remote file with no local temp
+# file. With --sync the remote names get .gz or .zst added, and since
+# sizes differ only the modified time is compared. The log shows the
+# compression ratio and both the wire and effective throughput.
+#
 # Pip packages needed:
 # pip3 install pysftp
 # pip3 install pysftp-extension (may not be needed)
@@ -20,6 +36,23 @@
 # --fromlocalfile/-fromfile=Local file to upload
 # --toremotefile/-tofile=Remote file to upload to
 # --replacefile/-replace=Replace remote to file if it exists. True/False Default=False
+# --sync/-sync=Upload new and changed files of a local directory tree to a
+#   remote directory. True/False Default=False
+# --channels/-channels=Concurrent SFTP channels for --sync. Default=4
+# --compress/-compress=Compress while uploading: none, gzip or zstd.
+#   For a single file the remote file name is used as given, so end it
+#   with .gz or .zst. Default=none
+#   zstd needs: pip3 install zstandard
+# --broker/-broker=Reuse a login held by pysftpbroker.py. Socket path or
+#   auto for the default socket. Connects directly if no broker is
+#   running. Default=blank (no broker)
+#
+# Sync example:
+# python3 pysftpupload.py -host sftp1 -port 22 -user user1 -pass pass1 -privatekey "" -privatepass ""
+#   -fromfile /outbound/drop -tofile /inbound/drop -sync True -channels 8
+# Compressed upload example:
+# python3 pysftpupload.py -host sftp1 -port 22 -user user1 -pass pass1 -privatekey "" -privatepass ""
+#   -fromfile /outbound/sales.csv -tofile /inbound/sales.csv.gz -compress gzip
 #------------------------------------------------
 # Useful Python links
 # https://stackoverflow.com/questions/53864260/no-hostkey-for-host-found-when-connecting-to-sftp-server-with-pysftp-usi
@@ -31,14 +64,25 @@ import sys
 from sys import platform
 import os
 import time
+import stat
+import threading
+import queue
+import zlib
 import traceback
 import datetime as dt
 from string import Template 
 from urllib.parse import unquote
 import pysftp
 #import pysftp_extension
+import paramiko
 import argparse
 
+# zstandard is only needed for zstd compression
+try:
+   import zstandard
+except ImportError:
+   zstandard = None
+
 #------------------------------------------------
 # Script initialization
 #------------------------------------------------
@@ -94,6 +138,233 @@ def ltrim(strval):
     #-------------------------------------------------------
     return strval.lstrip()
 
+def sftp_connect(host,port,user,password,privatekeyfile,privatekeypass,broker=""):
+    #-------------------------------------------------------
+    # Function: sftp_connect
+    # Desc: Connect via User and password or User and Private Key
+    #       if key file specified. With a broker socket the login
+    #       is reused from pysftpbroker.py if it is running.
+    # :broker: Broker socket path, auto or blank for no broker
+    # :return: pysftp Connection or pysftpbroker.BrokerConnection
+    #-------------------------------------------------------
+    if broker != "":
+       import pysftpbroker
+       try:
+          connection = pysftpbroker.broker_connect(pysftpbroker.socket_path(broker),host,port,user,password,privatekeyfile,privatekeypass)
+          print("Broker connection: " + ("cached" if connection.cached else "new"))
+          return connection
+       except pysftpbroker.BrokerUnavailable as ex:
+          print(str(ex) + ". Connecting directly.")
+
+    # Sample SFTP options
+    cnopts = pysftp.CnOpts()
+    cnopts.hostkeys = None
+
+    # https://pypi.org/project/pysftp-extension/
+    if (privatekeyfile!=""): 
+       return pysftp.Connection(host, port=port, username=user, private_key=privatekeyfile, private_key_pass=privatekeypass, cnopts=cnopts)
+    else:
+       return pysftp.Connection(host, port=port, username=user, password=password,private_key=None,private_key_pass=None,cnopts=cnopts)
+
+# Remote file name endings of each compression method
+compressionsuffixes = {"gzip": ".gz", "zstd": ".zst"}
+
+def compression_method(compress):
+    #-------------------------------------------------------
+    # Function: compression_method
+    # Desc: Check the compress parm
+    # :compress: none, gzip or zstd
+    # :return: gzip, zstd or blank for none
+    #-------------------------------------------------------
+    compress = compress.lower()
+    if compress in ("","none"):
+       return ""
+    if compress not in compressionsuffixes:
+       raise Exception("Unknown compress method " + compress + ". Use none, gzip or zstd.")
+    if compress == "zstd" and zstandard is None:
+       raise Exception("zstd compression needs the zstandard package. pip3 install zstandard")
+    return compress
+
+def make_compressor(method):
+    #-------------------------------------------------------
+    # Function: make_compressor
+    # Desc: Incremental compressor for a method
+    # :method: gzip or zstd
+    # :return: Object with compress(data) and flush() methods
+    #-------------------------------------------------------
+    if method == "gzip":
+       return zlib.compressobj(6,zlib.DEFLATED,31) # 31 = gzip header and trailer
+    return zstandard.ZstdCompressor().compressobj()
+
+def upload_compressed(client,localfile,remotefile,method,blocksize=1048576):
+    #-------------------------------------------------------
+    # Function: upload_compressed
+    # Desc: Compress a local file block by block and write the
+    #       compressed data straight to a remote file. Writes are
+    #       pipelined so the link stays busy while compressing.
+    # :client: paramiko SFTPClient
+    # :localfile: Local file
+    # :remotefile: Remote file to create
+    # :method: gzip or zstd
+    # :blocksize: Bytes read and compressed at a time
+    # :return: Compressed bytes written
+    #-------------------------------------------------------
+    compressor = make_compressor(method)
+    written = 0
+    with open(localfile,"rb") as infile:
+       with client.open(remotefile,"wb") as remote:
+          remote.set_pipelined(True)
+          while True:
+             block = infile.read(blocksize)
+             if not block:
+                break
+             data = compressor.compress(block)
+             if data:
+                remote.write(data)
+                written += len(data)
+          data = compressor.flush()
+          remote.write(data)
+          written += len(data)
+    return written
+
+def print_compression(rawbytes,wirebytes,elapsed):
+    #-------------------------------------------------------
+    # Function: print_compression
+    # Desc: Log compression ratio and throughput
+    # :rawbytes: Bytes read from local files
+    # :wirebytes: Compressed bytes sent
+    # :elapsed: Seconds taken
+    #-------------------------------------------------------
+    print(f"Raw bytes: {rawbytes}  Compressed bytes: {wirebytes}  Compression ratio: {rawbytes / max(1,wirebytes):.1f}:1")
+    if elapsed > 0:
+       print(f"Effective MB/s: {rawbytes / 1048576 / elapsed:.2f}  Wire MB/s: {wirebytes / 1048576 / elapsed:.2f}")
+
+def list_remote_dir(client,remotedir):
+    #-------------------------------------------------------
+    # Function: list_remote_dir
+    # Desc: List a remote directory with one batched listing
+    # :client: paramiko SFTPClient
+    # :remotedir: Remote directory
+    # :return: Dictionary of name to SFTPAttributes, or None if
+    #          the directory does not exist
+    #-------------------------------------------------------
+    try:
+       return {attr.filename: attr for attr in client.listdir_attr(remotedir)}
+    except IOError:
+       return None
+
+def plan_sync(client,localdir,remotedir,suffix=""):
+    #-------------------------------------------------------
+    # Function: plan_sync
+    # Desc: Compare a local directory tree with a remote directory
+    #       using one listing per remote directory
+    # :client: paramiko SFTPClient
+    # :localdir: Local directory
+    # :remotedir: Remote directory
+    # :suffix: Ending added to remote names of compressed uploads.
+    #          Only the modified time is compared when set.
+    # :return: Tuple of (remote directories to create,
+    #          list of (local file, remote file, size, mtime) to upload,
+    #          count of files skipped because they match)
+    #-------------------------------------------------------
+    createdirs = []
+    uploads = []
+    skipped = 0
+    for dirpath, dirnames, filenames in os.walk(localdir):
+       dirnames.sort()
+       relpath = os.path.relpath(dirpath,localdir)
+       remotepath = remotedir.rstrip("/") if relpath == "." else remotedir.rstrip("/") + "/" + relpath.replace(os.sep,"/")
+       # Nothing exists under a directory that has to be created
+       parentmissing = any(remotepath.startswith(created + "/") for created in createdirs)
+       listing = None if parentmissing else list_remote_dir(client,remotepath)
+       if listing is None:
+          createdirs.append(remotepath)
+          listing = {}
+       for filename in sorted(filenames):
+          localfile = os.path.join(dirpath,filename)
+          localstat = os.stat(localfile)
+          remoteattr = listing.get(filename + suffix)
+          if (remoteattr is not None and stat.S_ISREG(remoteattr.st_mode) and
+              (suffix != "" or remoteattr.st_size == localstat.st_size) and
+              int(remoteattr.st_mtime) == int(localstat.st_mtime)):
+             skipped += 1
+             continue
+          uploads.append((localfile,remotepath + "/" + filename + suffix,localstat.st_size,localstat.st_mtime))
+    return (createdirs,uploads,skipped)
+
+def upload_files(transport,files,channels,compress=""):
+    #-------------------------------------------------------
+    # Function: upload_files
+    # Desc: Upload files over one SSH transport using concurrent
+    #       SFTP channels. Each channel has its own thread and
+    #       pulls the next file from a shared queue. Each file is
+    #       written to <name>.partial, renamed into place and
+    #       given the local modified time.
+    # :transport: Authenticated paramiko Transport
+    # :files: List of (local file, remote file, size, mtime) tuples
+    # :channels: Concurrent SFTP channels
+    # :compress: gzip, zstd or blank for none
+    # :return: Tuple of (files uploaded, bytes read, bytes sent,
+    #          list of errors)
+    #-------------------------------------------------------
+    work = queue.Queue()
+    for item in files:
+       work.put(item)
+    lock = threading.Lock()
+    totals = {"files": 0, "bytes": 0, "wirebytes": 0}
+    errors = []
+
+    def channel_worker():
+       try:
+          client = paramiko.SFTPClient.from_transport(transport)
+       except Exception as ex:
+          with lock:
+             errors.append("Opening SFTP channel: " + str(ex))
+          return
+       try:
+          while True:
+             try:
+                localfile, remotefile, size, mtime = work.get_nowait()
+             except queue.Empty:
+                return
+             try:
+                starttime = time.perf_counter()
+                partialfile = remotefile + ".partial"
+                if compress == "":
+                   client.put(localfile,partialfile)
+                   wiresize = size
+                else:
+                   wiresize = upload_compressed(client,localfile,partialfile,compress)
+                try:
+                   client.posix_rename(partialfile,remotefile)
+                except IOError:
+                   # Server without the posix-rename extension
+                   try:
+                      client.remove(remotefile)
+                   except IOError:
+                      pass
+                   client.rename(partialfile,remotefile)
+                client.utime(remotefile,(mtime,mtime))
+                elapsed = time.perf_counter() - starttime
+                with lock:
+                   totals["files"] += 1
+                   totals["bytes"] += size
+                   totals["wirebytes"] += wiresize
+                   print(f"Uploaded {localfile} to {remotefile} {size} bytes {elapsed:.2f} seconds" +
+                         (f" {compress} compressed to {wiresize} bytes ratio {size / max(1,wiresize):.1f}:1" if compress != "" else ""))
+             except Exception as ex:
+                with lock:
+                   errors.append(localfile + ": " + str(ex))
+       finally:
+          client.close()
+
+    threads = [threading.Thread(target=channel_worker) for i in range(max(1,min(channels,len(files))))]
+    for thread in threads:
+       thread.start()
+    for thread in threads:
+       thread.join()
+    return (totals["files"],totals["bytes"],totals["wirebytes"],errors)
+
 #------------------------------------------------
 # Main script logic
 #------------------------------------------------
@@ -117,6 +388,10 @@ try: # Try to perform main logic
    parser.add_argument('-fromfile','--fromlocalfile', required=True,help="Local file to upload")
    parser.add_argument('-tofile','--toremotefile', required=True,help="Remote file to upload to")
    parser.add_argument('-replace','--replacefile', default="False",required=False,help="Replace remote output file. Default value=False")
+   parser.add_argument('-sync','--sync', default="False",required=False,help="Upload new and changed files of a local directory tree. Default value=False")
+   parser.add_argument('-channels','--channels', default="4",required=False,help="Concurrent SFTP channels for sync. Default value=4")
+   parser.add_argument('-compress','--compress', default="none",required=False,help="Compress while uploading: none, gzip or zstd. Default value=none")
+   parser.add_argument('-broker','--broker', default="",required=False,help="pysftpbroker.py socket path or auto. Default value=blank")
    
    # Parse the command line arguments 
    args = parser.parse_args()
@@ -131,6 +406,10 @@ try: # Try to perform main logic
    parmfromlocalfile=args.fromlocalfile.strip()
    parmsftptofile=args.toremotefile.strip()
    parmreplace=str2bool(args.replacefile) 
+   parmsync=str2bool(args.sync)
+   parmchannels=int(args.channels)
+   parmcompress=compression_method(args.compress.strip())
+   parmbroker=args.broker.strip()
 
    # Output parameter variables to log file
    print("Parameters:")
@@ -140,35 +419,67 @@ try: # Try to perform main logic
    print("From Local File: " + parmfromlocalfile)   
    print("To Remote File: " + parmsftptofile)
    print("Replace file: " + str(parmreplace))
+   print("Sync: " + str(parmsync))
+   print("Compress: " + (parmcompress if parmcompress != "" else "none"))
+   print("Broker: " + parmbroker)
    
-   # Sample SFTP options
-   cnopts = pysftp.CnOpts()
-   cnopts.hostkeys = None
-   sftp=None
-
    # Connect via User and password or User and Private Key if key file specified  
-   # https://pypi.org/project/pysftp-extension/
-   if (parmsprivatekeyfile!=""): 
-      sftp=pysftp.Connection(parmsftphost, port=parmsftpport, username=parmsftpuser, private_key=parmsprivatekeyfile, private_key_pass=parmsprivatekeypass, cnopts=cnopts)
-   else:
-      sftp=pysftp.Connection(parmsftphost, port=parmsftpport, username=parmsftpuser, password=parmsftppass,private_key=None,private_key_pass=None,cnopts=cnopts)
+   sftp=sftp_connect(parmsftphost,parmsftpport,parmsftpuser,parmsftppass,parmsprivatekeyfile,parmsprivatekeypass,parmbroker)
 
-   # Make sure local file exists
-   if os.path.isfile(parmfromlocalfile)==False:
-      raise Exception("Local file " + parmfromlocalfile + " doesn't exist. Process cancelled.")
+   if parmsync:
+      # Make sure local directory exists
+      if os.path.isdir(parmfromlocalfile)==False:
+         raise Exception("Local directory " + parmfromlocalfile + " doesn't exist. Process cancelled.")
+
+      # Work out what to send from one listing per remote directory
+      client=sftp.sftp_client
+      starttime=time.perf_counter()
+      createdirs, uploads, skipped = plan_sync(client,parmfromlocalfile,parmsftptofile,compressionsuffixes.get(parmcompress,""))
+      print(f"Files to upload: {len(uploads)}  Unchanged files skipped: {skipped}  Compare seconds: {time.perf_counter() - starttime:.2f}")
+      for remotedir in createdirs:
+         print("Creating remote directory " + remotedir)
+         client.mkdir(remotedir)
+
+      # Upload over concurrent SFTP channels of the one SSH transport
+      starttime=time.perf_counter()
+      filecount, bytecount, wirebytecount, errors = upload_files(client.get_channel().get_transport(),uploads,parmchannels,parmcompress)
+      elapsed=time.perf_counter() - starttime
+      sftp.close()
+
+      # Output totals
+      print(f"Files uploaded: {filecount}  Skipped: {skipped}  Bytes: {bytecount}  Seconds: {elapsed:.2f}")
+      if elapsed > 0:
+         print(f"MB/s: {bytecount / 1048576 / elapsed:.2f}")
+      if parmcompress != "":
+         print_compression(bytecount,wirebytecount,elapsed)
+      for error in errors:
+         print("Error: " + error)
+      if len(errors) > 0:
+         raise Exception(str(len(errors)) + " of " + str(len(uploads)) + " files failed to upload.")
+
+   else:
+      # Make sure local file exists
+      if os.path.isfile(parmfromlocalfile)==False:
+         raise Exception("Local file " + parmfromlocalfile + " doesn't exist. Process cancelled.")
   
-   # Make sure remote output file does not exist
-   if sftp.isfile(parmsftptofile):
-      if parmreplace: # If replace, delete existing file
-         sftp.remove(parmsftptofile)
-      else: # Bail out if found and replace not selected
-         raise Exception('Remote file ' + parmsftptofile + ' exists and replace not selected. Process cancelled.')          
+      # Make sure remote output file does not exist
+      if sftp.isfile(parmsftptofile):
+         if parmreplace: # If replace, delete existing file
+            sftp.remove(parmsftptofile)
+         else: # Bail out if found and replace not selected
+            raise Exception('Remote file ' + parmsftptofile + ' exists and replace not selected. Process cancelled.')          
        
-   print("Uploading file " + parmfromlocalfile + " to " + parmsftptofile)
-   sftp.put(parmfromlocalfile,parmsftptofile) # put local file to remote file   
+      print("Uploading file " + parmfromlocalfile + " to " + parmsftptofile)
+      if parmcompress == "":
+         sftp.put(parmfromlocalfile,parmsftptofile) # put local file to remote file   
+      else:
+         # Compress on the fly straight into the remote file
+         starttime=time.perf_counter()
+         wirebytecount=upload_compressed(sftp.sftp_client,parmfromlocalfile,parmsftptofile,parmcompress)
+         print_compression(os.path.getsize(parmfromlocalfile),wirebytecount,time.perf_counter() - starttime)
 
-   # Close connection 
-   sftp.close()
+      # Close connection 
+      sftp.close()
 
    # Set success info
    exitcode=0